@@ -0,0 +1,341 @@
+import os
+import re
+import sys
+import json
+import array
+import argparse
+from streaming_merge import iterate_annotations
+from compressed_json import open_blob_reader, open_file_reader
+
+# 웹 뷰어용 압축 바이너리 아티팩트
+#
+# 병합된 JSON을 브라우저가 통째로 받아 파싱한 뒤 timeupdate마다 모든 트랙의 frames를 훑으면 긴 영상에서 끊긴다.
+# 병합 결과에서 화면에 그릴 정보만 뽑아 열(column) 단위 배열로 저장한다.
+#   - 시간: 밀리초 uint32, 박스 좌표: 0~65535로 양자화한 uint16, 신뢰도: 0~255 uint8
+#   - 트랙의 프레임은 트랙별로 이어 붙이고(track_frame_offset), 트랙 안에서는 시간순이라 이진 탐색이 가능하다.
+#   - 1초 단위 버킷마다 그 시간에 걸쳐 있는 트랙 번호 목록(bucket_offset/bucket_tracks)을 둬서
+#     "t초에 보이는 트랙"을 버킷 하나만 보고 찾는다.
+#   - 라벨, 가능성 등급 같은 문자열은 manifest의 사전으로 빼고 배열에는 번호만 넣는다.
+# manifest(JSON)에는 각 배열의 위치/형식과 사전이 들어가고, 배열은 하나의 .bin 파일에 4바이트 정렬로 붙여 둔다.
+# 뷰어 쪽 로더는 utils/annotation_artifact.js
+
+ARTIFACT_VERSION = 1
+ARTIFACT_PREFIX = "visualize-artifact-files/" # 영상별 아티팩트 경로
+TIME_SCALE = 1000 # 초 -> 밀리초
+BOX_SCALE = 65535
+CONFIDENCE_SCALE = 255
+BUCKET_SECONDS = 1
+FACE_ATTRIBUTES = ["glasses", "eyes_visible", "headwear", "looking_at_camera", "mouth_open", "smiling"]
+LIKELIHOODS = ["LIKELIHOOD_UNSPECIFIED", "VERY_UNLIKELY", "UNLIKELY", "POSSIBLE", "LIKELY", "VERY_LIKELY"]
+
+# 배열 형식 (array 모듈 typecode, manifest에 적는 이름)
+TYPES = {
+    "uint8": "B",
+    "uint16": "H",
+    "uint32": "I",
+}
+
+
+def time_offset_to_ms(time_offset):
+    if not time_offset:
+        return 0
+    seconds = time_offset.get("seconds", 0) or 0
+    nanos = time_offset.get("nanos", 0) or 0
+    return int(round((float(seconds) + nanos / 1e9) * TIME_SCALE))
+
+
+def quantize(value, scale):
+    value = min(max(float(value or 0), 0.0), 1.0)
+    return int(round(value * scale))
+
+
+class TrackSet:
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.label = array.array("H")
+        self.confidence = array.array("B")
+        self.start = array.array("I")
+        self.end = array.array("I")
+        self.frame_offset = array.array("I", [0])
+        self.frame_time = array.array("I")
+        self.frame_box = array.array("H")
+
+    def __len__(self):
+        return len(self.start)
+
+    # frames: [(time_ms, normalized_bounding_box), ...]
+    def add(self, label, confidence, start, end, frames):
+        frames = sorted(frames, key=lambda frame: frame[0])
+        if frames:
+            start = min(start, frames[0][0])
+            end = max(end, frames[-1][0])
+        self.label.append(label)
+        self.confidence.append(quantize(confidence, CONFIDENCE_SCALE))
+        self.start.append(start)
+        self.end.append(end)
+        for time_ms, box in frames:
+            self.frame_time.append(time_ms)
+            self.frame_box.extend((quantize(box.get("left"), BOX_SCALE), quantize(box.get("top"), BOX_SCALE),
+                                   quantize(box.get("right"), BOX_SCALE), quantize(box.get("bottom"), BOX_SCALE)))
+        self.frame_offset.append(len(self.frame_time))
+
+    # 1초 버킷별로 걸쳐 있는 트랙 번호 (CSR 형식)
+    def buckets(self, duration_ms):
+        bucket_ms = BUCKET_SECONDS * TIME_SCALE
+        count = max(duration_ms, max(self.end, default=0)) // bucket_ms + 1
+        members = [[] for _ in range(count)]
+        for track, (start, end) in enumerate(zip(self.start, self.end)):
+            for bucket in range(start // bucket_ms, end // bucket_ms + 1):
+                members[bucket].append(track)
+
+        offsets = array.array("I", [0])
+        tracks = array.array("I")
+        for bucket_tracks in members:
+            tracks.extend(bucket_tracks)
+            offsets.append(len(tracks))
+        return offsets, tracks
+
+    def sections(self, duration_ms):
+        bucket_offset, bucket_tracks = self.buckets(duration_ms)
+        return {
+            f"{self.prefix}_track_label": self.label,
+            f"{self.prefix}_track_confidence": self.confidence,
+            f"{self.prefix}_track_start_ms": self.start,
+            f"{self.prefix}_track_end_ms": self.end,
+            f"{self.prefix}_track_frame_offset": self.frame_offset,
+            f"{self.prefix}_frame_time_ms": self.frame_time,
+            f"{self.prefix}_frame_box": self.frame_box,
+            f"{self.prefix}_bucket_offset": bucket_offset,
+            f"{self.prefix}_bucket_tracks": bucket_tracks,
+        }
+
+
+class ArtifactBuilder:
+    def __init__(self):
+        self.labels = []
+        self.label_ids = {}
+        self.objects = TrackSet("object")
+        self.faces = TrackSet("face")
+        self.face_attributes = array.array("B")
+        self.face_thumbnails = bytearray()
+        self.face_thumbnail_offset = array.array("I", [0])
+        self.explicit_time = array.array("I")
+        self.explicit_likelihood = array.array("B")
+        self.duration_ms = 0
+        self.features = []
+
+    def label_id(self, label):
+        if label not in self.label_ids:
+            self.label_ids[label] = len(self.labels)
+            self.labels.append(label)
+        return self.label_ids[label]
+
+    def add_feature(self, feature):
+        if feature not in self.features:
+            self.features.append(feature)
+
+    def add_segment(self, segment):
+        if segment:
+            self.duration_ms = max(self.duration_ms, time_offset_to_ms(segment.get("end_time_offset")))
+
+    def add_object(self, annotation):
+        segment = annotation.get("segment", {})
+        frames = [(time_offset_to_ms(frame.get("time_offset")), frame.get("normalized_bounding_box", {}))
+                  for frame in annotation.get("frames", [])]
+        self.objects.add(self.label_id(annotation.get("entity", {}).get("description", "")),
+                         annotation.get("confidence", 0),
+                         time_offset_to_ms(segment.get("start_time_offset")),
+                         time_offset_to_ms(segment.get("end_time_offset")),
+                         frames)
+
+    def add_face(self, annotation):
+        # 뷰어와 같이 첫 번째 트랙만 쓴다.
+        tracks = annotation.get("tracks") or []
+        if not tracks:
+            return
+        track = tracks[0]
+        segment = track.get("segment", {})
+        frames = [(time_offset_to_ms(frame.get("time_offset")), frame.get("normalized_bounding_box", {}))
+                  for frame in track.get("timestamped_objects", [])]
+        self.faces.add(self.label_id("face"), track.get("confidence", 0),
+                       time_offset_to_ms(segment.get("start_time_offset")),
+                       time_offset_to_ms(segment.get("end_time_offset")),
+                       frames)
+
+        attributes = {attribute.get("name"): attribute.get("confidence", 0) for attribute in track.get("attributes", [])}
+        self.face_attributes.extend(quantize(attributes.get(name, 0), CONFIDENCE_SCALE) for name in FACE_ATTRIBUTES)
+        self.face_thumbnails.extend((annotation.get("thumbnail") or "").encode("ascii"))
+        self.face_thumbnail_offset.append(len(self.face_thumbnails))
+
+    def add_explicit(self, annotation):
+        for frame in sorted(annotation.get("frames", []), key=lambda frame: time_offset_to_ms(frame.get("time_offset"))):
+            likelihood = frame.get("pornography_likelihood", LIKELIHOODS[0])
+            self.explicit_time.append(time_offset_to_ms(frame.get("time_offset")))
+            self.explicit_likelihood.append(LIKELIHOODS.index(likelihood) if likelihood in LIKELIHOODS else 0)
+
+    # 병합된 JSON 스트림을 읽는다. 트랙은 한 번에 하나씩만 메모리에 올라온다.
+    def read(self, stream):
+        for key, value in iterate_annotations(stream):
+            if key == "object_annotations":
+                self.add_feature(key)
+                for annotation in value:
+                    self.add_object(annotation)
+            elif key == "face_detection_annotations":
+                self.add_feature(key)
+                for annotation in value:
+                    self.add_face(annotation)
+            elif key == "explicit_annotation":
+                self.add_feature(key)
+                self.add_explicit(value or {})
+            elif key == "segment":
+                self.add_segment(value)
+        return self
+
+    def sections(self):
+        duration_ms = max(self.duration_ms, max(self.objects.end, default=0), max(self.faces.end, default=0),
+                          max(self.explicit_time, default=0))
+        sections = {}
+        sections.update(self.objects.sections(duration_ms))
+        sections.update(self.faces.sections(duration_ms))
+        sections.update({
+            "face_track_attributes": self.face_attributes,
+            "face_thumbnail_offset": self.face_thumbnail_offset,
+            "face_thumbnail": array.array("B", self.face_thumbnails),
+            "explicit_frame_time_ms": self.explicit_time,
+            "explicit_frame_likelihood": self.explicit_likelihood,
+        })
+        return duration_ms, sections
+
+    # (manifest dict, 바이너리 bytes)
+    def build(self, source_name, binary_name):
+        duration_ms, sections = self.sections()
+        typenames = {typecode: name for name, typecode in TYPES.items()}
+
+        payload = bytearray()
+        layout = {}
+        for name, values in sections.items():
+            payload.extend(b"\0" * (-len(payload) % 4)) # 타입 배열을 바로 만들 수 있게 4바이트 정렬
+            if sys.byteorder != "little":
+                values = array.array(values.typecode, values)
+                values.byteswap()
+            layout[name] = {"offset": len(payload), "type": typenames[values.typecode], "length": len(values)}
+            payload.extend(values.tobytes())
+
+        manifest = {
+            "version": ARTIFACT_VERSION,
+            "source": source_name,
+            "binary": binary_name,
+            "byte_length": len(payload),
+            "duration_ms": duration_ms,
+            "time_scale": TIME_SCALE,
+            "box_scale": BOX_SCALE,
+            "confidence_scale": CONFIDENCE_SCALE,
+            "bucket_seconds": BUCKET_SECONDS,
+            "features": self.features,
+            "labels": self.labels,
+            "likelihoods": LIKELIHOODS,
+            "face_attributes": FACE_ATTRIBUTES,
+            "counts": {
+                "object_tracks": len(self.objects),
+                "object_frames": len(self.objects.frame_time),
+                "face_tracks": len(self.faces),
+                "face_frames": len(self.faces.frame_time),
+                "explicit_frames": len(self.explicit_time),
+            },
+            "sections": layout,
+        }
+        return manifest, bytes(payload)
+
+
+def artifact_names(timestamp):
+    return f"artifact_{timestamp}.bin", f"artifact_{timestamp}.manifest.json"
+
+
+# 병합된 JSON 블롭으로 아티팩트를 만들어 올린다. (manifest 블롭, manifest)를 돌려준다.
+def publish_artifact(bucket, merged_blob, timestamp, prefix=ARTIFACT_PREFIX):
+    binary_name, manifest_name = artifact_names(timestamp)
+    with open_blob_reader(merged_blob) as source:
+        manifest, payload = ArtifactBuilder().read(source).build(merged_blob.name, binary_name)
+
+    # 영상마다 이름이 다르므로 바이너리는 브라우저가 캐시해도 된다.
+    binary_blob = bucket.blob(f"{prefix}{binary_name}")
+    binary_blob.upload_from_string(payload, content_type="application/octet-stream")
+
+    manifest_blob = bucket.blob(f"{prefix}{manifest_name}")
+    manifest_blob.cache_control = "no-cache"
+    manifest_blob.upload_from_string(json.dumps(manifest), content_type="application/json")
+    return manifest_blob, manifest
+
+
+# 뷰어가 읽는 고정 경로(final_output.manifest.json)에 manifest만 올린다.
+# 바이너리는 복사하지 않고 manifest 위치 기준의 상대 경로로 가리킨다.
+def publish_view_manifest(bucket, manifest_blob, manifest, view_prefix, view_name="final_output"):
+    view_manifest = dict(manifest)
+    depth = view_prefix.rstrip("/").count("/") + 1
+    view_manifest["binary"] = "../" * depth + f"{os.path.dirname(manifest_blob.name)}/{manifest['binary']}"
+
+    view_blob = bucket.blob(f"{view_prefix}{view_name}.manifest.json")
+    view_blob.cache_control = "no-cache"
+    view_blob.upload_from_string(json.dumps(view_manifest), content_type="application/json")
+    return view_blob
+
+
+# 기존 병합 결과(merged_<ts>.json)로 아티팩트를 일괄 생성
+def backfill(gcs_client, bucket_name, source_prefix, prefix=ARTIFACT_PREFIX, overwrite=False, limit=None):
+    bucket = gcs_client.bucket(bucket_name)
+    existing = set() if overwrite else {blob.name for blob in bucket.list_blobs(prefix=prefix)}
+
+    converted = 0
+    for blob in bucket.list_blobs(prefix=source_prefix):
+        match = re.search(r'merged_(\d{8}_\d{6})\.json$', blob.name)
+        if not match:
+            continue
+        _, manifest_name = artifact_names(match.group(1))
+        if f"{prefix}{manifest_name}" in existing:
+            continue
+
+        try:
+            manifest_blob, _ = publish_artifact(bucket, blob, match.group(1), prefix)
+            print(f"아티팩트 생성 완료: gs://{bucket_name}/{manifest_blob.name}")
+            converted += 1
+        except Exception as e:
+            print(f"아티팩트 생성 실패: {blob.name} ({e})")
+
+        if limit and converted >= limit:
+            break
+    return converted
+
+
+if __name__ == "__main__":
+    import run_video_intelligence_auto as auto
+    from clients import get_registry
+
+    parser = argparse.ArgumentParser(description="병합된 JSON으로 뷰어용 바이너리 아티팩트 생성")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="로컬 JSON 파일 하나를 변환")
+    convert_parser.add_argument("input")
+    convert_parser.add_argument("output_dir")
+
+    backfill_parser = subparsers.add_parser("backfill", help="버킷에 있는 기존 병합 결과를 일괄 변환")
+    backfill_parser.add_argument("--source-prefix", default=auto.FINAL_OUTPUT_PREFIX)
+    backfill_parser.add_argument("--prefix", default=ARTIFACT_PREFIX)
+    backfill_parser.add_argument("--overwrite", action="store_true", help="이미 있는 아티팩트도 다시 만든다")
+    backfill_parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        timestamp = re.search(r'(\d{8}_\d{6})', os.path.basename(args.input))
+        binary_name, manifest_name = artifact_names(timestamp.group(1) if timestamp else "local")
+        with open_file_reader(args.input) as source:
+            manifest, payload = ArtifactBuilder().read(source).build(os.path.basename(args.input), binary_name)
+        os.makedirs(args.output_dir, exist_ok=True)
+        with open(os.path.join(args.output_dir, binary_name), "wb") as f:
+            f.write(payload)
+        with open(os.path.join(args.output_dir, manifest_name), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        print(f"원본 {os.path.getsize(args.input):,} bytes -> 아티팩트 {len(payload):,} bytes")
+    else:
+        count = backfill(get_registry().storage_client(), auto.GCS_BUCKET, args.source_prefix, args.prefix,
+                         args.overwrite, args.limit)
+        print(f"아티팩트 {count}개를 만들었습니다.")
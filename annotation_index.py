@@ -0,0 +1,270 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from streaming_merge import iterate_annotations
+from compressed_json import open_blob_reader, open_file_reader
+
+# 병합된 분석 결과에 대한 "t초에 화면에 무엇이 있나" 인덱스
+#
+# 오브젝트 트랙 / 얼굴 트랙 / explicit 프레임을 종류별로 구간(시작, 끝, 점수, 라벨) NumPy 배열로 만들어 두고
+#   - 시작 시간순으로 정렬 + 가장 긴 구간 길이로 범위 질의의 후보를 searchsorted 두 번으로 좁히고
+#   - 1초 버킷마다 걸쳐 있는 구간 번호(CSR)를 둬서 시점 질의는 버킷 하나만 보고
+#   - 점수순 정렬 배열로 신뢰도 기준 질의를 한다.
+# 점수는 오브젝트/얼굴은 confidence, explicit은 가능성 등급(0~5)이다.
+# 만든 인덱스는 병합 JSON 옆에 .index.npz로 저장해 두고 다음에는 다시 만들지 않고 읽는다.
+
+INDEX_VERSION = 1
+BUCKET_SECONDS = 1.0
+ANNOTATION_TYPES = ("object", "face", "explicit")
+LIKELIHOODS = ["LIKELIHOOD_UNSPECIFIED", "VERY_UNLIKELY", "UNLIKELY", "POSSIBLE", "LIKELY", "VERY_LIKELY"]
+
+
+def time_offset_to_seconds(time_offset):
+    if not time_offset:
+        return 0.0
+    return float(time_offset.get("seconds", 0) or 0) + (time_offset.get("nanos", 0) or 0) / 1e9
+
+
+def index_blob_name(merged_name):
+    return f"{os.path.splitext(merged_name)[0]}.index.npz"
+
+
+class IntervalIndex:
+    def __init__(self, starts, ends, scores, labels, sources, bucket_seconds=BUCKET_SECONDS):
+        order = np.argsort(starts, kind="stable")
+        self.starts = np.asarray(starts, dtype=np.float64)[order]
+        self.ends = np.maximum(np.asarray(ends, dtype=np.float64)[order], self.starts)
+        self.scores = np.asarray(scores, dtype=np.float32)[order]
+        self.labels = np.asarray(labels, dtype=np.int32)[order]
+        self.sources = np.asarray(sources, dtype=np.int32)[order] # 원본 JSON에서의 순번
+        self.bucket_seconds = bucket_seconds
+        self.max_length = float((self.ends - self.starts).max()) if len(self.starts) else 0.0
+        self.score_order = np.argsort(self.scores, kind="stable")
+        self.bucket_offsets, self.bucket_items = self.build_buckets()
+
+    def __len__(self):
+        return len(self.starts)
+
+    # 구간마다 걸쳐 있는 버킷 번호를 벡터 연산으로 펼친 뒤 버킷순으로 모은다.
+    def build_buckets(self):
+        if not len(self.starts):
+            return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32)
+
+        first = np.floor(self.starts / self.bucket_seconds).astype(np.int64)
+        last = np.floor(self.ends / self.bucket_seconds).astype(np.int64)
+        counts = last - first + 1
+        items = np.repeat(np.arange(len(self.starts), dtype=np.int32), counts)
+        steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        buckets = np.repeat(first, counts) + steps
+
+        order = np.argsort(buckets, kind="stable")
+        offsets = np.zeros(int(last.max()) + 2, dtype=np.int64)
+        np.cumsum(np.bincount(buckets, minlength=len(offsets) - 1), out=offsets[1:])
+        return offsets, items[order]
+
+    # t초에 걸쳐 있는 구간 번호. 구간은 [시작, 끝)으로 본다 (프레임 구간의 끝은 다음 프레임의 시작이므로
+    # 경계 시각에는 다음 프레임만 맞는다). 길이가 0인 구간은 시작 시각에만 맞는다.
+    def at(self, seconds, min_score=None):
+        bucket = int(seconds // self.bucket_seconds)
+        if bucket < 0 or bucket >= len(self.bucket_offsets) - 1:
+            return np.zeros(0, dtype=np.int32)
+        candidates = self.bucket_items[self.bucket_offsets[bucket]:self.bucket_offsets[bucket + 1]]
+        starts, ends = self.starts[candidates], self.ends[candidates]
+        mask = (starts <= seconds) & ((ends > seconds) | (starts == ends))
+        if min_score is not None:
+            mask &= self.scores[candidates] >= min_score
+        return candidates[mask]
+
+    # [start, end] 구간과 겹치는 구간 번호 (시작 시간순)
+    def between(self, start, end, min_score=None):
+        low = np.searchsorted(self.starts, start - self.max_length, side="left")
+        high = np.searchsorted(self.starts, end, side="right")
+        mask = self.ends[low:high] >= start
+        if min_score is not None:
+            mask &= self.scores[low:high] >= min_score
+        return np.arange(low, high, dtype=np.int32)[mask]
+
+    # 점수가 min_score 이상인 구간 번호 (점수 오름차순)
+    def above(self, min_score):
+        position = np.searchsorted(self.scores[self.score_order], min_score, side="left")
+        return self.score_order[position:]
+
+    def arrays(self):
+        return {"starts": self.starts, "ends": self.ends, "scores": self.scores,
+                "labels": self.labels, "sources": self.sources}
+
+
+class AnnotationIndex:
+    def __init__(self, intervals, labels, source=None):
+        self.intervals = intervals # 종류 -> IntervalIndex
+        self.labels = list(labels)
+        self.source = source
+
+    @classmethod
+    def from_stream(cls, stream, source=None, bucket_seconds=BUCKET_SECONDS):
+        labels = []
+        label_ids = {}
+        columns = {kind: ([], [], [], [], []) for kind in ANNOTATION_TYPES}
+
+        def label_id(label):
+            if label not in label_ids:
+                label_ids[label] = len(labels)
+                labels.append(label)
+            return label_ids[label]
+
+        def add(kind, start, end, score, label, source_index):
+            for column, value in zip(columns[kind], (start, end, score, label, source_index)):
+                column.append(value)
+
+        object_count = face_count = 0
+        for key, value in iterate_annotations(stream):
+            if key == "object_annotations":
+                for annotation in value:
+                    segment = annotation.get("segment", {})
+                    add("object", time_offset_to_seconds(segment.get("start_time_offset")),
+                        time_offset_to_seconds(segment.get("end_time_offset")),
+                        annotation.get("confidence", 0),
+                        label_id(annotation.get("entity", {}).get("description", "")), object_count)
+                    object_count += 1
+            elif key == "face_detection_annotations":
+                for annotation in value:
+                    for track in annotation.get("tracks", []):
+                        segment = track.get("segment", {})
+                        add("face", time_offset_to_seconds(segment.get("start_time_offset")),
+                            time_offset_to_seconds(segment.get("end_time_offset")),
+                            track.get("confidence", 0), label_id("face"), face_count)
+                    face_count += 1
+            elif key == "explicit_annotation":
+                # 프레임 하나는 다음 프레임 직전까지 유지되는 것으로 본다.
+                frames = sorted(((time_offset_to_seconds(frame.get("time_offset")), frame.get("pornography_likelihood"))
+                                 for frame in (value or {}).get("frames", [])), key=lambda frame: frame[0])
+                times = [frame[0] for frame in frames]
+                gap = float(np.median(np.diff(times))) if len(times) > 1 else 1.0
+                for position, (seconds, likelihood) in enumerate(frames):
+                    end = times[position + 1] if position + 1 < len(times) else seconds + gap
+                    level = LIKELIHOODS.index(likelihood) if likelihood in LIKELIHOODS else 0
+                    add("explicit", seconds, end, level, label_id(likelihood or LIKELIHOODS[0]), position)
+
+        intervals = {kind: IntervalIndex(*columns[kind], bucket_seconds=bucket_seconds) for kind in ANNOTATION_TYPES}
+        return cls(intervals, labels, source)
+
+    @classmethod
+    def from_result(cls, result, source=None):
+        return cls.from_stream(io.BytesIO(json.dumps(result).encode("utf-8")), source)
+
+    # kind별 구간 번호 -> 읽기 쉬운 행 목록
+    def rows(self, kind, indexes):
+        interval = self.intervals[kind]
+        return [{"type": kind,
+                 "label": self.labels[interval.labels[index]],
+                 "start": float(interval.starts[index]),
+                 "end": float(interval.ends[index]),
+                 "score": float(interval.scores[index]),
+                 "source_index": int(interval.sources[index])} for index in indexes]
+
+    def at(self, seconds, min_score=None, types=ANNOTATION_TYPES):
+        return {kind: self.intervals[kind].at(seconds, min_score) for kind in types}
+
+    def between(self, start, end, min_score=None, types=ANNOTATION_TYPES):
+        return {kind: self.intervals[kind].between(start, end, min_score) for kind in types}
+
+    def above(self, min_score, types=ANNOTATION_TYPES):
+        return {kind: self.intervals[kind].above(min_score) for kind in types}
+
+    # source에는 원본 블롭의 generation 등 인덱스가 어떤 결과로 만들어졌는지를 남긴다.
+    def save(self, file):
+        arrays = {"version": np.array(INDEX_VERSION), "labels": np.array(self.labels, dtype=str),
+                  "source": np.array(json.dumps(self.source))}
+        for kind, interval in self.intervals.items():
+            arrays[f"{kind}_bucket_seconds"] = np.array(interval.bucket_seconds)
+            for name, values in interval.arrays().items():
+                arrays[f"{kind}_{name}"] = values
+        np.savez(file, **arrays)
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file, allow_pickle=False) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                raise ValueError("인덱스 버전이 다릅니다.")
+            intervals = {}
+            for kind in ANNOTATION_TYPES:
+                intervals[kind] = IntervalIndex(data[f"{kind}_starts"], data[f"{kind}_ends"], data[f"{kind}_scores"],
+                                                data[f"{kind}_labels"], data[f"{kind}_sources"],
+                                                float(data[f"{kind}_bucket_seconds"]))
+            return cls(intervals, data["labels"].tolist(), json.loads(str(data["source"])))
+
+
+# 버킷의 병합 결과에 대한 인덱스를 읽는다. 옆에 저장된 인덱스가 같은 generation으로 만든 것이면 그대로 쓰고,
+# 없거나 오래됐으면 병합 결과를 스트림으로 읽어 새로 만든 뒤 저장한다.
+def load_or_build(bucket, merged_name):
+    merged_blob = bucket.get_blob(merged_name)
+    if merged_blob is None:
+        raise FileNotFoundError(merged_name)
+    source = {"name": merged_name, "generation": merged_blob.generation}
+
+    index_blob = bucket.blob(index_blob_name(merged_name))
+    if index_blob.exists():
+        index = AnnotationIndex.load(io.BytesIO(index_blob.download_as_bytes()))
+        if index.source == source:
+            return index
+
+    with open_blob_reader(merged_blob) as stream:
+        index = AnnotationIndex.from_stream(stream, source)
+
+    buffer = io.BytesIO()
+    index.save(buffer)
+    index_blob.upload_from_string(buffer.getvalue(), content_type="application/octet-stream")
+    return index
+
+
+# 로컬 병합 JSON에 대한 인덱스 (merged_x.json 옆에 merged_x.index.npz)
+def load_or_build_local(path):
+    stat = os.stat(path)
+    source = {"name": os.path.basename(path), "size": stat.st_size, "mtime": stat.st_mtime}
+    index_path = index_blob_name(path)
+    if os.path.exists(index_path):
+        index = AnnotationIndex.load(index_path)
+        if index.source == source:
+            return index
+
+    with open_file_reader(path) as stream:
+        index = AnnotationIndex.from_stream(stream, source)
+    index.save(index_path)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="병합된 분석 결과에서 시간/신뢰도 기준으로 어노테이션 찾기")
+    parser.add_argument("merged_json", help="로컬 병합 JSON 파일 (옆에 .index.npz를 만든다)")
+    parser.add_argument("--at", type=float, help="이 시점(초)에 걸쳐 있는 어노테이션")
+    parser.add_argument("--between", type=float, nargs=2, metavar=("START", "END"), help="이 구간과 겹치는 어노테이션")
+    parser.add_argument("--min-score", type=float, default=None, help="신뢰도(explicit은 가능성 등급 0~5) 하한")
+    parser.add_argument("--types", nargs="+", default=list(ANNOTATION_TYPES), choices=ANNOTATION_TYPES)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = load_or_build_local(args.merged_json)
+    print(f"인덱스 준비 {(time.perf_counter() - started) * 1000:.1f}ms "
+          f"({', '.join(f'{kind} {len(index.intervals[kind])}개' for kind in ANNOTATION_TYPES)})")
+
+    if args.at is not None:
+        started = time.perf_counter()
+        found = index.at(args.at, args.min_score, args.types)
+    elif args.between:
+        started = time.perf_counter()
+        found = index.between(args.between[0], args.between[1], args.min_score, args.types)
+    elif args.min_score is not None:
+        started = time.perf_counter()
+        found = index.above(args.min_score, args.types)
+    else:
+        sys.exit(0)
+    elapsed = time.perf_counter() - started
+
+    for kind, indexes in found.items():
+        for row in index.rows(kind, indexes):
+            print(json.dumps(row, ensure_ascii=False))
+    print(f"질의 {elapsed * 1000:.3f}ms, {sum(len(indexes) for indexes in found.values())}건")
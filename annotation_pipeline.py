@@ -0,0 +1,195 @@
+import time
+import queue
+import threading
+import concurrent.futures
+from metrics import get_metrics
+
+# 여러 영상을 동시에 분석하는 파이프라인
+#
+# 감지된 영상은 크기가 정해진 큐에 들어가고(큐가 꽉 차면 넣는 쪽이 기다린다),
+# 작업자 스레드는 annotate_video 요청만 보내고 바로 다음 영상으로 넘어간다.
+# 진행 중인 long-running operation은 폴링 스레드 하나가 주기적으로 done()을 확인하고,
+# 끝난 작업의 후처리(JSON 병합 등)는 별도의 스레드 풀에서 실행한다.
+# 프로젝트마다 동시에 진행할 수 있는 operation 수를 세마포어로 제한한다.
+
+DEFAULT_PROJECT = "default"
+
+
+class AnnotationJob:
+    def __init__(self, video_name, project):
+        self.video_name = video_name
+        self.project = project
+        self.operation = None
+        self.context = None
+        self.submitted_at = None
+        self.queued_at = time.monotonic()
+
+
+class AnnotationPipeline:
+    # submit_fn(video_name) -> (operation, context)   : 분석 요청만 보내고 operation을 돌려준다.
+    # on_complete(video_name, context, result)        : 분석이 끝난 뒤 실행할 후처리
+    # on_error(video_name, error)                     : 요청/분석 중 발생한 오류 처리
+    def __init__(self, submit_fn, on_complete, on_error=None, workers=4, queue_size=32,
+                 project_limits=None, default_project_limit=8, default_project=DEFAULT_PROJECT,
+                 poll_interval=10, timeout=1800):
+        self.submit_fn = submit_fn
+        self.on_complete = on_complete
+        self.on_error = on_error
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.project_limits = dict(project_limits or {})
+        self.default_project_limit = default_project_limit
+        self.default_project = default_project
+        self.project_semaphores = {}
+
+        self.in_flight = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.completion_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="annotation-complete")
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self.worker_loop, name=f"annotation-worker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        poller = threading.Thread(target=self.poll_loop, name="annotation-poller", daemon=True)
+        poller.start()
+        self.threads.append(poller)
+        return self
+
+    # 영상을 큐에 넣는다. 큐가 꽉 차 있으면 block=True일 때 자리가 날 때까지 기다리고,
+    # block=False이거나 timeout이 지나면 queue.Full을 던진다.
+    def submit(self, video_name, project=None, block=True, timeout=None):
+        self.queue.put(AnnotationJob(video_name, project or self.default_project), block=block, timeout=timeout)
+
+    def project_semaphore(self, project):
+        with self.lock:
+            if project not in self.project_semaphores:
+                limit = self.project_limits.get(project, self.default_project_limit)
+                self.project_semaphores[project] = threading.BoundedSemaphore(limit)
+            return self.project_semaphores[project]
+
+    def worker_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                job = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            get_metrics().record("queue_wait", time.monotonic() - job.queued_at, clip=job.video_name)
+            semaphore = self.project_semaphore(job.project)
+            # 프로젝트의 동시 실행 한도에 걸리면 여기서 기다린다. 작업자가 모두 막히면 큐가 차고 넣는 쪽도 멈춘다.
+            while not semaphore.acquire(timeout=1):
+                if self.stop_event.is_set():
+                    self.queue.task_done()
+                    return
+
+            try:
+                job.operation, job.context = self.submit_fn(job.video_name)
+                job.submitted_at = time.monotonic()
+                with self.lock:
+                    self.in_flight.append(job)
+                    self.submitted += 1
+                print(f"분석 요청 완료 ({self.in_flight_count()}개 진행 중): {job.video_name}")
+            except Exception as e:
+                semaphore.release()
+                self.fail(job, e)
+            finally:
+                self.queue.task_done()
+
+    # 진행 중인 operation들을 한 스레드에서 돌아가며 확인한다.
+    # 작업 하나의 확인이나 후처리 등록이 실패해도 폴링 스레드는 멈추지 않는다.
+    def poll_loop(self):
+        while not self.stop_event.is_set():
+            with self.lock:
+                jobs = list(self.in_flight)
+
+            for job in jobs:
+                try:
+                    if job.operation.done():
+                        result, error = job.operation.result(), None
+                    elif time.monotonic() - job.submitted_at > self.timeout:
+                        result, error = None, concurrent.futures.TimeoutError()
+                    else:
+                        continue
+                except Exception as e:
+                    result, error = None, e
+                self.finish(job, result, error)
+
+            self.stop_event.wait(self.poll_interval)
+
+    # 작업 하나에 한 번만 처리된다 (이미 끝난 작업이면 아무것도 하지 않는다).
+    def finish(self, job, result=None, error=None):
+        with self.lock:
+            if job not in self.in_flight:
+                return
+            self.in_flight.remove(job)
+        self.project_semaphore(job.project).release()
+        # 요청 이후 끝날 때까지 (서버 대기열 + 분석 + 폴링 간격)
+        get_metrics().record("annotate", time.monotonic() - job.submitted_at, clip=job.video_name,
+                             error=type(error).__name__ if error is not None else None)
+
+        if error is not None:
+            self.fail(job, error)
+            return
+
+        with self.lock:
+            self.completed += 1
+        try:
+            self.completion_executor.submit(self.run_on_complete, job, result)
+        except RuntimeError as e:
+            # 멈추는 중이라 후처리를 등록할 수 없다.
+            self.fail(job, e)
+
+    def run_on_complete(self, job, result):
+        try:
+            self.on_complete(job.video_name, job.context, result)
+        except Exception as e:
+            self.fail(job, e)
+
+    # on_error가 실패해도 호출한 스레드(작업자, 폴링, 후처리)로 오류를 넘기지 않는다.
+    def fail(self, job, error):
+        with self.lock:
+            self.failed += 1
+        if not self.on_error:
+            print(f"영상 처리 중 오류가 발생했습니다: {job.video_name} ({error})")
+            return
+        try:
+            self.on_error(job.video_name, error)
+        except Exception as e:
+            print(f"오류 처리 중 다시 오류가 발생했습니다: {job.video_name} ({error} -> {e})")
+
+    def in_flight_count(self):
+        with self.lock:
+            return len(self.in_flight)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queued": self.queue.qsize(),
+                "in_flight": len(self.in_flight),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    # wait=True면 큐에 남은 영상과 진행 중인 operation이 모두 끝날 때까지 기다린 뒤 멈춘다.
+    def stop(self, wait=True):
+        if wait:
+            self.queue.join()
+            while self.in_flight_count():
+                time.sleep(min(self.poll_interval, 1))
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        self.completion_executor.shutdown(wait=wait)
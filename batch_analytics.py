@@ -0,0 +1,245 @@
+import os
+import re
+import sys
+import json
+import glob
+import argparse
+import tempfile
+import concurrent.futures
+import numpy as np
+from annotation_index import AnnotationIndex, ANNOTATION_TYPES, LIKELIHOODS
+from compressed_json import open_file_reader
+
+# 지금까지 쌓인 병합 결과(merged_<ts>.json) 전체에 대한 일괄 통계
+#
+# 병합 결과를 하나씩 받아 json.loads 하던 일회성 스크립트 대신
+#   1. 목록 조회 결과의 generation으로 로컬 캐시를 확인하고, 캐시에 없는 결과만
+#   2. 스레드 풀에서 동시에 받고 (스레드마다 Storage 클라이언트 하나 = 연결 재사용)
+#   3. 프로세스 풀에서 스트림으로 읽어 종류별 구간 배열(AnnotationIndex)로 만든 뒤 캐시에 .npz로 저장한다.
+#   4. 캐시의 배열을 모두 이어 붙인 열(column) 단위 표에서 NumPy로 집계한다.
+# 다시 실행하면 새로 생겼거나 덮어쓴(generation이 바뀐) 결과만 받는다.
+# 실행: python batch_analytics.py --since 20240101 --report explicit labels faces
+# 코어 수에 따른 처리량은 benchmarks/batch_analytics_bench.py 참고
+
+ANALYTICS_CACHE_DIR = "pipeline-state/analytics-cache/" # 결과별 구간 배열 캐시 (이름 + generation)
+DOWNLOAD_WORKERS = 16 # 동시에 받는 수 (HTTP_POOL_SIZE 이하)
+PARSE_WORKERS = os.cpu_count() or 1
+MERGED_PATTERN = re.compile(r'merged_(\d{8})_(\d{6})\.json$')
+REPORTS = ("explicit", "labels", "faces")
+
+
+def cache_path(cache_dir, name, generation):
+    return os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(name))[0]}.{generation}.npz")
+
+
+# 캐시에 없는 결과를 받아서 파싱한다. {name, generation, size, day, cache} 목록을 받아 받은 수를 돌려준다.
+# blob_fn(name, generation) : 현재 스레드에서 쓸 블롭 (download_to_filename이 Content-Encoding을 풀어 준다)
+def sync_cache(entries, blob_fn, cache_dir, download_workers=DOWNLOAD_WORKERS, parse_workers=PARSE_WORKERS):
+    os.makedirs(cache_dir, exist_ok=True)
+    missing = [entry for entry in entries if not os.path.exists(entry["cache"])]
+    if not missing:
+        return 0
+
+    work_dir = tempfile.mkdtemp(dir=cache_dir, prefix="download-")
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=download_workers) as threads, \
+                concurrent.futures.ProcessPoolExecutor(max_workers=parse_workers) as processes:
+            downloads = {threads.submit(download, blob_fn, entry, work_dir): entry for entry in missing}
+            parses = []
+            # 받는 대로 파싱을 넘겨서 다운로드와 파싱이 겹치게 한다.
+            for future in concurrent.futures.as_completed(downloads):
+                entry = downloads[future]
+                try:
+                    path = future.result()
+                except Exception as e:
+                    print(f"다운로드 실패: {entry['name']} ({e})")
+                    continue
+                parses.append((entry, processes.submit(parse_to_cache, path, entry["name"], entry["generation"],
+                                                       entry["cache"])))
+            for entry, future in parses:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"파싱 실패: {entry['name']} ({e})")
+    finally:
+        for path in glob.glob(os.path.join(work_dir, "*")):
+            os.remove(path)
+        os.rmdir(work_dir)
+    return len(missing)
+
+
+def download(blob_fn, entry, work_dir):
+    path = os.path.join(work_dir, os.path.basename(entry["cache"]) + ".json")
+    blob_fn(entry["name"], entry["generation"]).download_to_filename(path)
+    return path
+
+
+# 프로세스 풀에서 실행한다. 같은 이름의 이전 generation 캐시는 지운다.
+def parse_to_cache(path, name, generation, target):
+    with open_file_reader(path) as stream:
+        index = AnnotationIndex.from_stream(stream, {"name": name, "generation": generation})
+    os.remove(path)
+
+    temp_path = f"{target}.tmp"
+    with open(temp_path, "wb") as f:
+        index.save(f)
+    os.replace(temp_path, target)
+
+    stem = target[:-len(f".{generation}.npz")]
+    for stale in glob.glob(f"{glob.escape(stem)}.*.npz"):
+        if stale != target:
+            os.remove(stale)
+    return target
+
+
+# 캐시된 결과들을 열 단위 표 하나로 모은다.
+# {"days": [일자...], "labels": [라벨...], kind: {"clip", "day", "label", "start", "end", "score"}}
+def load_table(entries):
+    days = sorted({entry["day"] for entry in entries})
+    day_ids = {day: position for position, day in enumerate(days)}
+    label_ids = {}
+    columns = {kind: {name: [] for name in ("clip", "day", "label", "start", "end", "score")} for kind in ANNOTATION_TYPES}
+
+    for clip, entry in enumerate(entries):
+        if not os.path.exists(entry["cache"]):
+            continue
+        index = AnnotationIndex.load(entry["cache"])
+        # 결과마다 따로 매긴 라벨 번호를 전체 번호로 바꾼다.
+        mapping = np.array([label_ids.setdefault(label, len(label_ids)) for label in index.labels], dtype=np.int32)
+        for kind, interval in index.intervals.items():
+            count = len(interval)
+            column = columns[kind]
+            column["clip"].append(np.full(count, clip, dtype=np.int32))
+            column["day"].append(np.full(count, day_ids[entry["day"]], dtype=np.int32))
+            column["label"].append(mapping[interval.labels] if count else np.zeros(0, dtype=np.int32))
+            column["start"].append(interval.starts)
+            column["end"].append(interval.ends)
+            column["score"].append(interval.scores.astype(np.float64))
+
+    table = {"days": days, "labels": sorted(label_ids, key=label_ids.get), "clips": len(entries)}
+    for kind, column in columns.items():
+        table[kind] = {name: np.concatenate(values) if values else np.zeros(0) for name, values in column.items()}
+    return table
+
+
+# 일자별 explicit 프레임 수 (가능성 등급별)
+def explicit_per_day(table):
+    explicit = table["explicit"]
+    levels = len(LIKELIHOODS)
+    counts = np.bincount(explicit["day"].astype(np.int64) * levels + explicit["score"].astype(np.int64),
+                         minlength=len(table["days"]) * levels).reshape(len(table["days"]), levels)
+    return {day: dict(zip(LIKELIHOODS, row.tolist())) for day, row in zip(table["days"], counts)}
+
+
+# 오브젝트 라벨별 트랙 수, 등장한 영상 수, 전체 등장 시간(초) (트랙 수 순)
+def label_frequencies(table, top=None):
+    objects = table["object"]
+    label_count = len(table["labels"])
+    tracks = np.bincount(objects["label"].astype(np.int64), minlength=label_count)
+    seconds = np.bincount(objects["label"].astype(np.int64), weights=objects["end"] - objects["start"],
+                          minlength=label_count)
+    pairs = np.unique(objects["clip"].astype(np.int64) * label_count + objects["label"].astype(np.int64))
+    clips = np.bincount(pairs % label_count, minlength=label_count) if label_count else np.zeros(0, dtype=np.int64)
+
+    order = np.argsort(-tracks, kind="stable")
+    order = order[tracks[order] > 0][:top]
+    return [{"label": table["labels"][position], "tracks": int(tracks[position]), "clips": int(clips[position]),
+             "seconds": round(float(seconds[position]), 3)} for position in order]
+
+
+# 일자별 얼굴 트랙 길이(초) 분포
+def face_durations(table):
+    faces = table["face"]
+    durations = faces["end"] - faces["start"]
+    order = np.argsort(faces["day"], kind="stable")
+    days, starts = np.unique(faces["day"][order], return_index=True)
+    summary = {}
+    for day, group in zip(days.tolist(), np.split(durations[order], starts[1:])):
+        p50, p95 = np.percentile(group, [50, 95])
+        summary[table["days"][day]] = {"tracks": len(group), "mean": round(float(group.mean()), 3),
+                                       "p50": round(float(p50), 3), "p95": round(float(p95), 3),
+                                       "max": round(float(group.max()), 3)}
+    return summary
+
+
+# 병합 결과 목록 (since/until은 YYYYMMDD, 포함)
+def list_merged(bucket, prefix, cache_dir=ANALYTICS_CACHE_DIR, since=None, until=None, limit=None):
+    entries = []
+    for blob in bucket.list_blobs(prefix=prefix):
+        match = MERGED_PATTERN.search(blob.name)
+        if not match:
+            continue
+        day = match.group(1)
+        if (since and day < since) or (until and day > until):
+            continue
+        entries.append({"name": blob.name, "generation": blob.generation, "size": blob.size, "day": day,
+                        "cache": cache_path(cache_dir, blob.name, blob.generation)})
+        if limit and len(entries) >= limit:
+            break
+    return entries
+
+
+def run_reports(table, reports=REPORTS, top=20):
+    result = {"clips": table["clips"], "days": len(table["days"])}
+    if "explicit" in reports:
+        result["explicit_per_day"] = explicit_per_day(table)
+    if "labels" in reports:
+        result["labels"] = label_frequencies(table, top)
+    if "faces" in reports:
+        result["face_durations"] = face_durations(table)
+    return result
+
+
+def print_reports(result):
+    print(f"영상 {result['clips']}개, {result['days']}일")
+    if "explicit_per_day" in result:
+        print("\n일자별 explicit 프레임 수")
+        print(f"{'일자':<10}" + "".join(f"{level.replace('LIKELIHOOD_', ''):>15}" for level in LIKELIHOODS))
+        for day, counts in result["explicit_per_day"].items():
+            print(f"{day:<10}" + "".join(f"{count:>15}" for count in counts.values()))
+    if "labels" in result:
+        print("\n오브젝트 라벨")
+        print(f"{'라벨':<20}{'트랙':>10}{'영상':>8}{'시간(초)':>14}")
+        for row in result["labels"]:
+            print(f"{row['label']:<20}{row['tracks']:>10}{row['clips']:>8}{row['seconds']:>14.1f}")
+    if "face_durations" in result:
+        print("\n일자별 얼굴 트랙 길이 (초)")
+        print(f"{'일자':<10}{'트랙':>8}{'평균':>8}{'p50':>8}{'p95':>8}{'최대':>8}")
+        for day, row in result["face_durations"].items():
+            print(f"{day:<10}{row['tracks']:>8}{row['mean']:>8.2f}{row['p50']:>8.2f}{row['p95']:>8.2f}{row['max']:>8.2f}")
+
+
+if __name__ == "__main__":
+    import run_video_intelligence_auto as auto
+    from clients import get_registry
+
+    parser = argparse.ArgumentParser(description="병합 결과 전체에 대한 일괄 통계")
+    parser.add_argument("--prefix", default=auto.FINAL_OUTPUT_PREFIX)
+    parser.add_argument("--since", help="이 날짜(YYYYMMDD)부터")
+    parser.add_argument("--until", help="이 날짜(YYYYMMDD)까지")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--report", nargs="+", choices=REPORTS, default=list(REPORTS))
+    parser.add_argument("--top", type=int, default=20, help="라벨 통계에서 보여줄 라벨 수")
+    parser.add_argument("--cache-dir", default=ANALYTICS_CACHE_DIR)
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS)
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS)
+    parser.add_argument("--json", action="store_true", help="JSON으로 출력")
+    args = parser.parse_args()
+
+    registry = get_registry()
+    entries = list_merged(registry.storage_client().bucket(auto.GCS_BUCKET), args.prefix, args.cache_dir,
+                          args.since, args.until, args.limit)
+    if not entries:
+        print("병합 결과가 없습니다.")
+        sys.exit(1)
+
+    fetched = sync_cache(entries,
+                         lambda name, generation: registry.storage_client().bucket(auto.GCS_BUCKET).blob(name, generation=generation),
+                         args.cache_dir, args.download_workers, args.parse_workers)
+    print(f"병합 결과 {len(entries)}개 중 {fetched}개를 새로 받았습니다.", file=sys.stderr)
+
+    result = run_reports(load_table(entries), args.report, args.top)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_reports(result)
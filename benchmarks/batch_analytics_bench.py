@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_analytics import list_merged, sync_cache, load_table, run_reports, DOWNLOAD_WORKERS
+from benchmarks.synthetic_annotations import write_synthetic_annotation
+from benchmarks.fake_bucket import FakeBucket
+
+# 일괄 통계의 파싱 프로세스 수별 처리량
+# 합성 병합 결과를 메모리 버킷(다운로드마다 --latency초 대기)에 올리고, 빈 캐시에서 파싱 프로세스 수를
+# 1, 2, 4, ... 코어 수까지 늘려 가며 받기 + 파싱 시간을 잰다. 마지막으로 캐시가 찬 상태의 재실행과 집계 시간을 잰다.
+# 파싱은 프로세스마다 독립이므로 코어 수만큼은 거의 선형으로 빨라져야 한다 (코어가 하나인 환경에서는 비교할 수 없다).
+# 실행: python benchmarks/batch_analytics_bench.py --clips 64 --size 2
+
+
+def worker_counts(maximum):
+    counts = []
+    count = 1
+    while count < maximum:
+        counts.append(count)
+        count *= 2
+    return counts + [maximum]
+
+
+def make_bucket(clips, size, latency, work_dir):
+    bucket = FakeBucket(latency=latency)
+    source_dir = os.path.join(work_dir, "source")
+    os.makedirs(source_dir)
+    for clip in range(clips):
+        # 하루 24개씩 여러 날에 나눠 둔다.
+        name = f"merged_202401{clip // 24 + 1:02d}_{clip % 24:02d}0000.json"
+        path = os.path.join(source_dir, name)
+        write_synthetic_annotation(path, size * 1024 * 1024, seed=clip)
+        bucket.add_file(f"visualize-final-output/{name}", path)
+    return bucket
+
+
+def run(clips, size, latency, download_workers, max_workers, work_dir):
+    print(f"합성 병합 결과 {clips}개 ({size}MB씩) 만드는 중...")
+    bucket = make_bucket(clips, size, latency, work_dir)
+    blob_fn = lambda name, generation: bucket.blob(name, generation)
+    print(f"코어 {os.cpu_count()}개, 다운로드 대기 {latency}초, 다운로드 스레드 {download_workers}개")
+    print(f"{'workers':>8} {'seconds':>9} {'clips/s':>9} {'MB/s':>8} {'speedup':>8} {'efficiency':>11}")
+
+    baseline = None
+    cache_dir = os.path.join(work_dir, "cache")
+    for workers in worker_counts(max_workers):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        entries = list_merged(bucket, "visualize-final-output/", cache_dir)
+        started = time.perf_counter()
+        fetched = sync_cache(entries, blob_fn, cache_dir, download_workers, workers)
+        seconds = time.perf_counter() - started
+        if fetched != clips:
+            print(f"{workers:>8} 받은 결과 수가 다릅니다 ({fetched} != {clips})")
+            continue
+        baseline = baseline or seconds
+        print(f"{workers:>8} {seconds:9.2f} {clips / seconds:9.1f} {clips * size / seconds:8.1f} "
+              f"{baseline / seconds:8.2f} {baseline / seconds / workers:11.0%}")
+
+    entries = list_merged(bucket, "visualize-final-output/", cache_dir)
+    started = time.perf_counter()
+    fetched = sync_cache(entries, blob_fn, cache_dir, download_workers, max_workers)
+    cached_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    table = load_table(entries)
+    result = run_reports(table)
+    aggregate_seconds = time.perf_counter() - started
+    tracks = sum(len(table[kind]["start"]) for kind in ("object", "face", "explicit"))
+    print(f"캐시 재실행: {fetched}개 새로 받음, {cached_seconds:.3f}초")
+    print(f"집계: 구간 {tracks}개, 라벨 {len(result['labels'])}개, {aggregate_seconds:.3f}초")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="일괄 통계 파싱 프로세스 수별 처리량 벤치마크")
+    parser.add_argument("--clips", type=int, default=64, help="병합 결과 수")
+    parser.add_argument("--size", type=int, default=2, help="병합 결과 하나의 크기 (MB)")
+    parser.add_argument("--latency", type=float, default=0.05, help="다운로드마다 기다리는 시간 (초)")
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1, help="최대 파싱 프로세스 수")
+    parser.add_argument("--work-dir", default=None, help="임시 파일을 만들 경로 (기본: 시스템 임시 폴더)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        run(args.clips, args.size, args.latency, args.download_workers, args.max_workers, work_dir)
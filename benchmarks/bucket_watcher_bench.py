@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import datetime
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bucket_watcher import BucketWatcher
+from benchmarks.fake_bucket import FakeBlob, FakeBucket
+import run_video_intelligence_auto as auto
+
+# 입력 폴더에 쌓인 객체 수(1k ~ 1M)에 따른 한 번의 폴링 비용을 비교한다.
+#   full-scan : 감시기 이전의 get_latest_video (매번 전체 목록 조회 후 max, full_scan_latest로 옮겨 둠)
+#   watcher   : BucketWatcher.poll (커서 이후만 조회)
+# 실행: python benchmarks/bucket_watcher_bench.py --sizes 1000 10000 100000 1000000
+
+BASE_TIME = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+CLIP_INTERVAL = datetime.timedelta(minutes=3)
+
+
+def clip_blob(index):
+    created = BASE_TIME + CLIP_INTERVAL * index
+    name = f"{auto.INPUT_PREFIX}temp_{created.strftime('%Y%m%d_%H%M%S')}.mp4"
+    return FakeBlob(name, 0, created)
+
+
+def build_bucket(count):
+    bucket = FakeBucket()
+    bucket.extend_sorted(clip_blob(index) for index in range(count))
+    return bucket
+
+
+# 감시기 이전의 최신 영상 찾기 (입력 폴더 전체를 조회한 뒤 생성 시각이 가장 늦은 영상)
+def full_scan_latest(bucket):
+    blobs = list(bucket.list_blobs(prefix=auto.INPUT_PREFIX))
+    video_files = [blob for blob in blobs if blob.name.lower().endswith('.mp4')]
+    if not video_files:
+        return None
+    latest_file = max(video_files, key=lambda x: x.time_created)
+    return latest_file.name.split('/')[-1]
+
+
+def measure(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(sizes, repeat, full_scan_limit):
+    print(f"{'objects':>10} {'full-scan (ms)':>15} {'watcher (ms)':>13} {'listed/poll':>12} {'new clips':>10}")
+    for count in sizes:
+        bucket = build_bucket(count)
+
+        if count <= full_scan_limit:
+            full_scan = measure(lambda: full_scan_latest(bucket), repeat) * 1000
+            full_scan_text = f"{full_scan:15.3f}"
+        else:
+            full_scan_text = f"{'skipped':>15}"
+
+        with tempfile.TemporaryDirectory() as state_dir:
+            watcher = BucketWatcher(bucket, auto.INPUT_PREFIX, os.path.join(state_dir, "cursor.json"))
+            list(watcher.poll()) # 첫 실행: 커서 생성 (전체 조회 1회)
+
+            # 폴링 사이에 클립 두 개가 동시에 올라온 상황을 만든다.
+            next_index = count
+            timings = []
+            new_clips = 0
+            for _ in range(repeat):
+                for _ in range(2):
+                    blob = clip_blob(next_index)
+                    bucket.add(blob.name, blob.time_created)
+                    next_index += 1
+                bucket.listed = 0
+                started = time.perf_counter()
+                new_clips += len(list(watcher.poll()))
+                timings.append(time.perf_counter() - started)
+            listed_per_poll = bucket.listed
+
+        print(f"{count:>10} {full_scan_text} {min(timings) * 1000:13.3f} {listed_per_poll:>12} {new_clips:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="입력 폴더 감시 폴링 비용 벤치마크")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--full-scan-limit", type=int, default=1000000, help="이 개수를 넘으면 전체 조회 측정을 생략")
+    args = parser.parse_args()
+    run(args.sizes, args.repeat, args.full_scan_limit)
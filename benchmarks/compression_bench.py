@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compressed_json import compress_stream, decompress_stream, zstandard, STREAM_CHUNK_SIZE
+from benchmarks.synthetic_annotations import write_synthetic_annotation
+
+# 병합 JSON 압축 형식/수준별 크기와 CPU 시간 비교
+# 업로드 경로와 같은 compress_stream에 4MB씩 흘려 넣고, 뷰어가 받는 것과 같은 전체 압축 해제 시간도 잰다.
+# 실제 병합 결과(--input)를 주지 않으면 합성 분석 결과를 만든다. zstd는 zstandard가 설치된 경우에만 잰다.
+# 실행: python benchmarks/compression_bench.py --input merged_20240101_120000.json
+#       python benchmarks/compression_bench.py --size 100
+
+GZIP_LEVELS = (1, 3, 6, 9)
+ZSTD_LEVELS = (1, 3, 6, 12, 19)
+
+
+class CountingSink:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def read_chunks(path):
+    with open(path, "rb") as f:
+        return list(iter(lambda: f.read(STREAM_CHUNK_SIZE), b""))
+
+
+def measure(chunks, encoding, level, compressed_path):
+    started = time.process_time()
+    with open(compressed_path, "wb") as f:
+        stream = compress_stream(f, encoding, level)
+        for chunk in chunks:
+            stream.write(chunk)
+        stream.close()
+    compress_seconds = time.process_time() - started
+
+    started = time.process_time()
+    sink = CountingSink()
+    with open(compressed_path, "rb") as f:
+        stream = decompress_stream(f, encoding)
+        for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b""):
+            sink.write(chunk)
+    decompress_seconds = time.process_time() - started
+    return os.path.getsize(compressed_path), compress_seconds, decompress_seconds, sink.size
+
+
+def run(path, work_dir):
+    chunks = read_chunks(path)
+    original = sum(len(chunk) for chunk in chunks)
+    megabytes = original / (1024 * 1024)
+    print(f"입력: {path} ({megabytes:.1f}MB)")
+    print(f"{'encoding':>9} {'level':>6} {'size (MB)':>10} {'ratio':>7} {'compress (s)':>13} {'MB/s':>8} "
+          f"{'decompress (s)':>15} {'MB/s':>8}")
+
+    candidates = [("gzip", level) for level in GZIP_LEVELS]
+    if zstandard is not None:
+        candidates += [("zstd", level) for level in ZSTD_LEVELS]
+    else:
+        print("(zstandard가 설치되지 않아 zstd는 건너뜁니다)")
+
+    compressed_path = os.path.join(work_dir, "compressed.bin")
+    for encoding, level in candidates:
+        size, compress_seconds, decompress_seconds, restored = measure(chunks, encoding, level, compressed_path)
+        if restored != original:
+            print(f"{encoding:>9} {level:>6} 압축을 풀었더니 크기가 다릅니다 ({restored} != {original})")
+            continue
+        print(f"{encoding:>9} {level:>6} {size / (1024 * 1024):10.2f} {original / size:7.1f} "
+              f"{compress_seconds:13.2f} {megabytes / max(compress_seconds, 1e-9):8.1f} "
+              f"{decompress_seconds:15.2f} {megabytes / max(decompress_seconds, 1e-9):8.1f}")
+    os.remove(compressed_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="병합 JSON 압축 형식/수준별 크기와 CPU 시간 벤치마크")
+    parser.add_argument("--input", help="실제 병합 결과 JSON 경로 (없으면 합성 분석 결과를 만든다)")
+    parser.add_argument("--size", type=int, default=50, help="합성 분석 결과 크기 (MB)")
+    parser.add_argument("--work-dir", default=None, help="임시 파일을 만들 경로 (기본: 시스템 임시 폴더)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        path = args.input
+        if not path:
+            path = os.path.join(work_dir, f"synthetic_{args.size}mb.json")
+            write_synthetic_annotation(path, args.size * 1024 * 1024)
+        run(path, work_dir)
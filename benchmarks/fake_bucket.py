@@ -0,0 +1,77 @@
+import os
+import time
+import bisect
+import shutil
+import datetime
+
+# 벤치마크용 메모리 버킷
+# google.cloud.storage의 Bucket/Blob 중 파이프라인이 쓰는 부분(list_blobs의 prefix/start_offset)만 흉내 낸다.
+# 객체 이름을 정렬된 리스트로 들고 있어서 실제 GCS처럼 사전순 조회와 start_offset 이동이 O(log n)이다.
+# 내용이 필요한 벤치마크는 add_file로 로컬 파일을 객체로 올리고 download_to_filename으로 받는다.
+# latency를 주면 다운로드마다 그만큼 기다려서 네트워크 왕복 시간을 흉내 낸다 (GIL을 놓으므로 스레드끼리 겹친다).
+
+
+class FakeBlob:
+    __slots__ = ("name", "generation", "time_created", "size", "path", "latency")
+
+    def __init__(self, name, generation, time_created, size=0, path=None, latency=0):
+        self.name = name
+        self.generation = generation
+        self.time_created = time_created
+        self.size = size
+        self.path = path
+        self.latency = latency
+
+    def download_to_filename(self, filename):
+        if self.latency:
+            time.sleep(self.latency)
+        shutil.copyfile(self.path, filename)
+
+
+class FakeBucket:
+    def __init__(self, name="fake-bucket", latency=0):
+        self.name = name
+        self.latency = latency # 다운로드마다 기다리는 시간 (초)
+        self.names = []
+        self.objects = {}
+        self.listed = 0 # list_blobs가 돌려준 객체 수 누계
+        self.generation = 0
+
+    def add(self, name, time_created=None, size=0):
+        self.generation += 1
+        if time_created is None:
+            time_created = datetime.datetime.now(datetime.timezone.utc)
+        if name not in self.objects:
+            bisect.insort(self.names, name)
+        self.objects[name] = FakeBlob(name, self.generation, time_created, size)
+        return self.objects[name]
+
+    def add_file(self, name, path, time_created=None):
+        blob = self.add(name, time_created, os.path.getsize(path))
+        blob.path = path
+        blob.latency = self.latency
+        return blob
+
+    def blob(self, name, generation=None):
+        return self.objects[name]
+
+    # 이미 정렬된 이름을 한 번에 넣는다 (대량 생성용)
+    def extend_sorted(self, blobs):
+        for blob in blobs:
+            self.generation += 1
+            blob.generation = self.generation
+            self.objects[blob.name] = blob
+            self.names.append(blob.name)
+
+    def list_blobs(self, prefix=None, start_offset=None, end_offset=None, **kwargs):
+        prefix = prefix or ""
+        start = max(prefix, start_offset or "")
+        index = bisect.bisect_left(self.names, start)
+        while index < len(self.names):
+            name = self.names[index]
+            if not name.startswith(prefix) or (end_offset is not None and name >= end_offset):
+                break
+            self.listed += 1
+            yield self.objects[name]
+            index += 1
+
@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_annotations import write_synthetic_annotation, synthetic_aws_result
+
+# 로컬 백엔드로 감시 -> 분석 -> 병합 -> 게시 전체를 돌리고 처리량과 단계별 시간, 메모리를 잰다.
+# 클립 수마다 새 프로세스를 띄워서 (처리 기록, 결과 대기 등 전역 상태와 최대 RSS가 섞이지 않게) 실행한다.
+#   - 로컬 버킷에 클립 N개를 올리고 감시 루프 한 바퀴(process_new_videos와 같은 본문)로 감지한 뒤
+#     모든 클립이 게시(published)되거나 실패할 때까지 기다린다.
+#   - 가짜 분석기는 --size MB짜리 합성 분석 결과를 --annotate-latency초 뒤에 돌려주고,
+#     가짜 AWS 서비스는 --moderation-latency초 뒤에 AWS 결과를 올린다.
+#   - 단계는 경로별로 묶어 보여준다 (감시/분석, 병합, 게시). 값은 metrics.py의 단계별 측정이다.
+# 실행: python benchmarks/pipeline_bench.py --clips 10 50 --size 5 --pipeline --workers 8
+
+PATHS = {
+    "watch": ("list", "submit", "annotate", "moderation_request"),
+    "merge": ("aws_wait", "list_aws", "find_aws", "aws_download", "merge_stream"),
+    "publish": ("copy_final", "artifact", "notify", "timeline"),
+}
+WAIT_TIMEOUT = 600 # 모든 클립이 끝나기를 기다리는 최대 시간 (초)
+PIPELINE_POLL_INTERVAL = 0.1 # 파이프라인이 operation 완료를 확인하는 간격 (기본 10초는 가짜 분석기에 비해 너무 길다)
+
+
+def run_child(options):
+    import run_video_intelligence_auto as auto
+    from bucket_watcher import BucketWatcher
+    from clients import set_registry
+    from job_ledger import PUBLISHED, FAILED
+    from local_backends import LocalRegistry, StubServices
+    from metrics import get_metrics
+
+    work_dir = options["work_dir"]
+    registry = set_registry(LocalRegistry(os.path.join(work_dir, "bucket"), [options["recording"]],
+                                          options["annotate_latency"]))
+    auto.use_state_dir(os.path.join(work_dir, "state"))
+    stubs = StubServices(registry.storage, auto.GCS_BUCKET, auto.AWS_OUTPUT_PREFIX, 0, 0,
+                         options["moderation_latency"], options["aws_recording"]).start()
+    auto.MODERATION_API_URL = stubs.moderation_url
+    auto.MERGE_COMPLETE_URL = stubs.notify_url
+
+    bucket = registry.storage_client().bucket(auto.GCS_BUCKET)
+    clips = options["clips"]
+    for index in range(clips):
+        # 내용이 같으면 이전 분석 결과를 다시 쓰므로 클립마다 내용을 다르게 한다.
+        name = f"clip_20240101_{index // 3600:02d}{index // 60 % 60:02d}{index % 60:02d}.mp4"
+        bucket.blob(f"{auto.INPUT_PREFIX}{name}").upload_from_string(f"fake video {index}".encode("utf-8"),
+                                                                     content_type="video/mp4")
+
+    pipeline = None
+    if options["pipeline"]:
+        pipeline = auto.build_pipeline(registry, options["workers"], project_limit=options["workers"])
+        pipeline.poll_interval = PIPELINE_POLL_INTERVAL
+        pipeline.start()
+
+    started = time.perf_counter()
+    watcher = BucketWatcher(bucket, auto.INPUT_PREFIX, auto.WATCHER_CURSOR_PATH, suffixes=('.mp4',),
+                            start_from_latest=False)
+    join = auto.get_rendezvous(registry)
+    with get_metrics().timer("list"):
+        new_blobs = watcher.list_new_blobs()
+    for blob in new_blobs:
+        auto.handle_new_video(registry, join, blob, pipeline)
+        watcher.advance(blob)
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        counts = auto.get_ledger().counts()
+        if counts.get(PUBLISHED, 0) + counts.get(FAILED, 0) >= clips:
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    if pipeline:
+        pipeline.stop(wait=False)
+    join.stop(wait=False)
+    stubs.stop()
+    seconds = get_metrics().snapshot()["seconds"]
+    print(json.dumps({
+        "seconds": elapsed,
+        "counts": counts,
+        "stages": {stage: {"count": summary["count"], "p50": summary["p50"], "p95": summary["p95"]}
+                   for stage, summary in seconds.items()},
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stubs": stubs.stats(),
+    }))
+
+
+def measure(clips, args, recording, aws_recording, work_dir):
+    options = {"clips": clips, "recording": recording, "aws_recording": aws_recording,
+               "annotate_latency": args.annotate_latency, "moderation_latency": args.moderation_latency,
+               "pipeline": args.pipeline, "workers": args.workers,
+               "work_dir": tempfile.mkdtemp(dir=work_dir, prefix=f"clips{clips}-")}
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(options)],
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "실패")
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def print_result(clips, result):
+    published = result["counts"].get("published", 0)
+    print(f"\n클립 {clips}개: 게시 {published}개, {result['seconds']:.1f}초, "
+          f"{published / result['seconds'] * 60:.1f} clips/min, 최대 RSS {result['peak_rss_mb']:.1f}MB")
+    print(f"  처리 기록: {result['counts']}, 가짜 서비스: {result['stubs']}")
+    print(f"  {'path':<8}{'stage':<20}{'count':>7}{'p50 (s)':>10}{'p95 (s)':>10}")
+    for path, stages in PATHS.items():
+        for stage in stages:
+            summary = result["stages"].get(stage)
+            if summary and summary["count"]:
+                print(f"  {path:<8}{stage:<20}{summary['count']:>7}{summary['p50']:>10.3f}{summary['p95']:>10.3f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_child(json.loads(sys.argv[2]))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="로컬 백엔드 전체 흐름 처리량/단계별 시간/메모리 벤치마크")
+    parser.add_argument("--clips", type=int, nargs="+", default=[10, 50], help="클립 수")
+    parser.add_argument("--size", type=float, default=2, help="클립 하나의 분석 결과 크기 (MB)")
+    parser.add_argument("--annotate-latency", type=float, default=1.0, help="가짜 분석 한 건의 소요 시간 (초)")
+    parser.add_argument("--moderation-latency", type=float, default=0.5, help="가짜 AWS 결과가 올라오기까지 걸리는 시간 (초)")
+    parser.add_argument("--pipeline", action="store_true", help="여러 영상을 동시에 분석하는 파이프라인 모드")
+    parser.add_argument("--workers", type=int, default=4, help="파이프라인 작업자 수 (동시 분석 수)")
+    parser.add_argument("--work-dir", default=None, help="임시 파일을 만들 경로 (기본: 시스템 임시 폴더)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        recording = os.path.join(work_dir, "recording.json")
+        write_synthetic_annotation(recording, int(args.size * 1024 * 1024))
+        aws_recording = os.path.join(work_dir, "aws.json")
+        with open(aws_recording, "w", encoding="utf-8") as f:
+            json.dump(synthetic_aws_result(), f)
+
+        mode = f"파이프라인 (작업자 {args.workers}개)" if args.pipeline else "한 영상씩"
+        print(f"{mode}, 분석 {args.annotate_latency}초, AWS {args.moderation_latency}초, 결과 {args.size}MB")
+        for clips in args.clips:
+            result = measure(clips, args, recording, aws_recording, work_dir)
+            if result is not None:
+                print_result(clips, result)
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming_merge import stream_merge
+from benchmarks.synthetic_annotations import write_synthetic_annotation, synthetic_aws_result
+
+# 기존 병합(download_as_text + json.loads + json.dumps 두 번)과 스트리밍 병합의 최대 RSS와 소요 시간 비교
+# 측정마다 새 프로세스를 띄워서 최대 RSS가 서로 섞이지 않게 한다. GCS 입출력 대신 로컬 파일을 쓴다.
+# 실행: python benchmarks/streaming_merge_bench.py --sizes 10 100 500
+
+
+# 기존 merge_json_files와 같은 방식
+def baseline_merge(temp_path, aws_path, merged_path, final_path):
+    with open(aws_path, "rb") as f:
+        aws_data = json.loads(f.read().decode("utf-8"))
+    with open(temp_path, "rb") as f:
+        temp_data = json.loads(f.read().decode("utf-8"))
+
+    if 'annotation_results' in temp_data and len(temp_data['annotation_results']) > 0:
+        temp_data['annotation_results'][0]['explicit_annotation'] = aws_data.get('explicit_annotation', {})
+    else:
+        temp_data['annotation_results'] = [{
+            'face_detection_annotations': [],
+            'explicit_annotation': aws_data.get('explicit_annotation', {}),
+            'object_annotations': []
+        }]
+
+    with open(merged_path, "wb") as f:
+        f.write(json.dumps(temp_data).encode("utf-8"))
+    with open(final_path, "wb") as f:
+        f.write(json.dumps(temp_data).encode("utf-8"))
+
+
+# 스트리밍 병합 (final_output.json은 버킷 안 복사에 해당하는 파일 복사)
+def streaming_merge(temp_path, aws_path, merged_path, final_path):
+    with open(aws_path, "rb") as f:
+        aws_data = json.loads(f.read().decode("utf-8"))
+    with open(temp_path, "rb") as source, open(merged_path, "wb") as sink:
+        stream_merge(source, sink, aws_data.get('explicit_annotation', {}))
+    shutil.copyfile(merged_path, final_path)
+
+
+METHODS = {"baseline": baseline_merge, "streaming": streaming_merge}
+
+
+def run_child(method, temp_path, aws_path, merged_path, final_path):
+    started = time.perf_counter()
+    METHODS[method](temp_path, aws_path, merged_path, final_path)
+    elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"seconds": elapsed, "peak_rss_mb": peak_kb / 1024}))
+
+
+def measure(method, temp_path, aws_path, work_dir):
+    merged_path = os.path.join(work_dir, f"merged_{method}.json")
+    final_path = os.path.join(work_dir, f"final_{method}.json")
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", method, temp_path, aws_path, merged_path, final_path],
+        capture_output=True, text=True)
+    if completed.returncode != 0:
+        return None, None
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    with open(merged_path, "rb") as f:
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    os.remove(merged_path)
+    os.remove(final_path)
+    return result, digest.hexdigest()
+
+
+def run(sizes, work_dir):
+    print(f"{'size':>8} {'method':>10} {'wall (s)':>9} {'peak RSS (MB)':>14} {'same output':>12}")
+    for size_mb in sizes:
+        temp_path = os.path.join(work_dir, f"temp_{size_mb}mb.json")
+        aws_path = os.path.join(work_dir, "aws.json")
+        write_synthetic_annotation(temp_path, size_mb * 1024 * 1024)
+        with open(aws_path, "w", encoding="utf-8") as f:
+            json.dump(synthetic_aws_result(), f)
+
+        digests = {}
+        for method in METHODS:
+            result, digests[method] = measure(method, temp_path, aws_path, work_dir)
+            if result is None:
+                print(f"{size_mb:>6}MB {method:>10} {'failed (메모리 부족?)':>24}")
+                continue
+            same = "-"
+            if method == "streaming" and digests.get("baseline"):
+                same = "yes" if digests["baseline"] == digests["streaming"] else "NO"
+            print(f"{size_mb:>6}MB {method:>10} {result['seconds']:9.2f} {result['peak_rss_mb']:14.1f} {same:>12}")
+        os.remove(temp_path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_child(*sys.argv[2:7])
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="JSON 병합 방식별 메모리/시간 벤치마크")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500], help="분석 결과 파일 크기 (MB)")
+    parser.add_argument("--work-dir", default=None, help="임시 파일을 만들 경로 (기본: 시스템 임시 폴더)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        run(args.sizes, work_dir)
@@ -0,0 +1,105 @@
+import json
+import random
+
+# 벤치마크용 가짜 Video Intelligence 분석 결과 JSON 생성기
+# 실제 출력과 같은 구조(annotation_results[0] 아래 face_detection_annotations / object_annotations /
+# explicit_annotation, 프레임마다 normalized_bounding_box와 time_offset)를 2칸 들여쓰기로 만든다.
+# 트랙을 하나씩 써 내려가므로 큰 파일도 메모리를 거의 쓰지 않고 만들 수 있다.
+
+LABELS = ["person", "car", "bicycle", "dog", "bag", "chair", "bottle", "truck", "cat", "umbrella"]
+LIKELIHOODS = ["VERY_UNLIKELY", "UNLIKELY", "POSSIBLE", "LIKELY", "VERY_LIKELY"]
+FRAME_INTERVAL = 0.1
+
+
+def time_offset(seconds):
+    whole = int(seconds)
+    nanos = int(round((seconds - whole) * 1e9))
+    offset = {}
+    if whole:
+        offset["seconds"] = whole
+    if nanos:
+        offset["nanos"] = nanos
+    return offset
+
+
+def random_box(rng):
+    left, top = rng.random() * 0.7, rng.random() * 0.7
+    return {"left": left, "top": top, "right": left + rng.random() * 0.3, "bottom": top + rng.random() * 0.3}
+
+
+def object_track(rng, duration, frames_per_track):
+    start = rng.random() * max(duration - frames_per_track * FRAME_INTERVAL, 1)
+    frames = [{"normalized_bounding_box": random_box(rng), "time_offset": time_offset(start + index * FRAME_INTERVAL)}
+              for index in range(frames_per_track)]
+    return {
+        "entity": {"entity_id": f"/m/0{rng.randint(1000, 9999)}", "description": rng.choice(LABELS), "language_code": "en-US"},
+        "segment": {"start_time_offset": time_offset(start),
+                    "end_time_offset": time_offset(start + (frames_per_track - 1) * FRAME_INTERVAL)},
+        "confidence": rng.random(),
+        "frames": frames,
+    }
+
+
+def face_annotation(rng, duration, frames_per_track):
+    start = rng.random() * max(duration - frames_per_track * FRAME_INTERVAL, 1)
+    objects = [{"normalized_bounding_box": random_box(rng), "time_offset": time_offset(start + index * FRAME_INTERVAL)}
+               for index in range(frames_per_track)]
+    return {
+        "thumbnail": "iVBORw0KGgo" + "A" * 64,
+        "tracks": [{
+            "segment": {"start_time_offset": time_offset(start),
+                        "end_time_offset": time_offset(start + (frames_per_track - 1) * FRAME_INTERVAL)},
+            "timestamped_objects": objects,
+            "attributes": [{"name": name, "confidence": rng.random()}
+                           for name in ("glasses", "eyes_visible", "headwear", "looking_at_camera", "mouth_open", "smiling")],
+            "confidence": rng.random(),
+        }],
+    }
+
+
+def explicit_annotation(rng, duration):
+    return {"frames": [{"time_offset": time_offset(second), "pornography_likelihood": rng.choice(LIKELIHOODS)}
+                       for second in range(int(duration))]}
+
+
+def indented(value, level):
+    return json.dumps(value, indent=2).replace("\n", "\n" + "  " * level)
+
+
+def write_array(f, name, items, level, last=False):
+    f.write("  " * level + json.dumps(name) + ": [")
+    first = True
+    for item in items:
+        f.write("\n" if first else ",\n")
+        f.write("  " * (level + 1) + indented(item, level + 1))
+        first = False
+    f.write("\n" + "  " * level + "]" + ("" if last else ",") + "\n")
+
+
+# target_bytes 정도 크기의 분석 결과 파일을 path에 만든다. 실제로 쓴 바이트 수를 돌려준다.
+def write_synthetic_annotation(path, target_bytes, seed=0, duration=600, frames_per_track=300):
+    rng = random.Random(seed)
+    face_share = target_bytes // 5 # 얼굴 인식 20%, 오브젝트 트래킹 80%
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{\n  \"annotation_results\": [\n    {\n")
+        f.write(f"      \"input_uri\": \"/highbuff_developer_seoul/visualize-input/temp_20240101_000000.mp4\",\n")
+        f.write("      \"segment\": " + indented({"start_time_offset": {}, "end_time_offset": time_offset(duration)}, 3) + ",\n")
+
+        def faces():
+            while f.tell() < face_share:
+                yield face_annotation(rng, duration, frames_per_track)
+
+        def objects():
+            while f.tell() < target_bytes:
+                yield object_track(rng, duration, frames_per_track)
+
+        write_array(f, "face_detection_annotations", faces(), 3)
+        write_array(f, "object_annotations", objects(), 3)
+        f.write("      \"explicit_annotation\": " + indented(explicit_annotation(rng, duration), 3) + "\n")
+        f.write("    }\n  ]\n}\n")
+        return f.tell()
+
+
+def synthetic_aws_result(seed=1, duration=600):
+    return {"explicit_annotation": explicit_annotation(random.Random(seed), duration)}
@@ -0,0 +1,82 @@
+import os
+import json
+import datetime
+
+# 버킷에서 새로 올라온 영상만 골라내는 증분 감시기
+#
+# RTSP 녹화기는 'temp_YYYYMMDD_HHMMSS.mp4' 형태로 파일을 만들기 때문에 이름의 사전순이 곧 생성 순서다.
+# 마지막으로 처리한 파일 이름(커서)을 로컬에 저장해 두고, list_blobs(start_offset=커서)로
+# 커서 이후의 객체만 조회한다. 버킷에 객체가 아무리 쌓여도 한 번의 조회 비용은 새 파일 수에만 비례한다.
+
+LIST_FIELDS = "items(name,generation,timeCreated,size,md5Hash,crc32c),nextPageToken"
+
+
+class BucketWatcher:
+    def __init__(self, bucket, prefix, cursor_path, suffixes=('.mp4',), start_from_latest=True):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.cursor_path = cursor_path
+        self.suffixes = tuple(suffix.lower() for suffix in suffixes)
+        self.start_from_latest = start_from_latest
+        self.cursor = self.load_cursor()
+
+    # 저장된 커서 읽기 (없으면 None)
+    def load_cursor(self):
+        if not os.path.exists(self.cursor_path):
+            return None
+        with open(self.cursor_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    # 커서를 임시 파일에 쓴 뒤 교체해서 중간에 죽어도 커서 파일이 깨지지 않도록 한다.
+    def save_cursor(self):
+        directory = os.path.dirname(self.cursor_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.cursor_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.cursor, f)
+        os.replace(temp_path, self.cursor_path)
+
+    def is_video(self, name):
+        return name.lower().endswith(self.suffixes)
+
+    # 커서보다 뒤에 있는 객체인지 확인 (같은 이름이라도 덮어써서 generation이 올라갔다면 새 객체로 본다)
+    def is_new(self, blob):
+        if self.cursor is None:
+            return True
+        if blob.name > self.cursor["name"]:
+            return True
+        return blob.name == self.cursor["name"] and (blob.generation or 0) > (self.cursor["generation"] or 0)
+
+    def advance(self, blob):
+        time_created = blob.time_created.isoformat() if isinstance(blob.time_created, datetime.datetime) else blob.time_created
+        self.cursor = {
+            "name": blob.name,
+            "generation": blob.generation,
+            "time_created": time_created,
+        }
+        self.save_cursor()
+
+    # 커서 이후의 영상 목록 (이름순)
+    def list_new_blobs(self):
+        if self.cursor is None:
+            # 커서가 없는 첫 실행에서만 전체 목록을 한 번 훑는다.
+            blobs = [blob for blob in self.bucket.list_blobs(prefix=self.prefix, fields=LIST_FIELDS)
+                     if self.is_video(blob.name)]
+            blobs.sort(key=lambda blob: blob.name)
+            if self.start_from_latest and blobs:
+                # 기존 동작과 같이 가장 최근 영상 하나만 처리 대상으로 삼는다.
+                latest = max(blobs, key=lambda blob: blob.time_created)
+                return [latest]
+            return blobs
+
+        # start_offset은 자기 자신을 포함하므로 커서 객체는 is_new에서 걸러진다.
+        blobs = self.bucket.list_blobs(prefix=self.prefix, start_offset=self.cursor["name"], fields=LIST_FIELDS)
+        return [blob for blob in blobs if self.is_video(blob.name) and self.is_new(blob)]
+
+    # 새 영상을 순서대로 하나씩 돌려준다.
+    # 호출한 쪽의 처리가 끝나 다음 값을 요청할 때 커서를 전진시키므로, 처리 도중 죽으면 그 영상부터 다시 받는다.
+    def poll(self):
+        for blob in self.list_new_blobs():
+            yield blob
+            self.advance(blob)
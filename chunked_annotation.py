@@ -0,0 +1,337 @@
+import copy
+import time
+import struct
+import concurrent.futures
+
+# 긴 녹화 영상을 구간(VideoContext.segments)으로 나눠 동시에 분석하고 결과를 하나로 이어 붙인다.
+#
+# 영상 하나를 통째로 annotate_video로 보내면 한 시간짜리 녹화는 전체 분석이 끝날 때까지 아무것도 볼 수 없다.
+# 구간마다 별도의 operation을 동시에 보내고, 끝나는 구간부터 지금까지의 결과를 이어 붙여 on_partial로 넘긴다.
+# 이어 붙일 때는
+#   - 구간 결과의 time_offset이 구간 시작 기준이면 영상 시작 기준으로 옮기고
+#   - 구간 경계에서 끊긴 트랙(같은 라벨, 경계 직전/직후 프레임의 박스가 겹침)을 하나의 트랙으로 합치고
+#   - track_id가 있으면 구간끼리 겹치지 않도록 다시 매긴다.
+
+CHUNK_SECONDS = 300 # 구간 길이 (초)
+CHUNK_MAX_IN_FLIGHT = 8 # 한 영상에서 동시에 진행할 구간 분석 수
+SEGMENT_POLL_INTERVAL = 10 # 진행 중인 구간 operation들을 확인하는 간격 (초)
+BOUNDARY_GAP = 1.0 # 경계에서 이 시간(초) 안에 끝나고 시작한 트랙만 이어 붙일 후보로 본다
+MATCH_IOU = 0.3 # 경계 양쪽 박스가 이 이상 겹쳐야 같은 트랙으로 본다
+RELATIVE_TOLERANCE = 1.0 # 구간 시작보다 이만큼 이른 시간이 있으면 구간 기준 시간으로 본다
+MP4_CONTAINERS = (b"moov",)
+
+
+def offset_to_seconds(time_offset):
+    if not time_offset:
+        return 0.0
+    return float(time_offset.get("seconds", 0) or 0) + (time_offset.get("nanos", 0) or 0) / 1e9
+
+
+def seconds_to_offset(seconds):
+    whole = int(seconds)
+    nanos = int(round((seconds - whole) * 1e9))
+    if nanos >= 1000000000:
+        whole, nanos = whole + 1, nanos - 1000000000
+    offset = {}
+    if whole:
+        offset["seconds"] = whole
+    if nanos:
+        offset["nanos"] = nanos
+    return offset
+
+
+# MP4 헤더(moov/mvhd)만 범위 요청으로 읽어 영상 길이(초)를 구한다. 찾지 못하면 None
+def probe_duration(blob):
+    blob.reload()
+    size = blob.size
+
+    def read(start, length):
+        return blob.download_as_bytes(start=start, end=min(start + length, size) - 1)
+
+    def boxes(start, end):
+        offset = start
+        while offset + 8 <= end:
+            header = read(offset, 16)
+            box_size, box_type = struct.unpack(">I4s", header[:8])
+            header_size = 8
+            if box_size == 1:
+                box_size = struct.unpack(">Q", header[8:16])[0]
+                header_size = 16
+            elif box_size == 0:
+                box_size = end - offset
+            if box_size < header_size:
+                return
+            yield box_type, offset + header_size, offset + box_size
+            offset += box_size
+
+    for box_type, body_start, body_end in boxes(0, size):
+        if box_type not in MP4_CONTAINERS:
+            continue
+        for child_type, child_start, child_end in boxes(body_start, body_end):
+            if child_type != b"mvhd":
+                continue
+            body = read(child_start, 32)
+            if body[0] == 1:
+                timescale, duration = struct.unpack(">IQ", body[20:32])
+            else:
+                timescale, duration = struct.unpack(">II", body[12:20])
+            return duration / timescale if timescale else None
+    return None
+
+
+# [0, duration)을 chunk_seconds 길이의 구간 목록 [(start, end), ...]으로 나눈다.
+# 마지막 구간이 너무 짧으면(절반 미만) 앞 구간에 붙인다.
+def plan_segments(duration, chunk_seconds=CHUNK_SECONDS):
+    segments = []
+    start = 0.0
+    while start < duration:
+        end = min(start + chunk_seconds, duration)
+        if segments and end - start < chunk_seconds / 2:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+        start = end
+    return segments
+
+
+# 값 안의 모든 *time_offset 값을 shift초만큼 옮긴다.
+def shift_offsets(value, shift):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key.endswith("time_offset") and isinstance(item, dict):
+                value[key] = seconds_to_offset(offset_to_seconds(item) + shift)
+            else:
+                shift_offsets(item, shift)
+    elif isinstance(value, list):
+        for item in value:
+            shift_offsets(item, shift)
+
+
+def earliest_offset(value):
+    earliest = None
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key.endswith("time_offset") and isinstance(item, dict):
+                found = offset_to_seconds(item)
+            else:
+                found = earliest_offset(item)
+            if found is not None and (earliest is None or found < earliest):
+                earliest = found
+    elif isinstance(value, list):
+        for item in value:
+            found = earliest_offset(item)
+            if found is not None and (earliest is None or found < earliest):
+                earliest = found
+    return earliest
+
+
+# 구간 결과를 영상 시작 기준 시간으로 맞춘다.
+def align_result(result, start):
+    annotations = {key: value for key, value in result.items() if key not in ("segment", "input_uri")}
+    earliest = earliest_offset(annotations)
+    if start and earliest is not None and earliest < start - RELATIVE_TOLERANCE:
+        shift_offsets(annotations, start)
+    return result
+
+
+def iou(first, second):
+    if not first or not second:
+        return 0.0
+    left, top = max(first.get("left", 0), second.get("left", 0)), max(first.get("top", 0), second.get("top", 0))
+    right = min(first.get("right", 0), second.get("right", 0))
+    bottom = min(first.get("bottom", 0), second.get("bottom", 0))
+    if right <= left or bottom <= top:
+        return 0.0
+    overlap = (right - left) * (bottom - top)
+
+    def area(box):
+        return max(box.get("right", 0) - box.get("left", 0), 0) * max(box.get("bottom", 0) - box.get("top", 0), 0)
+
+    union = area(first) + area(second) - overlap
+    return overlap / union if union > 0 else 0.0
+
+
+# 오브젝트 트랙 / 얼굴 트랙의 공통 접근
+class ObjectTrackAccess:
+    @staticmethod
+    def frames(annotation):
+        return annotation.setdefault("frames", [])
+
+    @staticmethod
+    def track(annotation):
+        return annotation
+
+    @staticmethod
+    def label(annotation):
+        entity = annotation.get("entity", {})
+        return entity.get("entity_id") or entity.get("description")
+
+
+class FaceTrackAccess:
+    @staticmethod
+    def frames(annotation):
+        return FaceTrackAccess.track(annotation).setdefault("timestamped_objects", [])
+
+    @staticmethod
+    def track(annotation):
+        tracks = annotation.setdefault("tracks", [])
+        if not tracks:
+            tracks.append({})
+        return tracks[0]
+
+    @staticmethod
+    def label(annotation):
+        return "face"
+
+
+# previous 트랙 뒤에 following 트랙을 이어 붙인다. 신뢰도와 얼굴 속성은 프레임 수로 가중 평균한다.
+def join_tracks(previous, following, access):
+    previous_frames, following_frames = access.frames(previous), access.frames(following)
+    weights = (len(previous_frames), len(following_frames))
+    total = sum(weights) or 1
+    previous_track, following_track = access.track(previous), access.track(following)
+
+    previous_track["confidence"] = (previous_track.get("confidence", 0) * weights[0]
+                                    + following_track.get("confidence", 0) * weights[1]) / total
+    following_attributes = {attribute.get("name"): attribute.get("confidence", 0)
+                            for attribute in following_track.get("attributes", [])}
+    for attribute in previous_track.get("attributes", []):
+        if attribute.get("name") in following_attributes:
+            attribute["confidence"] = (attribute.get("confidence", 0) * weights[0]
+                                       + following_attributes[attribute["name"]] * weights[1]) / total
+
+    previous_frames.extend(following_frames)
+    segment = previous_track.setdefault("segment", {})
+    following_end = following_track.get("segment", {}).get("end_time_offset")
+    if following_end is not None:
+        segment["end_time_offset"] = following_end
+
+
+# 경계(boundary) 앞쪽에서 끝난 트랙(open_tracks)과 뒤쪽에서 시작한 트랙(new_tracks)을 IoU가 큰 쌍부터 짝짓는다.
+# {new_tracks 순번: open_tracks 항목} 을 돌려준다.
+def match_boundary(open_tracks, new_tracks, boundary, access):
+    candidates = []
+    for new_position, annotation in enumerate(new_tracks):
+        frames = access.frames(annotation)
+        if not frames or offset_to_seconds(frames[0].get("time_offset")) > boundary + BOUNDARY_GAP:
+            continue
+        for previous in open_tracks:
+            previous_frames = access.frames(previous)
+            if not previous_frames or access.label(previous) != access.label(annotation):
+                continue
+            if offset_to_seconds(previous_frames[-1].get("time_offset")) < boundary - BOUNDARY_GAP:
+                continue
+            overlap = iou(previous_frames[-1].get("normalized_bounding_box"), frames[0].get("normalized_bounding_box"))
+            if overlap >= MATCH_IOU:
+                candidates.append((overlap, new_position, id(previous), previous))
+
+    matches = {}
+    used = set()
+    for overlap, new_position, previous_id, previous in sorted(candidates, key=lambda item: -item[0]):
+        if new_position in matches or previous_id in used:
+            continue
+        matches[new_position] = previous
+        used.add(previous_id)
+    return matches
+
+
+# [(start, end, annotation_result), ...] 를 시간순으로 이어 붙여 하나의 annotation_result를 만든다.
+# 바로 이웃한 구간끼리만 경계의 트랙을 합친다.
+def stitch_results(parts):
+    parts = sorted(parts, key=lambda part: part[0])
+    stitched = {}
+    open_tracks = {"object_annotations": [], "face_detection_annotations": []}
+    accesses = {"object_annotations": ObjectTrackAccess, "face_detection_annotations": FaceTrackAccess}
+    next_track_id = 0
+    previous_end = None
+
+    for start, end, result in parts:
+        adjacent = previous_end is not None and abs(previous_end - start) < 1e-6
+        for key, value in result.items():
+            if key == "segment":
+                continue
+            if key in accesses and isinstance(value, list):
+                track_id_map = {}
+                merged_list = stitched.setdefault(key, [])
+                matches = match_boundary(open_tracks[key], value, start, accesses[key]) if adjacent else {}
+                opened = []
+                for position, annotation in enumerate(value):
+                    if "track_id" in annotation:
+                        old_id = annotation["track_id"]
+                        if position in matches and "track_id" in matches[position]:
+                            track_id_map[old_id] = matches[position]["track_id"]
+                        elif old_id not in track_id_map:
+                            track_id_map[old_id] = type(old_id)(next_track_id)
+                            next_track_id += 1
+                        annotation["track_id"] = track_id_map[old_id]
+                    if position in matches:
+                        join_tracks(matches[position], annotation, accesses[key])
+                        opened.append(matches[position])
+                    else:
+                        merged_list.append(annotation)
+                        opened.append(annotation)
+                open_tracks[key] = opened
+            elif isinstance(value, list):
+                stitched.setdefault(key, []).extend(value)
+            elif isinstance(value, dict) and isinstance(value.get("frames"), list):
+                stitched.setdefault(key, {"frames": []})["frames"].extend(value["frames"])
+            else:
+                stitched.setdefault(key, value)
+        previous_end = end
+
+    if parts:
+        stitched["segment"] = {"start_time_offset": seconds_to_offset(parts[0][0]),
+                               "end_time_offset": seconds_to_offset(parts[-1][1])}
+    return {"annotation_results": [stitched]}
+
+
+# 구간들을 동시에 분석하고 이어 붙인 결과를 돌려준다.
+# 구간마다 스레드를 두고 operation.result()로 막혀 있지 않고, 부른 스레드 하나가 진행 중인 operation들을
+# poll_interval마다 돌아가며 확인한다 (AnnotationPipeline의 폴링 스레드와 같은 방식).
+#   submit_fn(index, start, end) -> (operation, output_name) : operation이 None이면 이미 끝난 구간 (재시작 후 등)
+#   read_fn(output_name) -> 분석 결과 JSON(dict)
+#   on_partial(result, finished, total) : 구간 하나가 끝날 때마다 지금까지 끝난 구간을 이어 붙인 결과
+#   on_segment_done(index, output_name) : 구간 하나의 분석 결과를 읽은 뒤
+def annotate_in_segments(segments, submit_fn, read_fn, on_partial=None, max_in_flight=CHUNK_MAX_IN_FLIGHT, timeout=1800,
+                         poll_interval=SEGMENT_POLL_INTERVAL, on_segment_done=None):
+    waiting = list(enumerate(segments))
+    in_flight = {} # 구간 번호 -> (operation, 결과 파일 이름, 요청 시각)
+    finished = {}
+    while waiting or in_flight:
+        while waiting and len(in_flight) < max_in_flight:
+            index, (start, end) = waiting.pop(0)
+            operation, output_name = submit_fn(index, start, end)
+            in_flight[index] = (operation, output_name, time.monotonic())
+
+        done = []
+        for index, (operation, output_name, submitted_at) in in_flight.items():
+            if operation is None or operation.done():
+                done.append(index)
+            elif time.monotonic() - submitted_at > timeout:
+                raise concurrent.futures.TimeoutError(f"구간 {index + 1}/{len(segments)} 분석 시간 초과")
+        if not done:
+            time.sleep(poll_interval)
+            continue
+
+        for index in done:
+            operation, output_name, _ = in_flight.pop(index)
+            if operation is not None:
+                operation.result() # 분석이 실패했으면 여기서 오류가 난다
+            results = read_fn(output_name).get("annotation_results", [])
+            # 구간 하나만 요청하므로 결과도 하나다. 없으면 빈 결과로 둔다.
+            finished[index] = align_result(results[0] if results else {}, segments[index][0])
+            if on_segment_done:
+                on_segment_done(index, output_name)
+            print(f"구간 {index + 1}/{len(segments)} 분석 완료 ({len(finished)}/{len(segments)})")
+
+            if on_partial and len(finished) < len(segments):
+                # 이어 붙이면서 트랙을 고치므로 다음 호출을 위해 사본으로 만든다.
+                partial = stitch_results([(segments[i][0], segments[i][1], copy.deepcopy(finished[i]))
+                                          for i in sorted(finished)])
+                try:
+                    on_partial(partial, len(finished), len(segments))
+                except Exception as e:
+                    print(f"중간 결과 게시 실패: {e}")
+
+    return stitch_results([(segments[i][0], segments[i][1], finished[i]) for i in sorted(finished)])
+
@@ -0,0 +1,151 @@
+import json
+import time
+import threading
+import requests
+from google.cloud import videointelligence
+from google.cloud import storage
+
+# 두 실행 스크립트가 함께 쓰는 클라이언트 모음
+#
+# 영상마다 VideoIntelligenceServiceClient를 새로 만들면 매번 인증 파일을 읽고 gRPC 채널과 TLS/인증 핸드셰이크를
+# 다시 하게 된다. 여기서 한 번 만든 클라이언트를 재사용하고, max_age가 지나거나 invalidate()가 호출되면 새로 만든다.
+#   - Video Intelligence 클라이언트: gRPC 채널은 스레드 간 공유가 안전하므로 프로세스 전체에서 하나를 쓴다.
+#   - Storage 클라이언트 / HTTP 세션: requests 세션 기반이라 스레드마다 하나씩 둔다.
+# 클라이언트를 가져올 때마다 새로 만든 경우(setup)와 재사용한 경우(reuse)의 소요 시간을 기록한다.
+# create()를 바꾼 레지스트리를 set_registry()로 넣으면 두 스크립트가 다른 백엔드를 쓴다 (local_backends.LocalRegistry).
+
+CREDENTIALS_PATH = "/Users/highbuff/Downloads/gold-braid-428103-s3-1806cc6a21a0.json" # 서비스 계정 키 파일
+CLIENT_MAX_AGE = 3600 # 클라이언트를 새로 만드는 주기 (초)
+HTTP_POOL_SIZE = 16 # HTTP 세션의 호스트별 연결 풀 크기
+
+CLIENT_KINDS = ("video", "storage", "http")
+
+
+class ClientRegistry:
+    def __init__(self, credentials_path=CREDENTIALS_PATH, max_age=CLIENT_MAX_AGE):
+        self.credentials_path = credentials_path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.shared = {}
+        self.generation = {kind: 0 for kind in CLIENT_KINDS}
+        # kind -> phase -> [횟수, 누적 소요 시간]
+        self.timings = {kind: {"setup": [0, 0.0], "reuse": [0, 0.0]} for kind in CLIENT_KINDS}
+
+    def create(self, kind):
+        if kind == "video":
+            return videointelligence.VideoIntelligenceServiceClient.from_service_account_file(self.credentials_path)
+        if kind == "storage":
+            return storage.Client.from_service_account_json(self.credentials_path)
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    # 분석 작업 수를 프로젝트별로 제한할 때 쓰는 프로젝트 ID (서비스 계정 키 파일에 있다)
+    def project_id(self):
+        with open(self.credentials_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("project_id")
+
+    def is_fresh(self, entry, kind):
+        return (entry is not None
+                and entry["generation"] == self.generation[kind]
+                and time.monotonic() - entry["created_at"] < self.max_age)
+
+    def new_entry(self, kind):
+        return {"client": self.create(kind), "created_at": time.monotonic(), "generation": self.generation[kind]}
+
+    def record(self, kind, phase, started):
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.timings[kind][phase][0] += 1
+            self.timings[kind][phase][1] += elapsed
+
+    # 프로세스 전체에서 공유하는 클라이언트
+    def get_shared(self, kind):
+        started = time.perf_counter()
+        with self.lock:
+            entry = self.shared.get(kind)
+            if self.is_fresh(entry, kind):
+                client, phase = entry["client"], "reuse"
+            else:
+                entry = self.new_entry(kind)
+                self.shared[kind] = entry
+                client, phase = entry["client"], "setup"
+        self.record(kind, phase, started)
+        return client
+
+    # 스레드마다 따로 두는 클라이언트
+    def get_thread_local(self, kind):
+        started = time.perf_counter()
+        entry = getattr(self.local, kind, None)
+        if self.is_fresh(entry, kind):
+            self.record(kind, "reuse", started)
+            return entry["client"]
+
+        if entry is not None and kind == "http":
+            entry["client"].close()
+        entry = self.new_entry(kind)
+        setattr(self.local, kind, entry)
+        self.record(kind, "setup", started)
+        return entry["client"]
+
+    def video_client(self):
+        return self.get_shared("video")
+
+    def storage_client(self):
+        return self.get_thread_local("storage")
+
+    def http_session(self):
+        return self.get_thread_local("http")
+
+    # 인증 만료나 채널 오류가 났을 때 호출하면 다음 요청부터 새 클라이언트를 만든다.
+    def invalidate(self, kind):
+        with self.lock:
+            self.generation[kind] += 1
+            self.shared.pop(kind, None)
+        print(f"클라이언트를 다시 만듭니다: {kind}")
+
+    def stats(self):
+        with self.lock:
+            result = {}
+            for kind, phases in self.timings.items():
+                (setups, setup_total), (reuses, reuse_total) = phases["setup"], phases["reuse"]
+                result[kind] = {
+                    "setups": setups,
+                    "setup_avg_ms": setup_total / setups * 1000 if setups else 0.0,
+                    "reuses": reuses,
+                    "reuse_avg_ms": reuse_total / reuses * 1000 if reuses else 0.0,
+                }
+            return result
+
+    # 재사용으로 아낀 시간 요약 (재사용 1회당 새로 만들었을 때의 평균 준비 시간을 아낀 것으로 본다)
+    def report(self):
+        for kind, stat in self.stats().items():
+            if not stat["setups"] and not stat["reuses"]:
+                continue
+            saved = (stat["setup_avg_ms"] - stat["reuse_avg_ms"]) * stat["reuses"]
+            print(f"[client:{kind}] 생성 {stat['setups']}회 (평균 {stat['setup_avg_ms']:.1f}ms), "
+                  f"재사용 {stat['reuses']}회 (평균 {stat['reuse_avg_ms']:.3f}ms), 절약 약 {saved / 1000:.1f}초")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+# 프로세스 전역 레지스트리
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry()
+        return _registry
+
+
+# 프로세스 전역 레지스트리를 바꾼다. 클라이언트를 처음 가져오기 전에 불러야 한다.
+def set_registry(registry):
+    global _registry
+    with _registry_lock:
+        _registry = registry
+        return _registry
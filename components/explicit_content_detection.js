@@ -12,7 +12,7 @@ document.getElementsByTagName('head')[0].appendChild(style);
 
 // define component
 Vue.component('explicit-content-detection-viz', {
-    props: ['json_data', 'video_info'],
+    props: ['json_data', 'video_info', 'artifact'],
     data: function () {
         return {
             interval_timer: null,
@@ -25,6 +25,9 @@ Vue.component('explicit-content-detection-viz', {
             `
             Extract just the explicit detection data from json
             `
+            if (this.artifact)
+                return this.artifact.explicit_frames()
+
             if (!this.json_data.annotation_results)
                 return []
 
@@ -56,7 +56,7 @@ Vue.component('bar-chart', {
 
 // define component
 Vue.component('face-detection-viz', {
-    props: ['json_data', 'video_info'],
+    props: ['json_data', 'video_info', 'artifact'],
     data: function () {
         return {
             confidence_threshold: 0.5,
@@ -81,12 +81,21 @@ Vue.component('face-detection-viz', {
             return []
         },
 
+        face_track_count: function () {
+            if (this.artifact)
+                return this.artifact.track_count('face')
+            return this.face_tracks.length
+        },
+
         indexed_face_tracks: function () {
             `
             Create a clean list of face detection data with realisied nullable fields 
             and scaled bounding boxes ready to be drawn by the canvas
             `
 
+            if (this.artifact)
+                return this.artifact.tracks('face', this.video_info.height, this.video_info.width, this.confidence_threshold)
+
             const indexed_tracks = []
 
             if (!this.face_tracks)
@@ -159,7 +168,7 @@ Vue.component('face-detection-viz', {
             </pre>
         </div>
 
-        <div class="data-warning" v-if="face_tracks.length == 0">JSON파일에 정의된 얼굴 인식 데이터가 없습니다.</div>
+        <div class="data-warning" v-if="face_track_count == 0">JSON파일에 정의된 얼굴 인식 데이터가 없습니다.</div>
 
         <div class="segment-container" v-for="segments, key in object_track_segments" v-bind:key="key + 'z'">
                 <div class="label">{{key}} ({{segments.count}})</div>
@@ -92,7 +92,7 @@ document.getElementsByTagName('head')[0].appendChild(style);
 
 // define component
 Vue.component('object-tracking-viz', {
-    props: ['json_data', 'video_info'],
+    props: ['json_data', 'video_info', 'artifact'],
     data: function () {
         return {
             confidence_threshold: 0.5,
@@ -116,12 +116,21 @@ Vue.component('object-tracking-viz', {
             return []
         },
 
+        object_track_count: function () {
+            if (this.artifact)
+                return this.artifact.track_count('object')
+            return this.object_tracks.length
+        },
+
         indexed_object_tracks: function () {
             `
             Create a clean list of object tracking data with realisied nullable fields 
             and scaled bounding boxes ready to be drawn by the canvas
             `
 
+            if (this.artifact)
+                return this.artifact.tracks('object', this.video_info.height, this.video_info.width, this.confidence_threshold)
+
             const indexed_tracks = []
 
             this.object_tracks.forEach(element => {
@@ -198,7 +207,7 @@ Vue.component('object-tracking-viz', {
                 <span class="confidence-value">{{confidence_threshold}}</span>      
         </div>-->
 
-        <div class="data-warning" v-if="object_tracks.length == 0">JSON파일에 정의된 오브젝트 데이터가 없습니다.</div>
+        <div class="data-warning" v-if="object_track_count == 0">JSON파일에 정의된 오브젝트 데이터가 없습니다.</div>
 
         <transition-group name="segments" tag="div">
             
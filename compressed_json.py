@@ -0,0 +1,118 @@
+import io
+import gzip
+import json
+import contextlib
+
+try:
+    import zstandard
+except ImportError: # zstd는 선택 사항 (pip install zstandard)
+    zstandard = None
+
+# 병합/최종 JSON을 압축해서 올리고 읽는 도구
+#
+# 분석 결과 JSON은 비슷한 숫자와 키가 반복돼서 8~15배 줄어든다.
+# 압축한 바이트를 그대로 올리고 Content-Encoding을 붙여 두면
+#   - 브라우저(fetch)는 응답을 알아서 풀어 주므로 뷰어 코드는 그대로 둔다.
+#   - gzip은 Accept-Encoding: gzip을 보내지 않는 클라이언트에게 GCS가 풀어서 준다(decompressive transcoding).
+#   - zstd는 GCS가 풀어 주지 않으므로 zstd를 지원하는 브라우저에서만 볼 수 있다.
+# 압축된 객체를 blob.open("rb")로 범위 요청하면 압축된 바이트의 일부가 와서 조각마다 풀 수 없으므로,
+# 읽을 때는 open_blob_reader로 원본 바이트(raw_download)를 받아 스트림으로 푼다.
+# 압축 수준별 크기/시간은 benchmarks/compression_bench.py 참고
+
+CONTENT_ENCODING = "gzip" # 업로드 기본 압축 (None이면 압축하지 않는다)
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+ENCODINGS = ("gzip", "zstd")
+STREAM_CHUNK_SIZE = 4 * 1024 * 1024 # 256KB의 배수
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def check_encoding(encoding):
+    if encoding is not None and encoding not in ENCODINGS:
+        raise ValueError(f"지원하지 않는 압축 형식입니다: {encoding}")
+    if encoding == "zstd" and zstandard is None:
+        raise RuntimeError("zstd 압축을 쓰려면 zstandard 패키지가 필요합니다 (pip install zstandard)")
+    return encoding
+
+
+# fileobj에 압축해서 쓰는 스트림. close()는 압축을 마무리할 뿐 fileobj는 닫지 않는다.
+def compress_stream(fileobj, encoding, level=None):
+    check_encoding(encoding)
+    if encoding == "gzip":
+        # mtime을 고정해서 같은 내용이면 같은 바이트가 나오게 한다.
+        return gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=level or GZIP_LEVEL, mtime=0)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level or ZSTD_LEVEL).stream_writer(fileobj, closefd=False)
+    return fileobj
+
+
+# fileobj를 풀면서 읽는 스트림
+def decompress_stream(fileobj, encoding):
+    check_encoding(encoding)
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False)
+    return fileobj
+
+
+# 파일 앞부분으로 압축 형식을 알아낸다 (로컬 파일처럼 Content-Encoding이 없는 경우)
+def sniff_encoding(head):
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+# 블롭에 압축해서 쓰는 바이너리 스트림. 블록 안에서 예외가 나면 업로드를 취소한다.
+# Content-Encoding / Cache-Control은 업로드 때 같이 기록되므로 따로 patch하지 않아도 된다.
+@contextlib.contextmanager
+def open_blob_writer(blob, encoding=CONTENT_ENCODING, level=None, content_type="application/json",
+                     cache_control=None, chunk_size=STREAM_CHUNK_SIZE):
+    check_encoding(encoding)
+    blob.content_encoding = encoding
+    if cache_control is not None:
+        blob.cache_control = cache_control
+    with blob.open("wb", chunk_size=chunk_size, content_type=content_type) as raw:
+        if encoding is None:
+            yield raw
+            return
+        stream = compress_stream(raw, encoding, level)
+        yield stream
+        stream.close()
+
+
+# 블롭을 (압축돼 있으면 풀면서) 읽는 바이너리 스트림
+@contextlib.contextmanager
+def open_blob_reader(blob, chunk_size=STREAM_CHUNK_SIZE):
+    if blob.generation is None:
+        # bucket.blob(name)으로 만든 블롭은 메타데이터가 없다. 읽는 도중 덮어써져도 섞이지 않게 generation도 고정된다.
+        blob.reload()
+    encoding = blob.content_encoding
+    if encoding not in ENCODINGS:
+        encoding = None
+    with blob.open("rb", chunk_size=chunk_size, raw_download=encoding is not None) as raw:
+        yield decompress_stream(raw, encoding)
+
+
+# 로컬 파일을 (압축돼 있으면 풀면서) 읽는 바이너리 스트림
+@contextlib.contextmanager
+def open_file_reader(path):
+    with open(path, "rb") as raw:
+        encoding = sniff_encoding(raw.peek(4)[:4])
+        yield decompress_stream(raw, encoding)
+
+
+# 작은 JSON을 압축해서 올린다.
+def upload_json(blob, data, encoding=CONTENT_ENCODING, level=None, cache_control=None):
+    with open_blob_writer(blob, encoding, level, cache_control=cache_control) as stream:
+        text = io.TextIOWrapper(stream, encoding="utf-8", write_through=True)
+        json.dump(data, text)
+        text.detach()
+
+
+def load_json(blob):
+    with open_blob_reader(blob) as stream:
+        return json.load(stream)
@@ -1,7 +1,8 @@
 const CONFIG = {
     GCP_SERVER_IP: '34.64.43.132',
     GCP_SERVER_PORT: 443,
-    LOCAL_HOST_PORT: 8080
+    LOCAL_HOST_PORT: 8080,
+    PUSH_SERVER_PORT: 8765 // 새 결과 알림 (push_server.py)
 };
 
 // CommonJS module syntax
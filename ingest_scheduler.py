@@ -0,0 +1,139 @@
+import os
+import time
+import queue
+import threading
+import concurrent.futures
+
+# 로컬 폴더에 새로 생긴 영상을 "다 써진 뒤에" 작업자 풀로 넘기는 스케줄러
+#
+# watchdog의 on_created는 녹화기가 파일을 쓰기 시작하자마자 불리므로 그때 바로 처리하면 잘린 파일이 올라간다.
+# 이벤트 핸들러는 notify()로 경로만 넘기고 바로 돌아가며(관찰자 스레드를 막지 않는다),
+# 스케줄러 스레드가 파일마다
+#   - 쓰기를 마치고 닫혔다는 이벤트(closed)를 받았거나
+#   - 크기와 수정 시간이 settle_seconds 동안 바뀌지 않았으면
+# 준비된 것으로 보고, 마지막 이벤트 이후 debounce_seconds가 지나면 작업자 풀에 넘긴다.
+# 같은 파일의 이벤트가 연달아 오면 한 번만 처리하고, 처리 중에 다시 바뀌면 끝난 뒤 한 번 더 처리한다.
+
+SETTLE_SECONDS = 5 # 크기/수정 시간이 이 시간 동안 그대로면 다 써진 것으로 본다
+DEBOUNCE_SECONDS = 1 # 마지막 이벤트 이후 이 시간은 더 기다린다
+CHECK_INTERVAL = 0.5 # 대기 중인 파일 상태를 확인하는 간격
+INGEST_WORKERS = 2
+
+
+class PendingFile:
+    def __init__(self, path):
+        self.path = path
+        self.last_event = time.monotonic()
+        self.signature = None # (크기, 수정 시간)
+        self.stable_since = None
+        self.closed = False
+
+
+class IngestScheduler:
+    # dispatch_fn(path) : 다 써진 파일의 처리 (작업자 풀에서 실행)
+    def __init__(self, dispatch_fn, workers=INGEST_WORKERS, settle_seconds=SETTLE_SECONDS,
+                 debounce_seconds=DEBOUNCE_SECONDS, check_interval=CHECK_INTERVAL):
+        self.dispatch_fn = dispatch_fn
+        self.settle_seconds = settle_seconds
+        self.debounce_seconds = debounce_seconds
+        self.check_interval = check_interval
+
+        self.events = queue.SimpleQueue()
+        self.pending = {}
+        self.running = set()
+        self.rerun = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-worker")
+
+        self.dispatched = 0
+        self.dropped = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.loop, name="ingest-scheduler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self.stop_event.set()
+        if wait and self.thread:
+            self.thread.join()
+        self.executor.shutdown(wait=wait)
+
+    # 관찰자 스레드에서 부른다. 큐에 넣기만 하므로 막히지 않는다.
+    def notify(self, path, closed=False):
+        self.events.put((path, closed, time.monotonic()))
+
+    def loop(self):
+        while not self.stop_event.is_set():
+            self.drain_events()
+            self.check_pending()
+            self.stop_event.wait(self.check_interval)
+
+    def drain_events(self):
+        while True:
+            try:
+                path, closed, at = self.events.get_nowait()
+            except queue.Empty:
+                return
+            with self.lock:
+                if path in self.running:
+                    # 처리 중인 파일이 다시 바뀌었으면 끝난 뒤에 다시 확인한다.
+                    self.rerun.add(path)
+                    continue
+            pending = self.pending.get(path)
+            if pending is None:
+                pending = self.pending[path] = PendingFile(path)
+            pending.last_event = at
+            pending.closed = closed # 닫힌 뒤 다시 쓰기 시작했으면 다시 기다린다
+
+    def check_pending(self):
+        now = time.monotonic()
+        for path, pending in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # 임시 파일이 지워졌거나 이름이 바뀐 경우
+                del self.pending[path]
+                self.dropped += 1
+                continue
+
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signature != pending.signature:
+                pending.signature = signature
+                pending.stable_since = now
+                if not pending.closed:
+                    continue
+            if stat.st_size == 0:
+                continue
+
+            settled = pending.closed or now - pending.stable_since >= self.settle_seconds
+            if settled and now - pending.last_event >= self.debounce_seconds:
+                del self.pending[path]
+                self.dispatch(path)
+
+    def dispatch(self, path):
+        with self.lock:
+            self.running.add(path)
+        self.dispatched += 1
+        self.executor.submit(self.run, path)
+
+    def run(self, path):
+        try:
+            self.dispatch_fn(path)
+        except Exception as e:
+            print(f"파일 처리 중 오류 발생: {path} ({e})")
+        finally:
+            with self.lock:
+                self.running.discard(path)
+                again = path in self.rerun
+                self.rerun.discard(path)
+            if again:
+                self.notify(path)
+
+    def stats(self):
+        with self.lock:
+            running = len(self.running)
+        return {"pending": len(self.pending), "running": running,
+                "dispatched": self.dispatched, "dropped": self.dropped}
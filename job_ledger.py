@@ -0,0 +1,159 @@
+import os
+import time
+import sqlite3
+import threading
+
+# 영상 처리 기록 (SQLite)
+#
+# 감지된 영상(clips)과 유료 분석 작업(annotations)을 따로 기록한다.
+#   - clips       : (영상 이름, generation)마다 처리 단계와 이 영상의 분석 결과 파일 이름
+#   - annotations : 영상 내용 해시 + 분석 기능 조합(job_key)마다 operation 이름과 분석 결과 파일 이름
+#   - segments    : 구간으로 나눠 분석하는 영상의 구간마다 (결과 파일 이름, 구간 번호) 시간 범위와 operation 이름
+# 재시작하면 진행 중이던 operation을 이름으로 다시 찾아 기다리고,
+# 같은 내용의 영상이 다시 올라오면 분석을 다시 요청하지 않고 이전 결과 파일을 그대로 쓴다.
+
+# 영상 처리 단계
+DETECTED = "detected" # 감지됨
+QUEUED = "queued" # 처리 대기열에 넣음
+SUBMITTED = "submitted" # 분석 요청함 (operation 진행 중)
+ANNOTATED = "annotated" # 분석 결과 파일이 만들어짐
+MERGED = "merged" # AWS 결과와 병합함
+PUBLISHED = "published" # 뷰어에 게시함
+FAILED = "failed"
+PENDING_STATES = (DETECTED, QUEUED, SUBMITTED, ANNOTATED, MERGED) # 재시작 때 이어서 처리할 단계
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    video_name TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    job_key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    output_filename TEXT,
+    merged_name TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (video_name, generation)
+);
+CREATE INDEX IF NOT EXISTS clips_output ON clips (output_filename);
+CREATE INDEX IF NOT EXISTS clips_state ON clips (state);
+CREATE TABLE IF NOT EXISTS annotations (
+    job_key TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    operation_name TEXT,
+    output_filename TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    output_filename TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    start_seconds REAL NOT NULL,
+    end_seconds REAL NOT NULL,
+    state TEXT NOT NULL,
+    operation_name TEXT,
+    output_name TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (output_filename, segment)
+);
+"""
+
+
+# 블롭 내용 해시 + 분석 기능 조합. 합성(compose) 객체처럼 md5가 없으면 crc32c와 크기를 쓴다.
+def content_key(blob, features):
+    if blob.md5_hash:
+        content_hash = f"md5:{blob.md5_hash}"
+    else:
+        content_hash = f"crc32c:{blob.crc32c}:{blob.size}"
+    return f"{content_hash}|{','.join(sorted(features))}"
+
+
+class JobLedger:
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        # 파이프라인 작업자 스레드들이 같이 쓰므로 연결 하나를 잠금으로 보호한다.
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def execute(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def one(self, sql, parameters=()):
+        rows = self.execute(sql, parameters)
+        return dict(rows[0]) if rows else None
+
+    # 감지된 영상을 기록한다. 이미 있으면 기존 기록을 돌려준다.
+    def detect(self, video_name, generation, job_key):
+        self.execute("INSERT OR IGNORE INTO clips (video_name, generation, job_key, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                     (video_name, generation, job_key, DETECTED, time.time()))
+        return self.clip(video_name, generation)
+
+    def clip(self, video_name, generation=None):
+        if generation is None:
+            return self.one("SELECT * FROM clips WHERE video_name = ? ORDER BY generation DESC LIMIT 1", (video_name,))
+        return self.one("SELECT * FROM clips WHERE video_name = ? AND generation = ?", (video_name, generation))
+
+    def clip_by_output(self, output_filename):
+        return self.one("SELECT * FROM clips WHERE output_filename = ? ORDER BY updated_at DESC LIMIT 1", (output_filename,))
+
+    def update_clip(self, clip, state, **fields):
+        fields["state"] = state
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self.execute(f"UPDATE clips SET {assignments} WHERE video_name = ? AND generation = ?",
+                     (*fields.values(), clip["video_name"], clip["generation"]))
+        clip.update(fields)
+        return clip
+
+    def pending(self):
+        placeholders = ", ".join("?" for _ in PENDING_STATES)
+        return [dict(row) for row in self.execute(
+            f"SELECT * FROM clips WHERE state IN ({placeholders}) ORDER BY updated_at", PENDING_STATES)]
+
+    def annotation(self, job_key):
+        return self.one("SELECT * FROM annotations WHERE job_key = ?", (job_key,))
+
+    def set_annotation(self, job_key, state, operation_name=None, output_filename=None):
+        self.execute("INSERT OR REPLACE INTO annotations (job_key, state, operation_name, output_filename, updated_at) "
+                     "VALUES (?, ?, ?, ?, ?)", (job_key, state, operation_name, output_filename, time.time()))
+
+    def annotation_finished(self, job_key, output_filename=None):
+        annotation = self.annotation(job_key) or {}
+        self.set_annotation(job_key, ANNOTATED, annotation.get("operation_name"),
+                            annotation.get("output_filename") or output_filename)
+
+    def annotation_failed(self, job_key):
+        annotation = self.annotation(job_key)
+        if annotation and annotation["state"] == SUBMITTED:
+            self.set_annotation(job_key, FAILED, annotation["operation_name"], annotation["output_filename"])
+
+    # 영상을 나눈 구간들을 기록한다 (이미 있으면 그대로 둔다). segments: [(시작초, 끝초), ...]
+    def add_segments(self, output_filename, segments):
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO segments (output_filename, segment, start_seconds, end_seconds, state, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(output_filename, index, start, end, QUEUED, now) for index, (start, end) in enumerate(segments)])
+
+    def segments(self, output_filename):
+        return [dict(row) for row in self.execute(
+            "SELECT * FROM segments WHERE output_filename = ? ORDER BY segment", (output_filename,))]
+
+    def segment(self, output_filename, index):
+        return self.one("SELECT * FROM segments WHERE output_filename = ? AND segment = ?", (output_filename, index))
+
+    def update_segment(self, output_filename, index, state, **fields):
+        fields["state"] = state
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self.execute(f"UPDATE segments SET {assignments} WHERE output_filename = ? AND segment = ?",
+                     (*fields.values(), output_filename, index))
+
+    def counts(self):
+        return {row["state"]: row["count"] for row in self.execute("SELECT state, COUNT(*) AS count FROM clips GROUP BY state")}
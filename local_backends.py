@@ -0,0 +1,647 @@
+import io
+import os
+import re
+import gzip
+import json
+import stat
+import time
+import base64
+import shutil
+import random
+import hashlib
+import datetime
+import tempfile
+import threading
+import concurrent.futures
+from types import SimpleNamespace
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from google.api_core import exceptions
+from google.cloud import videointelligence
+from clients import ClientRegistry, set_registry
+
+# 클라우드 없이 파이프라인을 돌리는 로컬 백엔드
+#
+# 두 실행 스크립트는 GCS, Video Intelligence, localhost:5555 (AWS 분석 요청), localhost:8080 (server.js)을 쓴다.
+# 여기 있는 것들로 바꾸면 클라우드 프로젝트 없이 전체 흐름을 돌리고 잴 수 있다.
+#   - LocalStorageClient : 폴더 하나를 버킷으로 쓴다 (<root>/<버킷>/<객체 이름>).
+#                          generation, 조건부 쓰기(if_generation_match), Content-Encoding(gzip) 읽기,
+#                          blob.open 스트림, copy_blob, 목록 조회(prefix/start_offset)를 파이프라인이 쓰는 만큼 흉내 낸다.
+#                          메타데이터는 <root>/<버킷>.meta/ 아래에 객체마다 JSON으로 둔다.
+#                          폴더에 직접 넣은 파일도 객체로 보인다 (generation은 수정 시각).
+#   - LocalVideoClient   : annotate_video 요청마다 녹화해 둔 분석 결과 JSON을 차례로 output_uri에 써 준다.
+#                          결과는 annotate_latency (± jitter)초 뒤에 나오고, failure_rate 비율만큼 실패한다.
+#   - StubServices       : AWS 분석 요청 API (요청을 받고 moderation_latency초 뒤 AWS 결과 JSON을 버킷에 올린다)와
+#                          병합 완료 알림(server.js)을 흉내 내는 HTTP 서버
+#   - LocalRegistry      : 위 클라이언트를 돌려주는 클라이언트 레지스트리 (set_registry로 바꿔 끼운다)
+# 조건부 쓰기는 한 프로세스 안에서만 보장한다. 진행 중인 operation은 프로세스와 함께 사라지므로
+# 재시작 후 이어서 기다리려던 영상은 실패로 기록된다.
+# 실행: python run_video_intelligence_auto.py --backend local --recordings output.json --push-port 0
+
+BACKENDS = ("gcp", "local")
+LOCAL_ROOT = "pipeline-local/" # 로컬 버킷 폴더
+META_SUFFIX = ".meta" # 버킷 폴더 옆에 두는 메타데이터 폴더 이름의 끝
+ANNOTATE_LATENCY = 2.0 # 가짜 분석 한 건이 끝나기까지 걸리는 시간 (초)
+ANNOTATE_JITTER = 0.2 # 분석 시간의 흔들림 (비율)
+ANNOTATE_FAILURE_RATE = 0.0 # 가짜 분석이 실패하는 비율
+MODERATION_LATENCY = 1.0 # AWS 분석 요청 후 결과 JSON이 올라오기까지 걸리는 시간 (초)
+COPY_CHUNK_SIZE = 1024 * 1024
+TIMESTAMP_PATTERN = re.compile(r'(\d{8}_\d{6})')
+
+
+def utc_now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def md5_base64(digest):
+    return base64.b64encode(digest.digest()).decode("ascii")
+
+
+def parse_gcs_uri(uri):
+    match = re.match(r'gs://([^/]+)/(.+)$', uri)
+    if not match:
+        raise exceptions.InvalidArgument(f"GCS 주소가 아닙니다: {uri}")
+    return match.group(1), match.group(2)
+
+
+class LocalStorageClient:
+    def __init__(self, root=LOCAL_ROOT):
+        self.root = root
+        self.lock = threading.RLock() # 조건부 쓰기의 확인과 교체 사이에 다른 쓰기가 끼지 않게 한다
+        self.buckets = {}
+        self.last_generation = 0
+
+    def bucket(self, name):
+        with self.lock:
+            if name not in self.buckets:
+                self.buckets[name] = LocalBucket(self, name)
+            return self.buckets[name]
+
+    # GCS처럼 마이크로초 단위 시각을 generation으로 쓴다 (같은 프로세스 안에서는 항상 커진다).
+    def next_generation(self):
+        with self.lock:
+            self.last_generation = max(time.time_ns() // 1000, self.last_generation + 1)
+            return self.last_generation
+
+
+class LocalBucket:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.path = os.path.join(client.root, name)
+        self.meta_path = os.path.join(client.root, name + META_SUFFIX)
+        self.temp_path = os.path.join(self.meta_path, ".tmp")
+        os.makedirs(self.path, exist_ok=True)
+        os.makedirs(self.temp_path, exist_ok=True)
+
+    def object_path(self, name):
+        return os.path.join(self.path, *name.split("/"))
+
+    def object_meta_path(self, name):
+        return os.path.join(self.meta_path, *name.split("/")) + ".json"
+
+    def blob(self, name, generation=None):
+        return LocalBlob(self, name, generation)
+
+    def get_blob(self, name):
+        blob = LocalBlob(self, name)
+        try:
+            blob.reload()
+        except exceptions.NotFound:
+            return None
+        return blob
+
+    # 메타데이터 (없으면 None). 직접 넣은 파일은 파일 정보로 메타데이터를 만든다.
+    def read_meta(self, name):
+        path = self.object_path(name)
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if not stat.S_ISREG(info.st_mode):
+            return None
+        try:
+            with open(self.object_meta_path(name), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["size"] == info.st_size:
+                return meta
+        except FileNotFoundError:
+            pass
+        # 메타데이터 없이 바뀐 파일은 수정 시각을 generation으로 쓴다.
+        created = datetime.datetime.fromtimestamp(info.st_mtime, datetime.timezone.utc).isoformat()
+        return {"generation": info.st_mtime_ns // 1000, "size": info.st_size, "time_created": created,
+                "updated": created, "md5_hash": None, "content_type": None, "content_encoding": None,
+                "cache_control": None, "metadata": None}
+
+    def write_meta(self, name, meta):
+        path = self.object_meta_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(temp_path, path)
+
+    def check_generation(self, name, if_generation_match):
+        if if_generation_match is None:
+            return
+        meta = self.read_meta(name)
+        current = meta["generation"] if meta else 0
+        if current != if_generation_match:
+            raise exceptions.PreconditionFailed(
+                f"{self.name}/{name}: generation {current} != if_generation_match {if_generation_match}")
+
+    # 임시 파일을 객체로 바꾼다. 새 메타데이터를 돌려준다.
+    def commit(self, name, temp_path, md5_hash, fields, if_generation_match=None):
+        size = os.path.getsize(temp_path)
+        path = self.object_path(name)
+        with self.client.lock:
+            try:
+                self.check_generation(name, if_generation_match)
+            except exceptions.PreconditionFailed:
+                os.remove(temp_path)
+                raise
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+            now = utc_now().isoformat()
+            meta = {"generation": self.client.next_generation(), "size": size, "time_created": now, "updated": now,
+                    "md5_hash": md5_hash, "content_type": fields.get("content_type"),
+                    "content_encoding": fields.get("content_encoding"), "cache_control": fields.get("cache_control"),
+                    "metadata": fields.get("metadata")}
+            self.write_meta(name, meta)
+            return meta
+
+    # generation을 고정해서 연다. 그 사이 덮어써졌으면 NotFound (GCS에서 지난 generation을 받을 때와 같다)
+    def open_object(self, name, generation=None, if_generation_match=None):
+        with self.client.lock:
+            self.check_generation(name, if_generation_match)
+            meta = self.read_meta(name)
+            if meta is None or (generation is not None and meta["generation"] != generation):
+                raise exceptions.NotFound(f"{self.name}/{name} (generation {generation})")
+            return open(self.object_path(name), "rb"), meta
+
+    def new_temp_file(self):
+        return tempfile.NamedTemporaryFile(dir=self.temp_path, delete=False)
+
+    def list_blobs(self, prefix=None, start_offset=None, end_offset=None, max_results=None, **kwargs):
+        prefix = prefix or ""
+        # prefix의 폴더 부분 아래만 훑는다.
+        directory = os.path.join(self.path, *prefix.split("/")[:-1])
+        names = []
+        for current, _, files in os.walk(directory):
+            relative = os.path.relpath(current, self.path)
+            for filename in files:
+                name = filename if relative == "." else f"{relative.replace(os.sep, '/')}/{filename}"
+                if name.startswith(prefix) and (start_offset is None or name >= start_offset) \
+                        and (end_offset is None or name < end_offset):
+                    names.append(name)
+        names.sort()
+        if max_results is not None:
+            names = names[:max_results]
+        for name in names:
+            meta = self.read_meta(name)
+            if meta is not None:
+                yield LocalBlob(self, name).apply(meta)
+
+    def copy_blob(self, blob, destination_bucket, new_name=None, if_generation_match=None, **kwargs):
+        new_name = new_name or blob.name
+        source, meta = self.open_object(blob.name, blob.generation)
+        with source, destination_bucket.new_temp_file() as target:
+            shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+        copied = destination_bucket.commit(new_name, target.name, meta["md5_hash"], meta, if_generation_match)
+        return LocalBlob(destination_bucket, new_name).apply(copied)
+
+    def delete_blob(self, name, if_generation_match=None, **kwargs):
+        with self.client.lock:
+            self.check_generation(name, if_generation_match)
+            try:
+                os.remove(self.object_path(name))
+            except FileNotFoundError:
+                raise exceptions.NotFound(f"{self.name}/{name}")
+            try:
+                os.remove(self.object_meta_path(name))
+            except FileNotFoundError:
+                pass
+
+
+class LocalBlob:
+    def __init__(self, bucket, name, generation=None):
+        self.bucket = bucket
+        self.name = name
+        self.generation = generation
+        self.size = None
+        self.time_created = None
+        self.updated = None
+        self.md5_hash = None
+        self.crc32c = None
+        self.content_type = None
+        self.content_encoding = None
+        self.cache_control = None
+        self.metadata = None
+
+    def apply(self, meta):
+        self.generation = meta["generation"]
+        self.size = meta["size"]
+        self.time_created = datetime.datetime.fromisoformat(meta["time_created"])
+        self.updated = datetime.datetime.fromisoformat(meta["updated"])
+        self.md5_hash = meta["md5_hash"]
+        self.content_type = meta["content_type"]
+        self.content_encoding = meta["content_encoding"]
+        self.cache_control = meta["cache_control"]
+        self.metadata = meta["metadata"]
+        return self
+
+    def fields(self, content_type=None):
+        return {"content_type": content_type or self.content_type, "content_encoding": self.content_encoding,
+                "cache_control": self.cache_control, "metadata": self.metadata}
+
+    def reload(self, **kwargs):
+        meta = self.bucket.read_meta(self.name)
+        if meta is None:
+            raise exceptions.NotFound(f"{self.bucket.name}/{self.name}")
+        if meta["md5_hash"] is None:
+            # 직접 넣은 파일은 처음 읽을 때 내용 해시를 계산해 둔다.
+            with open(self.bucket.object_path(self.name), "rb") as f:
+                digest = hashlib.md5()
+                for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            meta["md5_hash"] = md5_base64(digest)
+            self.bucket.write_meta(self.name, meta)
+        return self.apply(meta)
+
+    def exists(self, **kwargs):
+        return self.bucket.read_meta(self.name) is not None
+
+    def patch(self, **kwargs):
+        with self.bucket.client.lock:
+            meta = self.bucket.read_meta(self.name)
+            if meta is None:
+                raise exceptions.NotFound(f"{self.bucket.name}/{self.name}")
+            meta.update(content_type=self.content_type, content_encoding=self.content_encoding,
+                        cache_control=self.cache_control, metadata=self.metadata, updated=utc_now().isoformat())
+            self.bucket.write_meta(self.name, meta)
+        return self.apply(meta)
+
+    def delete(self, if_generation_match=None, **kwargs):
+        self.bucket.delete_blob(self.name, if_generation_match)
+
+    def upload_from_file(self, file_obj, content_type=None, if_generation_match=None, **kwargs):
+        digest = hashlib.md5()
+        with self.bucket.new_temp_file() as target:
+            for chunk in iter(lambda: file_obj.read(COPY_CHUNK_SIZE), b""):
+                digest.update(chunk)
+                target.write(chunk)
+        self.apply(self.bucket.commit(self.name, target.name, md5_base64(digest), self.fields(content_type),
+                                      if_generation_match))
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.upload_from_file(io.BytesIO(data), content_type, if_generation_match)
+
+    def upload_from_filename(self, filename, content_type=None, if_generation_match=None, **kwargs):
+        with open(filename, "rb") as f:
+            self.upload_from_file(f, content_type, if_generation_match)
+
+    # GCS처럼 Content-Encoding: gzip 객체는 풀어서 준다 (raw_download=True면 그대로). 범위 요청은 저장된 바이트 기준이다.
+    def open_source(self, raw_download=False, if_generation_match=None):
+        source, meta = self.bucket.open_object(self.name, self.generation, if_generation_match)
+        if meta["content_encoding"] == "gzip" and not raw_download:
+            return GzipObjectReader(source), source
+        return source, source
+
+    def download_to_file(self, file_obj, start=None, end=None, raw_download=False, if_generation_match=None, **kwargs):
+        if start is not None or end is not None:
+            raw_download = True
+        stream, source = self.open_source(raw_download, if_generation_match)
+        with source:
+            if start:
+                stream.seek(start)
+            remaining = None if end is None else end - (start or 0) + 1
+            while remaining is None or remaining > 0:
+                chunk = stream.read(COPY_CHUNK_SIZE if remaining is None else min(COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                file_obj.write(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+
+    def download_as_bytes(self, start=None, end=None, raw_download=False, if_generation_match=None, **kwargs):
+        buffer = io.BytesIO()
+        self.download_to_file(buffer, start, end, raw_download, if_generation_match)
+        return buffer.getvalue()
+
+    def download_as_text(self, start=None, end=None, raw_download=False, encoding="utf-8", if_generation_match=None,
+                         **kwargs):
+        return self.download_as_bytes(start, end, raw_download, if_generation_match).decode(encoding)
+
+    def download_to_filename(self, filename, start=None, end=None, raw_download=False, if_generation_match=None,
+                             **kwargs):
+        with open(filename, "wb") as f:
+            self.download_to_file(f, start, end, raw_download, if_generation_match)
+
+    # "rb"는 generation을 고정한 읽기 스트림, "wb"는 닫을 때 객체가 되는 쓰기 스트림 (블록 안에서 예외가 나면 취소)
+    def open(self, mode="rb", chunk_size=None, content_type=None, raw_download=False, **kwargs):
+        if mode == "rb":
+            stream, _ = self.open_source(raw_download)
+            return stream
+        if mode == "wb":
+            return LocalBlobWriter(self, content_type)
+        raise ValueError(f"지원하지 않는 모드입니다: {mode}")
+
+
+# 압축을 풀면서 읽고, 닫을 때 객체 파일도 닫는다.
+class GzipObjectReader(gzip.GzipFile):
+    def __init__(self, source):
+        super().__init__(fileobj=source, mode="rb")
+        self.source = source
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.source.close()
+
+
+class LocalBlobWriter(io.RawIOBase):
+    def __init__(self, blob, content_type=None):
+        self.blob = blob
+        self.content_type = content_type
+        self.digest = hashlib.md5()
+        self.file = blob.bucket.new_temp_file()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.file.close()
+        super().close()
+        self.blob.apply(self.blob.bucket.commit(self.blob.name, self.file.name, md5_base64(self.digest),
+                                                self.blob.fields(self.content_type)))
+
+    def __exit__(self, error_type, error, traceback):
+        if error_type is None:
+            self.close()
+            return False
+        # 실패한 업로드는 객체를 만들지 않는다.
+        self.file.close()
+        os.remove(self.file.name)
+        super().close()
+        return False
+
+
+# annotate_video가 돌려주는 operation future 중 파이프라인이 쓰는 부분 (operation.name, done, result)
+class LocalOperation:
+    def __init__(self, name):
+        self.operation = SimpleNamespace(name=name)
+        self.finished = threading.Event()
+        self.response = None
+        self.error = None
+
+    def done(self):
+        return self.finished.is_set()
+
+    def result(self, timeout=None):
+        if not self.finished.wait(timeout):
+            raise concurrent.futures.TimeoutError(f"{self.operation.name}이 {timeout}초 안에 끝나지 않았습니다.")
+        if self.error:
+            raise self.error
+        return self.response
+
+    def finish(self, response=None, error=None):
+        self.response = response
+        self.error = error
+        self.finished.set()
+
+
+class LocalOperationsClient:
+    def get_operation(self, name, **kwargs):
+        raise exceptions.NotFound(f"로컬 분석 작업은 다시 찾을 수 없습니다: {name}")
+
+
+class LocalVideoClient:
+    def __init__(self, storage_client, recordings=(), latency=ANNOTATE_LATENCY, jitter=ANNOTATE_JITTER,
+                 failure_rate=ANNOTATE_FAILURE_RATE, seed=None):
+        self.storage_client = storage_client
+        self.recordings = list(recordings)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.transport = SimpleNamespace(operations_client=LocalOperationsClient())
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def annotate_video(self, request=None, **kwargs):
+        request = dict(request or {}, **kwargs)
+        bucket_name, input_name = parse_gcs_uri(request["input_uri"])
+        if not self.storage_client.bucket(bucket_name).blob(input_name).exists():
+            raise exceptions.NotFound(request["input_uri"])
+
+        with self.lock:
+            self.submitted += 1
+            number = self.submitted
+            recording = self.recordings[(number - 1) % len(self.recordings)] if self.recordings else None
+            delay = self.latency * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+            fail = self.random.random() < self.failure_rate
+
+        operation = LocalOperation(f"projects/local/locations/local/operations/{number}")
+        timer = threading.Timer(delay, self.finish, (operation, request, recording, fail))
+        timer.daemon = True
+        timer.start()
+        return operation
+
+    # 녹화된 결과를 요청의 output_uri에 쓴다 (실제 분석처럼 압축하지 않은 JSON)
+    def finish(self, operation, request, recording, fail):
+        try:
+            if fail:
+                raise exceptions.ServiceUnavailable(f"가짜 분석 실패: {operation.operation.name}")
+            bucket_name, output_name = parse_gcs_uri(request["output_uri"])
+            output_blob = self.storage_client.bucket(bucket_name).blob(output_name)
+            if recording:
+                output_blob.upload_from_filename(recording, content_type="application/json")
+            else:
+                output_blob.upload_from_string(json.dumps(empty_result(request["input_uri"])),
+                                               content_type="application/json")
+            response = videointelligence.AnnotateVideoResponse(annotation_results=[
+                videointelligence.VideoAnnotationResults(input_uri=request["input_uri"])])
+        except Exception as e:
+            with self.lock:
+                self.failed += 1
+            operation.finish(error=e)
+            return
+        with self.lock:
+            self.completed += 1
+        operation.finish(response)
+
+    def stats(self):
+        with self.lock:
+            return {"submitted": self.submitted, "completed": self.completed, "failed": self.failed}
+
+
+# 녹화된 결과가 없을 때 쓰는 빈 분석 결과
+def empty_result(input_uri):
+    return {"annotation_results": [{
+        "input_uri": input_uri.replace("gs://", "/", 1),
+        "segment": {"start_time_offset": {}, "end_time_offset": {}},
+        "face_detection_annotations": [],
+        "object_annotations": [],
+        "explicit_annotation": {},
+    }]}
+
+
+class LocalRegistry(ClientRegistry):
+    def __init__(self, root=LOCAL_ROOT, recordings=(), annotate_latency=ANNOTATE_LATENCY, jitter=ANNOTATE_JITTER,
+                 failure_rate=ANNOTATE_FAILURE_RATE):
+        super().__init__(credentials_path=None)
+        self.storage = LocalStorageClient(root)
+        self.video = LocalVideoClient(self.storage, recordings, annotate_latency, jitter, failure_rate)
+
+    def create(self, kind):
+        if kind == "video":
+            return self.video
+        if kind == "storage":
+            return self.storage
+        return super().create(kind)
+
+    def project_id(self):
+        return "local"
+
+
+class StubServices:
+    def __init__(self, storage_client, bucket_name, aws_prefix, moderation_port=5555, notify_port=8080,
+                 moderation_latency=MODERATION_LATENCY, aws_recording=None, host="127.0.0.1"):
+        self.storage_client = storage_client
+        self.bucket_name = bucket_name
+        self.aws_prefix = aws_prefix
+        self.moderation_latency = moderation_latency
+        self.aws_recording = aws_recording
+        self.host = host
+        self.ports = {"moderation": moderation_port, "notify": notify_port}
+        self.servers = {}
+        self.lock = threading.Lock()
+
+        self.moderation_requests = 0
+        self.moderation_results = 0
+        self.notifications = 0
+
+    @property
+    def moderation_url(self):
+        return f"http://{self.host}:{self.ports['moderation']}/api/v1/moderation/create"
+
+    @property
+    def notify_url(self):
+        return f"http://{self.host}:{self.ports['notify']}/merge-complete"
+
+    def start(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if not self.path.endswith("/moderation/create"):
+                    self.send_error(404)
+                    return
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    object_key = json.loads(body)["objectKey"]
+                except (ValueError, KeyError):
+                    self.send_error(400)
+                    return
+                services.accept_moderation(object_key)
+                self.reply(200, {"status": "accepted", "objectKey": object_key})
+
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/merge-complete":
+                    self.send_error(404)
+                    return
+                with services.lock:
+                    services.notifications += 1
+                self.reply(200, {"status": "ok"})
+
+            def reply(self, status, data):
+                payload = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        for service, port in self.ports.items():
+            server = ThreadingHTTPServer((self.host, port), Handler)
+            server.daemon_threads = True
+            self.ports[service] = server.server_address[1]
+            self.servers[service] = server
+            threading.Thread(target=server.serve_forever, name=f"stub-{service}", daemon=True).start()
+        print(f"가짜 AWS 분석 요청: {self.moderation_url}")
+        print(f"가짜 병합 완료 알림: {self.notify_url}")
+        return self
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def accept_moderation(self, object_key):
+        with self.lock:
+            self.moderation_requests += 1
+        timer = threading.Timer(self.moderation_latency, self.write_moderation, (object_key,))
+        timer.daemon = True
+        timer.start()
+
+    # 영상 이름의 타임스탬프가 들어간 AWS 결과 파일을 올린다 (병합 단계가 타임스탬프로 찾는다).
+    def write_moderation(self, object_key):
+        stem = os.path.splitext(os.path.basename(object_key))[0]
+        if not TIMESTAMP_PATTERN.search(stem):
+            stem = f"{stem}_{utc_now():%Y%m%d_%H%M%S}"
+        blob = self.storage_client.bucket(self.bucket_name).blob(f"{self.aws_prefix}moderation_{stem}.json")
+        try:
+            if self.aws_recording:
+                blob.upload_from_filename(self.aws_recording, content_type="application/json")
+            else:
+                blob.upload_from_string(json.dumps({"explicit_annotation": {"frames": []}}),
+                                        content_type="application/json")
+        except Exception as e:
+            print(f"가짜 AWS 결과 업로드 실패: {object_key} ({e})")
+            return
+        with self.lock:
+            self.moderation_results += 1
+
+    def stats(self):
+        with self.lock:
+            return {"moderation_requests": self.moderation_requests, "moderation_results": self.moderation_results,
+                    "notifications": self.notifications}
+
+
+def add_backend_arguments(parser):
+    parser.add_argument("--backend", choices=BACKENDS, default="gcp",
+                        help="local이면 GCS/Video Intelligence 대신 로컬 폴더와 가짜 분석기를 쓴다")
+    parser.add_argument("--local-root", default=LOCAL_ROOT, help="로컬 버킷 폴더")
+    parser.add_argument("--recordings", nargs="+", default=[], help="가짜 분석기가 차례로 돌려줄 분석 결과 JSON (없으면 빈 결과)")
+    parser.add_argument("--annotate-latency", type=float, default=ANNOTATE_LATENCY, help="가짜 분석 한 건의 소요 시간 (초)")
+    parser.add_argument("--annotate-failure-rate", type=float, default=ANNOTATE_FAILURE_RATE)
+
+
+# --backend local이면 로컬 레지스트리로 바꾼다. 바꿨으면 레지스트리를 돌려준다.
+def install_backend(args):
+    if args.backend != "local":
+        return None
+    registry = set_registry(LocalRegistry(args.local_root, args.recordings, args.annotate_latency,
+                                          failure_rate=args.annotate_failure_rate))
+    print(f"로컬 백엔드: {os.path.abspath(args.local_root)} (분석 {args.annotate_latency}초, "
+          f"녹화된 결과 {len(args.recordings)}개)")
+    return registry
+
+
+def url_port(url):
+    return urlparse(url).port
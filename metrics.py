@@ -0,0 +1,250 @@
+import sys
+import json
+import time
+import math
+import argparse
+import threading
+import collections
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 단계별 처리 시간 / 처리량 측정
+#
+# 파이프라인의 각 단계(목록 조회, 분석 요청, 분석 대기, JSON 다운로드, 병합, 업로드, patch, 알림 등)를
+# timer()로 감싸면 단계별 시간 히스토그램과 (넘겨준 경우) 바이트 히스토그램, 횟수/실패 카운터가 쌓인다.
+#   - serve(port)        : http://127.0.0.1:<port>/metrics (Prometheus 텍스트), /metrics.json (최근 값 백분위)
+#   - open_trace(path)   : 측정마다 한 줄씩 JSONL로 남긴다 (영상 이름 포함)
+#   - python metrics.py summary <trace.jsonl> : 기록된 실행 전체의 단계별 p50/p95/p99
+
+METRICS_PORT = 9108 # 로컬 측정값 조회 포트 (0이면 끈다)
+RECENT_SAMPLES = 2048 # /metrics.json 백분위 계산에 쓰는 단계별 최근 측정 수
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+BYTES_BUCKETS = tuple(1024 * 4 ** power for power in range(12)) # 1KB ~ 4GB
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.recent = collections.deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        position = 0
+        while position < len(self.buckets) and value > self.buckets[position]:
+            position += 1
+        self.counts[position] += 1
+        self.count += 1
+        self.total += value
+        self.recent.append(value)
+
+    def summary(self):
+        values = sorted(self.recent)
+        summary = {"count": self.count, "total": self.total}
+        for percent in PERCENTILES:
+            summary[f"p{percent}"] = percentile(values, percent)
+        return summary
+
+
+# timer()가 돌려주는 측정 구간. 처리한 바이트 수 등은 with 블록 안에서 채운다.
+class Span:
+    def __init__(self, metrics, stage, clip, tags):
+        self.metrics = metrics
+        self.stage = stage
+        self.clip = clip
+        self.tags = tags
+        self.bytes = None
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        self.metrics.record(self.stage, time.perf_counter() - self.started, self.clip, self.bytes,
+                            error=error_type.__name__ if error_type else None, **self.tags)
+        return False
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = collections.defaultdict(float)
+        self.durations = {}
+        self.sizes = {}
+        self.trace = None
+        self.server = None
+        self.started_at = time.time()
+
+    def timer(self, stage, clip=None, **tags):
+        return Span(self, stage, clip, tags)
+
+    # 시간을 따로 잰 경우(operation 대기처럼 시작과 끝이 다른 스레드인 경우 등)
+    def record(self, stage, seconds, clip=None, size=None, error=None, **tags):
+        with self.lock:
+            if stage not in self.durations:
+                self.durations[stage] = Histogram(SECONDS_BUCKETS)
+            self.durations[stage].observe(seconds)
+            if size is not None:
+                if stage not in self.sizes:
+                    self.sizes[stage] = Histogram(BYTES_BUCKETS)
+                self.sizes[stage].observe(size)
+            self.counters[(f"{stage}_total", "ok" if error is None else "error")] += 1
+
+        event = {"time": round(time.time(), 3), "stage": stage, "seconds": round(seconds, 6)}
+        if clip is not None:
+            event["clip"] = clip
+        if size is not None:
+            event["bytes"] = size
+        if error is not None:
+            event["error"] = error
+        event.update(tags)
+        self.write_trace(event)
+
+    def increment(self, name, value=1, label=""):
+        with self.lock:
+            self.counters[(name, label)] += value
+
+    def open_trace(self, path):
+        # 한 줄씩 바로 기록되도록 줄 단위 버퍼를 쓴다.
+        self.trace = open(path, "a", encoding="utf-8", buffering=1)
+        return self
+
+    def write_trace(self, event):
+        if self.trace is None:
+            return
+        line = json.dumps(event, ensure_ascii=False)
+        with self.lock:
+            self.trace.write(line + "\n")
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "uptime": time.time() - self.started_at,
+                "counters": {f"{name}{{{label}}}" if label else name: value
+                             for (name, label), value in self.counters.items()},
+                "seconds": {stage: histogram.summary() for stage, histogram in self.durations.items()},
+                "bytes": {stage: histogram.summary() for stage, histogram in self.sizes.items()},
+            }
+
+    # Prometheus 텍스트 형식
+    def exposition(self):
+        lines = []
+        with self.lock:
+            for (name, label), value in sorted(self.counters.items()):
+                labels = f'{{result="{label}"}}' if label else ""
+                lines.append(f"pipeline_{name}{labels} {value:g}")
+            for metric, histograms in (("stage_seconds", self.durations), ("stage_bytes", self.sizes)):
+                if histograms:
+                    lines.append(f"# TYPE pipeline_{metric} histogram")
+                for stage, histogram in sorted(histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'pipeline_{metric}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+                    lines.append(f'pipeline_{metric}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'pipeline_{metric}_sum{{stage="{stage}"}} {histogram.total:g}')
+                    lines.append(f'pipeline_{metric}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=METRICS_PORT, host="127.0.0.1"):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.exposition().encode("utf-8"), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()).encode("utf-8"), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"측정값 조회: http://{host}:{self.server.server_address[1]}/metrics")
+        return self
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.trace:
+            self.trace.close()
+            self.trace = None
+
+
+metrics = Metrics()
+
+
+def get_metrics():
+    return metrics
+
+
+# JSONL 기록 전체의 단계별 요약 {단계: {count, errors, p50, p95, p99, max, bytes}}
+def summarize(path, clip=None):
+    seconds = collections.defaultdict(list)
+    sizes = collections.defaultdict(int)
+    errors = collections.defaultdict(int)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if clip is not None and event.get("clip") != clip:
+                continue
+            seconds[event["stage"]].append(event["seconds"])
+            sizes[event["stage"]] += event.get("bytes", 0)
+            if "error" in event:
+                errors[event["stage"]] += 1
+
+    summary = {}
+    for stage, values in seconds.items():
+        values.sort()
+        summary[stage] = {"count": len(values), "errors": errors[stage], "max": values[-1], "bytes": sizes[stage]}
+        for percent in PERCENTILES:
+            summary[stage][f"p{percent}"] = percentile(values, percent)
+    return summary
+
+
+def print_summary(summary):
+    print(f"{'단계':<20}{'횟수':>8}{'실패':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'최대':>10}{'바이트':>14}")
+    for stage, row in sorted(summary.items(), key=lambda item: -item[1]["p50"] * item[1]["count"]):
+        print(f"{stage:<20}{row['count']:>8}{row['errors']:>6}{row['p50']:>10.3f}{row['p95']:>10.3f}"
+              f"{row['p99']:>10.3f}{row['max']:>10.3f}{row['bytes']:>14}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="파이프라인 단계별 측정 기록 요약")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="JSONL 기록의 단계별 p50/p95/p99 (초)")
+    summary_parser.add_argument("trace")
+    summary_parser.add_argument("--clip", help="이 영상의 기록만 요약")
+    summary_parser.add_argument("--json", action="store_true", help="JSON으로 출력")
+    args = parser.parse_args()
+
+    result = summarize(args.trace, args.clip)
+    if not result:
+        print("기록이 없습니다.")
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_summary(result)
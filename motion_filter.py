@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+import concurrent.futures
+import numpy as np
+from metrics import get_metrics
+
+# 움직임이 없는 영상은 분석을 요청하지 않도록 미리 걸러내는 단계
+#
+# 고정 카메라 영상은 아무도 지나가지 않는 빈 장면이 많다. 분석 요청 전에 로컬에서
+#   1. ffmpeg로 디코딩해서 초당 SAMPLE_FPS장, FRAME_WIDTH x FRAME_HEIGHT 흑백으로 줄이고
+#   2. 이웃한 프레임의 밝기 차이에서 화면 전체의 밝기 변화(자동 노출, 조명)를 빼고
+#      PIXEL_THRESHOLD보다 크게 바뀐 화소의 비율을 움직임 점수로 삼는다 (NumPy로 한 번에 계산)
+#   3. 점수가 MOTION_THRESHOLD 이상인 시점 앞뒤로 PADDING_SECONDS를 붙이고 가까운 구간끼리 합쳐 활성 구간을 만든다.
+# 활성 구간이 없으면 분석을 건너뛰고, 영상의 일부뿐이면 그 구간만 분석하도록 요청한다.
+# 디코딩은 프로세스 풀에서 하므로 감시 루프와 파이프라인 작업자를 막지 않는다.
+# 프로세스 풀은 spawn으로 띄운다 (감시, 파이프라인, 알림 스레드가 돌고 있는 프로세스를 fork하지 않는다).
+# ffmpeg가 없거나 디코딩에 실패하면 걸러내지 않고 영상 전체를 분석한다.
+
+SAMPLE_FPS = 1 # 초당 확인할 프레임 수
+FRAME_WIDTH = 160
+FRAME_HEIGHT = 90
+KEYFRAMES_ONLY = False # 키프레임만 디코딩한다 (빠르지만 키프레임 사이의 움직임을 놓쳐서 정지 영상으로 잘못 건너뛸 수 있다)
+PIXEL_THRESHOLD = 20 # 밝기(0~255)가 이 값보다 크게 바뀐 화소를 움직인 것으로 본다
+MOTION_THRESHOLD = 0.003 # 움직인 화소 비율이 이 값 이상이면 움직임이 있는 시점
+PADDING_SECONDS = 3 # 움직임 구간 앞뒤로 붙이는 여유
+MERGE_GAP_SECONDS = 10 # 이보다 가까운 구간은 하나로 합친다
+TRIM_MAX_COVERAGE = 0.7 # 활성 구간이 영상 길이의 이 비율 이상이면 자르지 않고 전체를 분석한다
+DIFF_BATCH_FRAMES = 256 # 프레임 차이를 이 단위로 나눠 계산한다 (int16 임시 배열 크기 제한)
+MOTION_WORKERS = 2 # 디코딩 프로세스 수
+FFMPEG = os.environ.get("FFMPEG", "ffmpeg")
+
+
+# 영상을 흑백 축소 프레임 배열 (프레임 수, 높이, 너비) uint8로 디코딩한다. i번째 프레임은 i / sample_fps초
+def decode_gray_frames(path, sample_fps=SAMPLE_FPS, width=FRAME_WIDTH, height=FRAME_HEIGHT,
+                       keyframes_only=KEYFRAMES_ONLY):
+    command = [FFMPEG, "-nostdin", "-loglevel", "error"]
+    if keyframes_only:
+        command += ["-skip_frame", "nokey"]
+    command += ["-i", path, "-an", "-sn",
+                "-vf", f"fps={sample_fps},scale={width}:{height},format=gray",
+                "-f", "rawvideo", "-pix_fmt", "gray", "-"]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if completed.returncode != 0:
+        message = completed.stderr.decode("utf-8", "replace").strip().splitlines()
+        raise RuntimeError(f"ffmpeg 디코딩 실패: {message[-1] if message else completed.returncode}")
+
+    frame_size = width * height
+    count = len(completed.stdout) // frame_size
+    return np.frombuffer(completed.stdout, dtype=np.uint8, count=count * frame_size).reshape(count, height, width)
+
+
+# 프레임마다 직전 프레임보다 움직인 화소 비율 (첫 프레임은 0)
+def motion_scores(frames, pixel_threshold=PIXEL_THRESHOLD, batch=DIFF_BATCH_FRAMES):
+    scores = np.zeros(len(frames), dtype=np.float32)
+    pixels = frames.shape[1] * frames.shape[2] if frames.ndim == 3 else 1
+    for start in range(1, len(frames), batch):
+        end = min(start + batch, len(frames))
+        diff = frames[start:end].astype(np.int16) - frames[start - 1:end - 1].astype(np.int16)
+        # 화면 전체가 같이 밝아지거나 어두워진 만큼은 움직임으로 보지 않는다.
+        diff -= np.median(diff.reshape(len(diff), -1), axis=1).astype(np.int16)[:, None, None]
+        scores[start:end] = np.count_nonzero(np.abs(diff) > pixel_threshold, axis=(1, 2)) / pixels
+    return scores
+
+
+# 움직임 점수에서 활성 구간 [(시작초, 끝초), ...]
+def active_segments(scores, duration, sample_fps=SAMPLE_FPS, motion_threshold=MOTION_THRESHOLD,
+                    padding=PADDING_SECONDS, merge_gap=MERGE_GAP_SECONDS):
+    moving = np.flatnonzero(scores >= motion_threshold)
+    if len(moving) == 0:
+        return []
+    # 점수는 직전 프레임과의 차이이므로 움직임은 직전 프레임 시각부터 있었던 것으로 본다.
+    starts = np.maximum((moving - 1) / sample_fps - padding, 0)
+    ends = np.minimum(moving / sample_fps + padding, duration)
+
+    segments = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if segments and start - segments[-1][1] <= merge_gap:
+            segments[-1][1] = max(segments[-1][1], end)
+        else:
+            segments.append([start, end])
+    return [(round(start, 3), round(end, 3)) for start, end in segments]
+
+
+class MotionReport:
+    def __init__(self, duration, frames, scores, segments):
+        self.duration = duration
+        self.frames = frames
+        self.peak = float(scores.max()) if len(scores) else 0.0
+        self.mean = float(scores.mean()) if len(scores) else 0.0
+        self.segments = segments
+        self.active_seconds = sum(end - start for start, end in segments)
+
+    # 움직임이 전혀 없는 영상
+    @property
+    def static(self):
+        return self.frames > 1 and not self.segments
+
+    # 일부 구간만 분석하면 되는 경우 그 구간 목록 (아니면 None)
+    @property
+    def trim(self):
+        if self.static or not self.duration or self.active_seconds >= self.duration * TRIM_MAX_COVERAGE:
+            return None
+        return self.segments
+
+    def to_dict(self):
+        return {"duration": self.duration, "frames": self.frames, "peak_score": round(self.peak, 6),
+                "mean_score": round(self.mean, 6), "active_seconds": round(self.active_seconds, 3),
+                "segments": [list(segment) for segment in self.segments]}
+
+
+# 프로세스 풀에서 실행한다.
+def analyze_clip(path, sample_fps=SAMPLE_FPS, keyframes_only=KEYFRAMES_ONLY):
+    frames = decode_gray_frames(path, sample_fps, keyframes_only=keyframes_only)
+    scores = motion_scores(frames)
+    duration = len(frames) / sample_fps
+    return MotionReport(duration, len(frames), scores, active_segments(scores, duration, sample_fps))
+
+
+# 움직임이 없어 분석을 건너뛴 영상의 결과. 뷰어와 병합 단계가 그대로 읽을 수 있는 빈 분석 결과 모양이다.
+def static_result(input_uri, report):
+    return {"annotation_results": [{
+        "input_uri": input_uri,
+        "segment": {"start_time_offset": {}, "end_time_offset": {"seconds": int(report.duration)}},
+        "face_detection_annotations": [],
+        "object_annotations": [],
+        "explicit_annotation": {},
+        "motion_filter": dict(report.to_dict(), skipped=True),
+    }]}
+
+
+class MotionFilter:
+    def __init__(self, workers=MOTION_WORKERS, sample_fps=SAMPLE_FPS, work_dir=None, keyframes_only=KEYFRAMES_ONLY):
+        self.sample_fps = sample_fps
+        self.work_dir = work_dir
+        self.keyframes_only = keyframes_only
+        self.processes = concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                                mp_context=multiprocessing.get_context("spawn"))
+        # 다운로드하고 디코딩 결과를 기다리는 스레드 (프로세스 수만큼만 있으면 된다)
+        self.threads = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="motion-filter")
+
+    # 블롭을 받아 움직임을 확인한다. 확인하지 못하면 None
+    def check(self, blob):
+        metrics = get_metrics()
+        clip = blob.name.split('/')[-1]
+        suffix = os.path.splitext(blob.name)[1]
+        try:
+            with tempfile.NamedTemporaryFile(suffix=suffix, dir=self.work_dir, delete=False) as f:
+                path = f.name
+            try:
+                with metrics.timer("motion_download", clip=clip) as span:
+                    blob.download_to_filename(path)
+                    span.bytes = os.path.getsize(path)
+                with metrics.timer("motion_decode", clip=clip):
+                    return self.processes.submit(analyze_clip, path, self.sample_fps, self.keyframes_only).result()
+            finally:
+                os.remove(path)
+        except Exception as e:
+            print(f"움직임 확인 실패, 영상 전체를 분석합니다: {clip} ({e})")
+            return None
+
+    # 확인이 끝나면 callback(report)를 부른다 (report는 check와 같다).
+    # 블롭은 확인하는 스레드에서 blob_fn()으로 만든다 (스레드마다 따로 두는 Storage 클라이언트를 쓰도록).
+    def submit(self, blob_fn, callback):
+        def run():
+            report = None
+            try:
+                blob = blob_fn()
+                report = self.check(blob)
+            except Exception as e:
+                print(f"움직임 확인 실패, 영상 전체를 분석합니다: {e}")
+            try:
+                callback(report)
+            except Exception as e:
+                print(f"움직임 확인 이후 처리 중 오류 발생: {e}")
+        return self.threads.submit(run)
+
+    def stop(self, wait=True):
+        self.threads.shutdown(wait=wait)
+        self.processes.shutdown(wait=wait)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="로컬 영상의 움직임 구간 확인")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--sample-fps", type=float, default=SAMPLE_FPS)
+    parser.add_argument("--keyframes-only", action="store_true", help="키프레임만 디코딩 (빠르지만 짧은 움직임을 놓칠 수 있다)")
+    args = parser.parse_args()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=MOTION_WORKERS) as executor:
+        futures = {video: executor.submit(analyze_clip, video, args.sample_fps, args.keyframes_only) for video in args.videos}
+        failed = False
+        for video, future in futures.items():
+            try:
+                report = future.result()
+            except Exception as e:
+                print(f"{video}: {e}")
+                failed = True
+                continue
+            decision = "skip" if report.static else ("trim" if report.trim else "full")
+            print(json.dumps(dict(report.to_dict(), video=video, decision=decision), ensure_ascii=False))
+    sys.exit(1 if failed else 0)
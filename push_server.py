@@ -0,0 +1,192 @@
+import json
+import asyncio
+import threading
+import collections
+from metrics import get_metrics
+
+# 새 분석 결과를 뷰어에 바로 알리는 SSE(Server-Sent Events) 서버
+#
+# 뷰어는 GET /events 를 EventSource로 열어 두고, 파이프라인은 결과를 게시할 때 publish()를 부른다.
+# 알림에는 영상 타임스탬프와 아티팩트/JSON 주소만 들어가므로 뷰어는 바뀐 것만 받아 온다.
+#   - asyncio 이벤트 루프를 별도 스레드에서 돌리고, publish()는 어느 스레드에서 불러도 바로 돌아온다.
+#   - 클라이언트마다 아직 보내지 못한 알림을 키(기본: 이벤트 이름)별로 하나만 들고 있어서,
+#     연달아 게시되면(구간별 중간 결과 등) 느린 클라이언트에는 마지막 것만 간다.
+#     뷰어는 마지막 결과만 보여 주므로 모든 결과를 같은 키로 보내고, 밀린 알림은 키 수 이상으로 늘지 않는다.
+#   - 느린 클라이언트는 한 번 보내는 데 CLIENT_WRITE_TIMEOUT을 넘기면 끊는다 (이것이 유일한 역압력이다).
+#     EventSource는 알아서 다시 연결하고, 연결하면 키별 마지막 알림을 먼저 받는다.
+#   - GET /health : 연결 수와 누계 (JSON)
+
+PUSH_PORT = 8765 # 뷰어 알림 포트 (0이면 끈다)
+PUSH_HOST = "127.0.0.1" # 기본은 이 PC의 뷰어만 받는다. 다른 PC에서 연 뷰어도 받으려면 --push-host 0.0.0.0
+CLIENT_WRITE_TIMEOUT = 5 # 한 번 보내는 데 이 시간(초)을 넘기면 느린 클라이언트로 보고 끊는다
+HEARTBEAT_SECONDS = 15 # 알림이 없을 때 연결 유지용 주석을 보내는 간격
+RETRY_MILLISECONDS = 2000 # 끊겼을 때 EventSource가 다시 연결하기까지 기다리는 시간
+REQUEST_TIMEOUT = 10 # 요청 헤더를 읽는 제한 시간
+MAX_REQUEST_BYTES = 16 * 1024
+
+
+class PushClient:
+    def __init__(self, writer):
+        self.writer = writer
+        self.pending = collections.OrderedDict() # 키 -> 보낼 메시지 (바이트)
+        self.ready = asyncio.Event()
+        self.dropped = False
+        self.task = asyncio.current_task()
+
+
+class PushServer:
+    def __init__(self, host=PUSH_HOST, port=PUSH_PORT, write_timeout=CLIENT_WRITE_TIMEOUT,
+                 heartbeat=HEARTBEAT_SECONDS):
+        self.host = host
+        self.port = port
+        self.write_timeout = write_timeout
+        self.heartbeat = heartbeat
+
+        self.loop = None
+        self.thread = None
+        self.started = threading.Event()
+        self.stopping = None
+        self.error = None
+        self.clients = set()
+        self.latest = collections.OrderedDict() # 새로 연결한 클라이언트에 먼저 보낼 키별 마지막 메시지
+        self.sequence = 0
+
+        self.published = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="push-server", daemon=True)
+        self.thread.start()
+        self.started.wait()
+        if self.error:
+            raise self.error
+        print(f"뷰어 알림: http://{self.host}:{self.port}/events")
+        return self
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            self.error = e
+            self.started.set()
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = self.loop.create_future()
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        self.started.set()
+        async with server:
+            await self.stopping
+            # 연결마다 보내기 루프를 끝내게 하고, 끝날 때까지 기다린다.
+            streams = [client.task for client in self.clients]
+            for client in list(self.clients):
+                client.ready.set()
+            await asyncio.gather(*streams, return_exceptions=True)
+
+    def stop(self):
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(lambda: self.stopping.done() or self.stopping.set_result(None))
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    # 어느 스레드에서나 부를 수 있다. 같은 키의 알림이 밀려 있으면 새 알림으로 바꾼다.
+    def publish(self, event, data, key=None):
+        if self.loop is None or self.loop.is_closed():
+            return
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        self.loop.call_soon_threadsafe(self.broadcast, key or event, event, payload)
+
+    def broadcast(self, key, event, payload):
+        self.sequence += 1
+        self.published += 1
+        message = f"id: {self.sequence}\nevent: {event}\ndata: {payload}\n\n".encode("utf-8")
+        self.latest[key] = message
+        self.latest.move_to_end(key)
+        for client in list(self.clients):
+            self.offer(client, key, message)
+
+    def offer(self, client, key, message):
+        if key in client.pending:
+            self.coalesced += 1
+        client.pending[key] = message
+        client.pending.move_to_end(key)
+        client.ready.set()
+
+    async def handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        if len(request) > MAX_REQUEST_BYTES:
+            await self.respond(writer, 431, "text/plain", b"")
+            return
+
+        method, path = (request.split(b"\r\n", 1)[0].decode("latin-1").split(" ") + ["", ""])[:2]
+        path = path.split("?", 1)[0]
+        if method != "GET":
+            await self.respond(writer, 405, "text/plain", b"")
+        elif path == "/events":
+            await self.stream(writer)
+        elif path == "/health":
+            await self.respond(writer, 200, "application/json", json.dumps(self.stats()).encode("utf-8"))
+        else:
+            await self.respond(writer, 404, "text/plain", b"")
+
+    async def respond(self, writer, status, content_type, body):
+        reasons = {200: "OK", 404: "Not Found", 405: "Method Not Allowed", 431: "Request Header Fields Too Large"}
+        writer.write(f"HTTP/1.1 {status} {reasons[status]}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nAccess-Control-Allow-Origin: *\r\n"
+                     f"Connection: close\r\n\r\n".encode("latin-1") + body)
+        try:
+            await asyncio.wait_for(writer.drain(), self.write_timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        writer.close()
+
+    async def stream(self, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: keep-alive\r\nAccess-Control-Allow-Origin: *\r\nX-Accel-Buffering: no\r\n\r\n"
+                     + f"retry: {RETRY_MILLISECONDS}\n\n".encode("latin-1"))
+        client = PushClient(writer)
+        for key, message in self.latest.items():
+            client.pending[key] = message
+        client.ready.set()
+        self.clients.add(client)
+        get_metrics().increment("push_connections")
+
+        try:
+            while True:
+                messages = []
+                try:
+                    await asyncio.wait_for(client.ready.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    writer.write(b": ping\n\n")
+                else:
+                    if self.stopping.done():
+                        break
+                    client.ready.clear()
+                    messages = list(client.pending.values())
+                    client.pending.clear()
+                    writer.writelines(messages)
+                await asyncio.wait_for(writer.drain(), self.write_timeout)
+                # 다 보낸 뒤에만 센다 (시간 안에 못 보내고 끊긴 알림은 세지 않는다).
+                self.sent += len(messages)
+        except asyncio.TimeoutError:
+            client.dropped = True
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            if client.dropped:
+                self.dropped += 1
+                get_metrics().increment("push_dropped_clients")
+            writer.close()
+
+    def stats(self):
+        return {"clients": len(self.clients), "published": self.published, "sent": self.sent,
+                "coalesced": self.coalesced, "dropped": self.dropped}
+
@@ -0,0 +1,224 @@
+import time
+import heapq
+import random
+import threading
+import concurrent.futures
+from timestamp_index import parse_timestamp
+from metrics import get_metrics
+
+# 영상마다 AWS(explicit_annotation) 결과와 구글 분석 결과를 기다렸다가 둘 다 준비되면 병합하는 단계
+#
+# AWS 분석 요청과 구글 분석은 동시에 시작하고, 구글 분석이 끝나면 AWS 결과 파일이 올라왔는지
+# 처음에는 짧게, 이후로는 간격을 늘려가며(지수 백오프 + 지터) 확인한다.
+# 확인할 영상이 여러 개여도 AWS 결과 목록은 한 번만 갱신(refresh_fn)한 뒤 영상마다 찾는다(lookup_fn).
+# AWS 요청이 실패했으면 기다리는 동안 다시 요청한다.
+# 병합(on_ready)이 실패하면 같은 백오프 간격으로 다시 병합하고, DEADLINE이 지나면 on_expired로 넘긴다.
+
+INITIAL_DELAY = 2 # 첫 확인 간격 (초)
+MAX_DELAY = 60 # 최대 확인 간격 (초)
+BACKOFF = 2
+DEADLINE = 6 * 3600 # 구글 분석이 끝난 뒤 이 시간(초)이 지나도 AWS 결과가 없으면 포기한다
+
+
+class RendezvousEntry:
+    def __init__(self, video_name):
+        self.video_name = video_name
+        self.aws_requested = False
+        self.aws_file = None
+        self.gcp_output = None
+        self.created_at = time.monotonic()
+        self.gcp_ready_at = None
+        self.delay = INITIAL_DELAY
+        self.next_check = None
+        self.merge_attempts = 0
+
+
+class ResultRendezvous:
+    # request_aws_fn(video_name) -> bool            : AWS 분석 요청 (실패하면 False)
+    # refresh_fn()                                  : AWS 결과 목록 갱신
+    # lookup_fn(timestamp) -> aws_file 또는 None     : 타임스탬프에 해당하는 AWS 결과 파일
+    # on_ready(video_name, gcp_output, aws_file)    : 둘 다 준비됐을 때 실행할 병합
+    # on_expired(video_name, gcp_output)            : DEADLINE이 지나도록 AWS 결과가 없을 때
+    def __init__(self, request_aws_fn, refresh_fn, lookup_fn, on_ready, on_expired=None,
+                 initial_delay=INITIAL_DELAY, max_delay=MAX_DELAY, deadline=DEADLINE, workers=2):
+        self.request_aws_fn = request_aws_fn
+        self.refresh_fn = refresh_fn
+        self.lookup_fn = lookup_fn
+        self.on_ready = on_ready
+        self.on_expired = on_expired
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+        self.entries = {}
+        self.schedule = [] # (다음 확인 시각, 순번, 영상 이름)
+        self.sequence = 0
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rendezvous")
+
+        self.joined = 0
+        self.expired = 0
+        self.waits = [] # 구글 분석이 끝난 뒤 AWS 결과까지 기다린 시간 (최근 것만)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.loop, name="result-rendezvous", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if wait and self.thread:
+            self.thread.join()
+        self.executor.shutdown(wait=wait)
+
+    def entry(self, video_name):
+        if video_name not in self.entries:
+            self.entries[video_name] = RendezvousEntry(video_name)
+            self.entries[video_name].delay = self.initial_delay
+        return self.entries[video_name]
+
+    def reschedule(self, entry, delay):
+        entry.next_check = time.monotonic() + delay
+        self.sequence += 1
+        heapq.heappush(self.schedule, (entry.next_check, self.sequence, entry.video_name))
+        self.condition.notify_all()
+
+    # 영상이 감지되면 AWS 분석을 요청한다 (기다리지 않고 바로 돌아온다).
+    def expect(self, video_name):
+        with self.condition:
+            self.entry(video_name)
+        self.executor.submit(self.request_aws, video_name)
+
+    def request_aws(self, video_name):
+        try:
+            requested = self.request_aws_fn(video_name)
+        except Exception as e:
+            print(f"AWS 분석 요청 실패: {video_name} ({e})")
+            requested = False
+        with self.condition:
+            entry = self.entries.get(video_name)
+            if entry is None:
+                return
+            entry.aws_requested = requested
+            if not requested and entry.next_check is None:
+                self.reschedule(entry, entry.delay)
+
+    # 구글 분석 결과가 준비됐다. 감지 기록 없이(재시작 후 등) 들어오면 AWS 요청은 이미 한 것으로 본다.
+    def gcp_ready(self, video_name, gcp_output):
+        with self.condition:
+            known = video_name in self.entries
+            entry = self.entry(video_name)
+            if not known:
+                entry.aws_requested = True
+            entry.gcp_output = gcp_output
+            entry.gcp_ready_at = time.monotonic()
+            entry.delay = self.initial_delay
+            self.reschedule(entry, 0)
+
+    # AWS 결과 파일을 다른 경로로 알게 된 경우
+    def aws_ready(self, video_name, aws_file):
+        with self.condition:
+            entry = self.entry(video_name)
+            entry.aws_file = aws_file
+            self.reschedule(entry, 0)
+
+    # 분석에 실패한 영상은 더 기다리지 않는다.
+    def discard(self, video_name):
+        with self.condition:
+            self.entries.pop(video_name, None)
+
+    def loop(self):
+        while not self.stop_event.is_set():
+            with self.condition:
+                while not self.stop_event.is_set():
+                    now = time.monotonic()
+                    if self.schedule and self.schedule[0][0] <= now:
+                        break
+                    self.condition.wait(self.schedule[0][0] - now if self.schedule else None)
+                if self.stop_event.is_set():
+                    return
+
+                due = []
+                while self.schedule and self.schedule[0][0] <= time.monotonic():
+                    next_check, _, video_name = heapq.heappop(self.schedule)
+                    entry = self.entries.get(video_name)
+                    # 다시 예약되면서 남은 예전 예약은 건너뛴다.
+                    if entry is not None and entry.next_check == next_check:
+                        entry.next_check = None
+                        due.append(entry)
+
+            self.check(due)
+
+    def check(self, due):
+        if any(entry.gcp_output and not entry.aws_file for entry in due):
+            try:
+                self.refresh_fn()
+            except Exception as e:
+                print(f"AWS 결과 목록 갱신 실패: {e}")
+
+        for entry in due:
+            if not entry.aws_requested:
+                self.executor.submit(self.request_aws, entry.video_name)
+
+            if entry.gcp_output and not entry.aws_file:
+                timestamp = parse_timestamp(entry.gcp_output)
+                entry.aws_file = self.lookup_fn(timestamp) if timestamp else None
+
+            with self.condition:
+                if entry.gcp_output and entry.aws_file:
+                    self.entries.pop(entry.video_name, None)
+                    if not entry.merge_attempts:
+                        self.joined += 1
+                        self.waits = self.waits[-99:] + [time.monotonic() - entry.gcp_ready_at]
+                        get_metrics().record("aws_wait", self.waits[-1], clip=entry.video_name)
+                    entry.merge_attempts += 1
+                    self.executor.submit(self.run_ready, entry)
+                elif entry.gcp_ready_at and time.monotonic() - entry.gcp_ready_at > self.deadline:
+                    self.entries.pop(entry.video_name, None)
+                    self.expired += 1
+                    get_metrics().increment("rendezvous_expired")
+                    if self.on_expired:
+                        self.executor.submit(self.on_expired, entry.video_name, entry.gcp_output)
+                elif entry.gcp_output or not entry.aws_requested:
+                    # 여러 영상이 같은 순간에 몰리지 않도록 간격에 지터를 준다.
+                    self.reschedule(entry, entry.delay * random.uniform(0.8, 1.2))
+                    entry.delay = min(entry.delay * BACKOFF, self.max_delay)
+
+    def run_ready(self, entry):
+        try:
+            self.on_ready(entry.video_name, entry.gcp_output, entry.aws_file)
+        except Exception as e:
+            print(f"결과 병합 실패: {entry.video_name} ({e})")
+            self.retry(entry)
+
+    # 병합에 실패한 영상을 다시 기다리는 목록에 넣는다. 그 사이 새로 들어온 영상 기록이 있으면 그쪽을 따른다.
+    def retry(self, entry):
+        with self.condition:
+            if self.stop_event.is_set() or entry.video_name in self.entries:
+                return
+            if time.monotonic() - entry.gcp_ready_at > self.deadline:
+                self.expired += 1
+                get_metrics().increment("rendezvous_expired")
+                if self.on_expired:
+                    self.executor.submit(self.on_expired, entry.video_name, entry.gcp_output)
+                return
+            get_metrics().increment("rendezvous_merge_retry")
+            self.entries[entry.video_name] = entry
+            print(f"{entry.delay:.0f}초 뒤 다시 병합합니다: {entry.video_name} ({entry.merge_attempts}번째 실패)")
+            self.reschedule(entry, entry.delay * random.uniform(0.8, 1.2))
+            entry.delay = min(entry.delay * BACKOFF, self.max_delay)
+
+    def stats(self):
+        with self.condition:
+            waiting = len(self.entries)
+            waits = sorted(self.waits)
+        return {
+            "waiting": waiting,
+            "joined": self.joined,
+            "expired": self.expired,
+            "median_wait": waits[len(waits) // 2] if waits else None,
+        }
@@ -1,13 +1,30 @@
 from google.cloud import videointelligence
 from google.api_core import exceptions
-from google.cloud import storage
+from google.api_core import operation as google_operation
 import time
 import datetime
+import argparse
+import threading
 import concurrent.futures
 import os
 import json
 import re
 import requests
+from bucket_watcher import BucketWatcher
+from annotation_pipeline import AnnotationPipeline
+from clients import get_registry
+from timestamp_index import TimestampIndex
+from streaming_merge import stream_merge
+from annotation_artifact import publish_artifact, publish_view_manifest
+from job_ledger import JobLedger, content_key, DETECTED, QUEUED, SUBMITTED, ANNOTATED, MERGED, PUBLISHED, FAILED
+from result_rendezvous import ResultRendezvous
+from metrics import get_metrics, METRICS_PORT
+from compressed_json import open_blob_reader, open_blob_writer, upload_json
+from chunked_annotation import CHUNK_SECONDS, CHUNK_MAX_IN_FLIGHT, probe_duration, plan_segments, annotate_in_segments
+from motion_filter import MotionFilter, MOTION_WORKERS, static_result
+from push_server import PushServer, PUSH_PORT, PUSH_HOST
+from timeline_manifest import timeline_entry, append_entry
+from local_backends import StubServices, MODERATION_LATENCY, add_backend_arguments, install_backend, url_port
 
 # 전역 변수로 버킷 정보 설정
 GCS_BUCKET = "highbuff_developer_seoul"
@@ -16,6 +33,28 @@ TEMP_OUTPUT_PREFIX = "temp-output-json-files/" # 구글 비디오 영상 분석
 AWS_OUTPUT_PREFIX = "visualize-aws-output-files/" # AWS에 업로드된 JSON 파일 (explicit_annotation)의 경로
 FINAL_OUTPUT_PREFIX = "visualize-final-output-files/" # 최종 합쳐진 JSON 파일의 경로
 VIEW_FINAL_OUTPUT_PREFIX = "visualize-view-final-output-files/" # 웹에서 보여질 파일의 경로
+SEGMENT_OUTPUT_PREFIX = "temp-output-segment-files/" # 구간별로 나눠 분석한 JSON 파일의 경로
+PARTIAL_OUTPUT_PREFIX = "visualize-partial-output-files/" # 구간 분석 중간 결과(이어 붙인 JSON)의 경로
+STATE_DIR = "pipeline-state/" # 재시작해도 유지되어야 하는 로컬 상태 파일의 경로
+WATCHER_CURSOR_PATH = os.path.join(STATE_DIR, "input_watcher_cursor.json") # 마지막으로 처리한 입력 영상 커서
+AWS_INDEX_PATH = os.path.join(STATE_DIR, "aws_timestamp_index.json") # AWS 결과 파일 타임스탬프 인덱스
+JOB_LEDGER_PATH = os.path.join(STATE_DIR, "jobs.sqlite3") # 영상별 처리 단계와 분석 작업 기록
+AWS_MATCH_TOLERANCE = 2 # AWS/GCP 타임스탬프가 이 초 이내로 차이나면 같은 영상으로 본다
+STREAM_CHUNK_SIZE = 4 * 1024 * 1024 # 분석 결과를 스트림으로 읽고 쓸 때의 단위 (256KB의 배수)
+MODERATION_API_URL = "http://localhost:5555/api/v1/moderation/create" # AWS 분석 요청 API
+MERGE_COMPLETE_URL = "http://localhost:8080/merge-complete" # 병합 완료를 알리는 server.js 주소
+NOTIFY_TIMEOUT = 3 # server.js 알림 요청 제한 시간 (초)
+WATCH_MAX_ATTEMPTS = 3 # 새 영상 하나의 처리를 이 횟수만큼 실패하면 실패로 기록하고 다음 영상으로 넘어간다
+# 다음 확인 때 다시 시도할 만한 일시적인 오류
+TRANSIENT_ERRORS = (exceptions.ServiceUnavailable, exceptions.TooManyRequests, exceptions.InternalServerError,
+                    exceptions.BadGateway, exceptions.GatewayTimeout, exceptions.DeadlineExceeded,
+                    requests.exceptions.ConnectionError, requests.exceptions.Timeout, ConnectionError, TimeoutError)
+PUBLIC_URL = f"https://storage.googleapis.com/{GCS_BUCKET}/" # 뷰어가 결과 파일을 받는 주소
+
+# 파이프라인 모드 설정
+PIPELINE_WORKERS = 4 # 분석 요청을 보내는 작업자 수
+PIPELINE_QUEUE_SIZE = 32 # 대기열 크기 (꽉 차면 새 영상 감지를 잠시 멈춘다)
+PROJECT_MAX_IN_FLIGHT = 8 # 프로젝트당 동시에 진행할 수 있는 분석 작업 수
 
 # 재시도 로직을 포함한 파일 업로드 함수
 def upload_blob_with_retry(blob, data, retries=5, delay=1):
@@ -33,210 +72,706 @@ def upload_blob_with_retry(blob, data, retries=5, delay=1):
                 print("최대 재시도 횟수 초과. 업로드 실패.")
                 raise
 
-# 영상 변환
-def process_video(video_name, gcs_client, timeout=1800):
-    # {datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json
+ANNOTATION_FEATURES = [
+    videointelligence.Feature.FACE_DETECTION,
+    videointelligence.Feature.OBJECT_TRACKING,
+    videointelligence.Feature.EXPLICIT_CONTENT_DETECTION
+]
+FEATURE_SET = [feature.name for feature in ANNOTATION_FEATURES] # 같은 내용 + 같은 기능이면 같은 분석으로 본다
 
+# 영상 분석 요청 내용 (segments=[(시작초, 끝초), ...]를 넘기면 그 구간들만 분석한다)
+def build_annotation_request(video_name, output_uri, segments=None):
     gcs_uri = f"gs://{GCS_BUCKET}/{INPUT_PREFIX}{video_name}"
-    output_filename = f"{os.path.splitext(video_name)[0]}-{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+
+    features = list(ANNOTATION_FEATURES)
+
+    transcript_config = videointelligence.SpeechTranscriptionConfig(
+        language_code="en-US", enable_automatic_punctuation=True
+    )
+
+    person_config = videointelligence.PersonDetectionConfig(
+        include_bounding_boxes=True,
+        include_attributes=False,
+        include_pose_landmarks=True,
+    )
+
+    face_config = videointelligence.FaceDetectionConfig(
+        include_bounding_boxes=True, include_attributes=True
+    )
+
+    video_context = videointelligence.VideoContext(
+        speech_transcription_config=transcript_config,
+        person_detection_config=person_config,
+        face_detection_config=face_config)
+
+    if segments:
+        video_context.segments = [videointelligence.VideoSegment(
+            start_time_offset=datetime.timedelta(seconds=start),
+            end_time_offset=datetime.timedelta(seconds=end)) for start, end in segments]
+
+    return {"features": features,
+            "input_uri": gcs_uri,
+            "output_uri": output_uri,
+            "video_context": video_context}
+
+def new_output_filename(video_name):
+    # {datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json
+    return f"{os.path.splitext(video_name)[0]}-{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+
+# 영상 분석 요청 (operation을 돌려주기만 하고 결과를 기다리지 않는다)
+def submit_annotation(video_name, video_client, output_filename=None):
+    output_filename = output_filename or new_output_filename(video_name)
     temp_output_uri = f"gs://{GCS_BUCKET}/{TEMP_OUTPUT_PREFIX}{output_filename}"
 
-    try:
-        print("\n")
-        print("\n처리를 시작합니다. 비디오 크기에 따라 시간이 오래 걸릴 수 있습니다.")
-        print("\n")
-        
-        video_client = videointelligence.VideoIntelligenceServiceClient.from_service_account_file(
-            "/Users/highbuff/Downloads/gold-braid-428103-s3-1806cc6a21a0.json")
-
-        features = [
-            videointelligence.Feature.FACE_DETECTION,
-            videointelligence.Feature.OBJECT_TRACKING,
-            videointelligence.Feature.EXPLICIT_CONTENT_DETECTION
-        ]
-
-        transcript_config = videointelligence.SpeechTranscriptionConfig(
-            language_code="en-US", enable_automatic_punctuation=True
-        )
-
-        person_config = videointelligence.PersonDetectionConfig(
-            include_bounding_boxes=True,
-            include_attributes=False,
-            include_pose_landmarks=True,
-        )
-
-        face_config = videointelligence.FaceDetectionConfig(
-            include_bounding_boxes=True, include_attributes=True
-        )
-
-        video_context = videointelligence.VideoContext(
-            speech_transcription_config=transcript_config,
-            person_detection_config=person_config,
-            face_detection_config=face_config)
-
-        operation = video_client.annotate_video(
-            request={"features": features,
-                     "input_uri": gcs_uri,
-                     "output_uri": temp_output_uri,
-                     "video_context": video_context}
-        )
-
-        print(f"\n'{video_name}' 비디오를 처리하고 있습니다...")
-        result = operation.result(timeout=timeout)
-        print("\n처리가 완료되었습니다.")
-        print(f"결과가 다음 위치에 저장되었습니다: {temp_output_uri}")
+    operation = video_client.annotate_video(
+        request=build_annotation_request(video_name, temp_output_uri, active_segments_of(video_name))
+    )
 
-        merge_json_files(gcs_client, output_filename)
-        
-        return result
+    print(f"\n'{video_name}' 비디오를 처리하고 있습니다...")
+    return operation, output_filename
+
+# 움직임 확인에서 일부 구간만 분석하기로 한 영상의 구간 목록 (재시작하면 영상 전체를 분석한다)
+motion_segments = {}
+motion_segments_lock = threading.Lock()
+
+def active_segments_of(video_name):
+    with motion_segments_lock:
+        return motion_segments.get(video_name)
+
+def forget_active_segments(video_name):
+    with motion_segments_lock:
+        motion_segments.pop(video_name, None)
+
+ledger = None
+ledger_lock = threading.Lock()
+
+def get_ledger():
+    global ledger
+    with ledger_lock:
+        if ledger is None:
+            ledger = JobLedger(JOB_LEDGER_PATH)
+        return ledger
+
+# 로컬 상태 파일(커서, AWS 인덱스, 처리 기록)을 다른 폴더에 둔다. 처리 기록을 열기 전에 불러야 한다.
+# 로컬 백엔드로 돌릴 때 실제 버킷의 처리 상태와 섞이지 않게 한다.
+def use_state_dir(state_dir):
+    global STATE_DIR, WATCHER_CURSOR_PATH, AWS_INDEX_PATH, JOB_LEDGER_PATH
+    STATE_DIR = state_dir
+    WATCHER_CURSOR_PATH = os.path.join(state_dir, "input_watcher_cursor.json")
+    AWS_INDEX_PATH = os.path.join(state_dir, "aws_timestamp_index.json")
+    JOB_LEDGER_PATH = os.path.join(state_dir, "jobs.sqlite3")
+
+# 감지된 영상을 처리 기록에 남긴다 (목록 조회 결과에 내용 해시가 없으면 메타데이터를 다시 읽는다)
+def record_detected(blob):
+    if not blob.md5_hash and not blob.crc32c:
+        blob.reload()
+    return get_ledger().detect(blob.name.split('/')[-1], blob.generation, content_key(blob, FEATURE_SET))
+
+def find_clip(video_name):
+    clip = get_ledger().clip(video_name)
+    if clip is None:
+        blob = get_registry().storage_client().bucket(GCS_BUCKET).get_blob(f"{INPUT_PREFIX}{video_name}")
+        if blob is None:
+            raise exceptions.NotFound(f"{INPUT_PREFIX}{video_name}")
+        clip = record_detected(blob)
+    return clip
+
+def mark_clip(output_filename, state, **fields):
+    clip = get_ledger().clip_by_output(output_filename)
+    if clip:
+        get_ledger().update_clip(clip, state, **fields)
+
+def mark_failed(video_name, error):
+    if rendezvous:
+        rendezvous.discard(video_name)
+    forget_active_segments(video_name)
+    clip = get_ledger().clip(video_name)
+    if clip:
+        get_ledger().update_clip(clip, FAILED, error=str(error))
+        get_ledger().annotation_failed(clip["job_key"])
+
+# 이름으로 진행 중인 operation을 다시 찾는다 (annotate_video가 돌려주는 것과 같은 operation future)
+def resume_operation(video_client, operation_name):
+    operations_client = video_client.transport.operations_client
+    return google_operation.from_gapic(
+        operations_client.get_operation(operation_name),
+        operations_client,
+        videointelligence.AnnotateVideoResponse,
+        metadata_type=videointelligence.AnnotateVideoProgress)
+
+# 분석 시작. 같은 내용의 분석이 이미 진행 중이면 (재시작 전에 보낸 것 포함) 새로 요청하지 않고 그 operation을 기다린다.
+def start_annotation(video_name, video_client):
+    clip = find_clip(video_name)
+    annotation = get_ledger().annotation(clip["job_key"])
+    output_filename = clip["output_filename"] or new_output_filename(video_name)
+
+    if annotation and annotation["state"] == SUBMITTED and annotation["operation_name"]:
+        with get_metrics().timer("resume", clip=video_name):
+            operation = resume_operation(video_client, annotation["operation_name"])
+        print(f"\n'{video_name}' 비디오의 진행 중인 분석을 이어서 기다립니다: {annotation['operation_name']}")
+    else:
+        with get_metrics().timer("submit", clip=video_name):
+            operation, output_filename = submit_annotation(video_name, video_client, output_filename)
+        get_ledger().set_annotation(clip["job_key"], SUBMITTED, operation.operation.name, output_filename)
+
+    get_ledger().update_clip(clip, SUBMITTED, output_filename=output_filename)
+    return operation, output_filename
+
+def copy_temp_output(bucket, source_filename, output_filename):
+    if source_filename != output_filename:
+        source_blob = bucket.blob(f"{TEMP_OUTPUT_PREFIX}{source_filename}")
+        with get_metrics().timer("copy_cached", clip=clip_of(output_filename)):
+            bucket.copy_blob(source_blob, bucket, f"{TEMP_OUTPUT_PREFIX}{output_filename}")
+
+# 측정 기록에 남길 영상 이름 (처리 기록에 없으면 결과 파일 이름)
+def clip_of(output_filename):
+    clip = get_ledger().clip_by_output(output_filename)
+    return clip["video_name"] if clip else output_filename
 
-    except exceptions.NotFound as e:
+# 분석이 끝난 영상을 기록하고, AWS 결과가 준비되는 대로 병합하도록 넘긴다.
+def complete_annotation(registry, video_name, output_filename):
+    clip = get_ledger().clip_by_output(output_filename)
+    if clip:
+        get_ledger().annotation_finished(clip["job_key"], output_filename)
+        # 같은 내용의 다른 영상 분석을 기다렸다면 그 결과를 이 영상의 이름으로 복사해 둔다.
+        annotation = get_ledger().annotation(clip["job_key"])
+        copy_temp_output(registry.storage_client().bucket(GCS_BUCKET), annotation["output_filename"], output_filename)
+        get_ledger().update_clip(clip, ANNOTATED)
+
+    forget_active_segments(video_name)
+    get_rendezvous(registry).gcp_ready(video_name, output_filename)
+
+# 같은 내용을 이미 분석한 적이 있으면 분석을 다시 요청하지 않고 그 결과 파일을 쓴다. 썼으면 True
+def reuse_annotation(registry, clip):
+    annotation = get_ledger().annotation(clip["job_key"])
+    if not annotation or annotation["state"] != ANNOTATED or not annotation["output_filename"]:
+        return False
+
+    bucket = registry.storage_client().bucket(GCS_BUCKET)
+    if not bucket.blob(f"{TEMP_OUTPUT_PREFIX}{annotation['output_filename']}").exists():
+        return False
+
+    output_filename = clip["output_filename"] or new_output_filename(clip["video_name"])
+    copy_temp_output(bucket, annotation["output_filename"], output_filename)
+    print(f"같은 내용의 영상을 이미 분석했습니다. 분석 결과를 다시 씁니다: {annotation['output_filename']}")
+
+    get_ledger().update_clip(clip, ANNOTATED, output_filename=output_filename)
+    get_rendezvous(registry).gcp_ready(clip["video_name"], output_filename)
+    return True
+
+# 움직임이 없는 영상은 분석을 요청하지 않고 빈 분석 결과를 올린 뒤, 평소처럼 AWS 결과와 병합해서 뷰어에 게시한다.
+# 내용이 같아도 필터 설정에 따라 결과가 달라지므로 분석 작업 기록(annotations)에는 남기지 않는다.
+def skip_annotation(registry, clip, report):
+    video_name = clip["video_name"]
+    output_filename = clip["output_filename"] or new_output_filename(video_name)
+    result = static_result(f"/{GCS_BUCKET}/{INPUT_PREFIX}{video_name}", report)
+    with get_metrics().timer("skip_upload", clip=video_name):
+        upload_json(registry.storage_client().bucket(GCS_BUCKET).blob(f"{TEMP_OUTPUT_PREFIX}{output_filename}"), result)
+    get_metrics().increment("clips_skipped_static")
+    print(f"움직임이 없는 영상이라 분석을 건너뜁니다: {video_name} (최대 움직임 점수 {report.peak:.4f})")
+
+    get_ledger().update_clip(clip, ANNOTATED, output_filename=output_filename)
+    get_rendezvous(registry).gcp_ready(video_name, output_filename)
+
+# 인증 만료나 연결 오류면 다음 요청부터 Video Intelligence 클라이언트를 새로 만든다.
+def refresh_clients_on_error(error):
+    if isinstance(error, (exceptions.Unauthenticated, exceptions.ServiceUnavailable)):
+        get_registry().invalidate("video")
+
+# 영상 분석 중 발생한 오류 안내
+def report_annotation_error(video_name, error, timeout=1800):
+    if isinstance(error, exceptions.NotFound):
         print(f"오류: '{video_name}' 파일을 '{GCS_BUCKET}/{INPUT_PREFIX}' 폴더에서 찾을 수 없습니다.")
         print("다음 사항을 확인해 주세요:")
         print("1. 파일 이름이 정확한지 확인하세요.")
         print(f"2. 해당 파일이 실제로 '{GCS_BUCKET}/{INPUT_PREFIX}' 폴더에 존재하는지 확인하세요.")
         print("3. 접근 권한이 올바르게 설정되어 있는지 확인하세요.")
-    except concurrent.futures.TimeoutError:
+    elif isinstance(error, concurrent.futures.TimeoutError):
         print(f"처리 시간이 {timeout/60:.0f}분을 초과했습니다.")
         print("더 긴 처리 시간이 필요하다면, 관리자에게 문의해 주세요.")
-    except exceptions.Forbidden as e:
+    elif isinstance(error, exceptions.Forbidden):
         print("오류: 이 리소스에 접근할 권한이 없습니다.")
         print("접근 권한 설정을 확인해 주세요. 필요하다면 관리자에게 문의하세요.")
-    except exceptions.GoogleAPICallError as e:
+    elif isinstance(error, exceptions.GoogleAPICallError):
         print("API 호출 중 오류가 발생했습니다.")
-        print(f"네트워크 연결을 확인하고, 문제가 지속되면 관리자에게 문의해 주세요. {e}")
-    except Exception as e:
+        print(f"네트워크 연결을 확인하고, 문제가 지속되면 관리자에게 문의해 주세요. {error}")
+    else:
         print("예상치 못한 오류가 발생했습니다:")
-        print(f"오류 메시지: {e}")
+        print(f"오류 메시지: {error}")
         print("이 오류가 계속되면 관리자에게 문의해 주세요.")
 
+# 긴 녹화 영상을 구간으로 나눠 동시에 분석하고, 끝난 구간부터 이어 붙여 뷰어에 중간 결과로 올린다.
+# 영상 길이를 알 수 없거나 구간 하나 분량이면 None을 돌려주고 기존 방식으로 처리하게 한다.
+# 구간과 구간별 operation은 처리 기록에 남기므로, 재시작하면 끝난 구간은 결과를 그대로 읽고
+# 진행 중이던 구간은 operation 이름으로 다시 찾아 기다린다 (유료 분석을 다시 요청하지 않는다).
+def process_video_chunked(video_name, registry, chunk_seconds=CHUNK_SECONDS, timeout=1800, video_client=None):
+    bucket = registry.storage_client().bucket(GCS_BUCKET)
+    clip = find_clip(video_name)
+    recorded = recorded_segments(clip)
+    if recorded:
+        output_filename = clip["output_filename"]
+        segments = [(row["start_seconds"], row["end_seconds"]) for row in recorded]
+        duration = segments[-1][1]
+        print(f"\n'{video_name}' 비디오의 구간 분석을 이어서 진행합니다.")
+    else:
+        duration = probe_duration(bucket.blob(f"{INPUT_PREFIX}{video_name}"))
+        if duration is None or duration <= chunk_seconds * 1.5:
+            return None
+        output_filename = clip["output_filename"] or new_output_filename(video_name)
+        segments = plan_segments(duration, chunk_seconds)
+        get_ledger().add_segments(output_filename, segments)
 
-# AWS, GCP의 파일명을 비교해서 가져온다.
-def get_files_with_timestamps(gcs_client, prefix):
-    bucket = gcs_client.bucket(GCS_BUCKET)
-    blobs = list(bucket.list_blobs(prefix=prefix))
-    files_with_timestamps = {}
-    
-    for blob in blobs:
-        match = re.search(r'(\d{8}_\d{6})', blob.name)
-        if match:
-            timestamp = match.group(1)
-            files_with_timestamps[timestamp] = blob.name
-    
-    return files_with_timestamps
+    video_client = video_client or registry.video_client()
+    get_ledger().update_clip(clip, SUBMITTED, output_filename=output_filename)
+    segment_prefix = f"{SEGMENT_OUTPUT_PREFIX}{os.path.splitext(output_filename)[0]}/"
 
-def merge_json_files(gcs_client, temp_filename):
-    aws_files = get_files_with_timestamps(gcs_client, AWS_OUTPUT_PREFIX)
-    
+    def submit_segment(index, start, end):
+        row = get_ledger().segment(output_filename, index)
+        if row["state"] == ANNOTATED and bucket.blob(row["output_name"]).exists():
+            return None, row["output_name"]
+        if row["state"] == SUBMITTED and row["operation_name"]:
+            try:
+                with get_metrics().timer("resume", clip=video_name):
+                    operation = resume_operation(video_client, row["operation_name"])
+                print(f"구간 {index + 1}/{len(segments)}의 진행 중인 분석을 이어서 기다립니다: {row['operation_name']}")
+                return operation, row["output_name"]
+            except exceptions.NotFound:
+                print(f"구간 {index + 1}/{len(segments)}의 operation을 찾지 못해 다시 요청합니다: {row['operation_name']}")
+
+        output_name = f"{segment_prefix}segment_{index:03d}.json"
+        with get_metrics().timer("submit", clip=video_name):
+            operation = video_client.annotate_video(
+                request=build_annotation_request(video_name, f"gs://{GCS_BUCKET}/{output_name}", [(start, end)])
+            )
+        get_ledger().update_segment(output_filename, index, SUBMITTED, operation_name=operation.operation.name,
+                                    output_name=output_name)
+        return operation, output_name
+
+    def read_segment(output_name):
+        return json.loads(bucket.blob(output_name).download_as_text())
+
+    def on_segment_done(index, output_name):
+        get_ledger().update_segment(output_filename, index, ANNOTATED)
+
+    def on_partial(result, finished, total):
+        publish_partial_result(bucket, output_filename, result)
+        print(f"중간 결과를 게시했습니다 ({finished}/{total} 구간)")
+
+    print(f"\n'{video_name}' 비디오({duration / 60:.1f}분)를 {len(segments)}개 구간으로 나눠 처리하고 있습니다...")
+    result = annotate_in_segments(segments, submit_segment, read_segment, on_partial, CHUNK_MAX_IN_FLIGHT, timeout,
+                                  on_segment_done=on_segment_done)
+
+    # 이어 붙인 결과를 기존 분석 결과와 같은 위치에 올리고 평소처럼 병합한다.
+    temp_blob = bucket.blob(f"{TEMP_OUTPUT_PREFIX}{output_filename}")
+    with get_metrics().timer("stitch_upload", clip=video_name):
+        upload_json(temp_blob, result)
+    print("\n처리가 완료되었습니다.")
+    print(f"결과가 다음 위치에 저장되었습니다: gs://{GCS_BUCKET}/{TEMP_OUTPUT_PREFIX}{output_filename}")
+
+    complete_annotation(registry, video_name, output_filename)
+    return result
+
+# 재시작 전에 구간으로 나눠 분석하던 영상이면 그 구간 기록 (없으면 빈 목록)
+def recorded_segments(clip):
+    if not clip or not clip["output_filename"]:
+        return []
+    return get_ledger().segments(clip["output_filename"])
+
+# 구간 분석 중간 결과를 중간 결과 폴더에 올리고 알림 서버로만 알린다 (AWS 결과는 아직 병합하지 않은 상태).
+# final_output.json과 server.js 병합 완료 알림은 구간을 모두 이어 붙여 병합한 뒤에만 바꾼다.
+def publish_partial_result(bucket, output_filename, result):
+    match = re.search(r'(\d{8}_\d{6})', output_filename)
+    name = match.group(1) if match else os.path.splitext(output_filename)[0]
+
+    partial_blob = bucket.blob(f"{PARTIAL_OUTPUT_PREFIX}partial_{name}.json")
+    upload_json(partial_blob, result, cache_control="no-cache")
+
+    clip = clip_of(output_filename)
+    view = {"json_url": f"{PUBLIC_URL}{partial_blob.name}", "video_url": None, "manifest_url": None,
+            "artifact_url": None, "binary": None, "duration_ms": None, "counts": None}
+    # 중간 결과용 아티팩트도 중간 결과 폴더에 만든다 (실패하면 뷰어가 JSON을 받는다).
+    try:
+        with get_metrics().timer("partial_artifact", clip=clip):
+            manifest_blob, manifest = publish_artifact(bucket, partial_blob, f"{name}_partial", PARTIAL_OUTPUT_PREFIX)
+        view.update(manifest_url=f"{PUBLIC_URL}{manifest_blob.name}", artifact_url=f"{PUBLIC_URL}{manifest_blob.name}",
+                    binary=manifest["binary"], duration_ms=manifest["duration_ms"], counts=manifest["counts"])
+    except Exception as e:
+        print(f"중간 결과 아티팩트 생성 실패: {e}")
+    push_result(dict(view, timestamp=name, clip=clip, partial=True))
+
+# 영상 변환
+# chunk_seconds를 넘기면 긴 영상은 그 길이의 구간으로 나눠 처리한다.
+# video_client를 넘기면 레지스트리의 클라이언트 대신 그것으로 분석을 요청한다 (가짜 분석기 등).
+def process_video(video_name, registry, timeout=1800, chunk_seconds=None, video_client=None):
+    try:
+        print("\n")
+        print("\n처리를 시작합니다. 비디오 크기에 따라 시간이 오래 걸릴 수 있습니다.")
+        print("\n")
+
+        # 구간으로 나눠 분석하던 영상은 chunk_seconds 없이 다시 시작해도 남은 구간을 이어서 분석한다.
+        if chunk_seconds or recorded_segments(get_ledger().clip(video_name)):
+            result = process_video_chunked(video_name, registry, chunk_seconds or CHUNK_SECONDS, timeout, video_client)
+            if result is not None:
+                return result
+        
+        video_client = video_client or registry.video_client()
+
+        operation, output_filename = start_annotation(video_name, video_client)
+        with get_metrics().timer("annotate", clip=video_name):
+            result = operation.result(timeout=timeout)
+        print("\n처리가 완료되었습니다.")
+        print(f"결과가 다음 위치에 저장되었습니다: gs://{GCS_BUCKET}/{TEMP_OUTPUT_PREFIX}{output_filename}")
+
+        complete_annotation(registry, video_name, output_filename)
+        
+        return result
+
+    except Exception as e:
+        refresh_clients_on_error(e)
+        mark_failed(video_name, e)
+        report_annotation_error(video_name, e, timeout)
+
+# 여러 영상을 동시에 분석하는 파이프라인 구성
+# video_client를 넘기면 레지스트리의 Video Intelligence 클라이언트 대신 그것으로 분석을 요청한다.
+def build_pipeline(registry, workers=PIPELINE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE,
+                   project_limit=PROJECT_MAX_IN_FLIGHT, timeout=1800, video_client=None):
+    project_id = registry.project_id()
+
+    def on_complete(video_name, output_filename, result):
+        print(f"\n'{video_name}' 처리가 완료되었습니다.")
+        print(f"결과가 다음 위치에 저장되었습니다: gs://{GCS_BUCKET}/{TEMP_OUTPUT_PREFIX}{output_filename}")
+        complete_annotation(registry, video_name, output_filename)
+
+    def on_error(video_name, error):
+        refresh_clients_on_error(error)
+        mark_failed(video_name, error)
+        report_annotation_error(video_name, error, timeout)
+
+    return AnnotationPipeline(
+        submit_fn=lambda video_name: start_annotation(video_name, video_client or registry.video_client()),
+        on_complete=on_complete,
+        on_error=on_error,
+        workers=workers,
+        queue_size=queue_size,
+        default_project_limit=project_limit,
+        default_project=project_id,
+        timeout=timeout)
+
+
+aws_index = None
+aws_index_lock = threading.Lock()
+
+# AWS 결과 파일 인덱스 (처음 한 번만 전체 목록을 읽고 이후에는 새 파일만 반영)
+def get_aws_index():
+    global aws_index
+    with aws_index_lock:
+        if aws_index is None:
+            aws_index = TimestampIndex(AWS_INDEX_PATH)
+        return aws_index
+
+# 타임스탬프에 해당하는 AWS 결과 파일 찾기 (인덱스에 없으면 새로 올라온 파일을 반영한 뒤 한 번 더 찾는다)
+def find_aws_file(registry, timestamp):
+    index = get_aws_index()
+    aws_file = index.nearest(timestamp, AWS_MATCH_TOLERANCE)
+    if aws_file is None:
+        index.update(registry.storage_client().bucket(GCS_BUCKET), AWS_OUTPUT_PREFIX)
+        aws_file = index.nearest(timestamp, AWS_MATCH_TOLERANCE)
+    return aws_file
+
+# AWS 분석 요청
+def request_moderation(video_name):
+    api_data = {
+        "bucketName": GCS_BUCKET,
+        "objectKey": video_name
+    }
+    try:
+        with get_metrics().timer("moderation_request", clip=video_name):
+            response = get_registry().http_session().post(MODERATION_API_URL, json=api_data)
+            response.raise_for_status()
+        print(f"API 호출 성공: {response.status_code}")
+        return True
+    except requests.exceptions.RequestException as e:
+        print(f"API 호출 실패: {e}")
+        return False
+
+rendezvous = None
+rendezvous_lock = threading.Lock()
+
+def refresh_aws_index(bucket):
+    with get_metrics().timer("list_aws"):
+        return get_aws_index().update(bucket, AWS_OUTPUT_PREFIX)
+
+# AWS/구글 결과 대기 단계 (둘 다 준비되는 즉시 병합한다)
+def get_rendezvous(registry):
+    global rendezvous
+    with rendezvous_lock:
+        if rendezvous is None:
+            def on_expired(video_name, output_filename):
+                # 처리 기록에는 분석 완료(annotated)나 병합(merged)으로 남아 있으므로 다음 실행 때 이어서 처리한다.
+                print(f"AWS 결과를 찾지 못했거나 병합에 계속 실패해 병합을 미룹니다: {video_name} ({output_filename})")
+
+            rendezvous = ResultRendezvous(
+                request_aws_fn=request_moderation,
+                refresh_fn=lambda: refresh_aws_index(registry.storage_client().bucket(GCS_BUCKET)),
+                lookup_fn=lambda timestamp: get_aws_index().nearest(timestamp, AWS_MATCH_TOLERANCE),
+                on_ready=lambda video_name, output_filename, aws_file: merge_json_files(registry, output_filename, aws_file),
+                on_expired=on_expired).start()
+        return rendezvous
+
+# aws_file을 넘기면 (결과 대기 단계에서 이미 찾은 경우) 다시 찾지 않는다.
+def merge_json_files(registry, temp_filename, aws_file=None):
     match = re.search(r'(\d{8}_\d{6})', temp_filename)
     if not match:
         print(f"타임스탬프를 찾을 수 없습니다: {temp_filename}")
         return
     
     timestamp = match.group(1)
-    aws_file = aws_files.get(timestamp)
+    clip = clip_of(temp_filename)
+    metrics = get_metrics()
+    if not aws_file:
+        with metrics.timer("find_aws", clip=clip):
+            aws_file = find_aws_file(registry, timestamp)
     if not aws_file:
         print(f"해당 타임스탬프와 매칭되는 AWS 파일이 없습니다: {timestamp}")
         return
     
     print(f"매칭되는 파일 발견: \nAWS: {aws_file}\nTemp: {temp_filename}")
     
-    bucket = gcs_client.bucket(GCS_BUCKET)
+    bucket = registry.storage_client().bucket(GCS_BUCKET)
     
     merged_filename = f"merged_{timestamp}.json"
     merged_blob = bucket.blob(f"{FINAL_OUTPUT_PREFIX}{merged_filename}")
     if merged_blob.exists():
+        clip_row = get_ledger().clip_by_output(temp_filename)
+        if clip_row and clip_row["state"] == MERGED:
+            # 병합은 끝났지만 게시하다 실패했으면 (병합을 다시 시도하는 경우) 게시만 이어서 한다.
+            print(f"병합된 파일을 이어서 게시합니다: {merged_filename}")
+            publish_merged_result(bucket, merged_blob, timestamp, temp_filename)
+            return
         print(f"이미 병합된 파일이 존재합니다: {merged_filename}")
+        mark_clip(temp_filename, PUBLISHED, merged_name=merged_blob.name)
         return
     
     # AWS JSON 파일 읽기
     aws_blob = bucket.blob(aws_file)
-    aws_data = json.loads(aws_blob.download_as_text())
+    with metrics.timer("aws_download", clip=clip) as span:
+        aws_text = aws_blob.download_as_text()
+        span.bytes = len(aws_text)
+    aws_data = json.loads(aws_text)
     
-    # Temp JSON 파일 읽기
+    # Temp JSON 파일을 스트림으로 읽으면서 AWS 데이터를 끼워 넣고, 병합 결과도 바로 스트림으로 업로드한다.
+    # (annotation_results가 없거나 비어있는 경우 새로 생성하는 것까지 기존 병합과 같은 JSON을 만든다)
+    # 병합 결과는 Content-Encoding을 붙여 압축해서 올리고, Cache-Control도 업로드 때 같이 기록한다.
     temp_blob = bucket.blob(f"{TEMP_OUTPUT_PREFIX}{temp_filename}")
-    temp_data = json.loads(temp_blob.download_as_text())
-    
-    # JSON 병합
-    if 'annotation_results' in temp_data and len(temp_data['annotation_results']) > 0:
-        # GCP 데이터의 첫 번째 annotation_result에 AWS 데이터 추가
-        temp_data['annotation_results'][0]['explicit_annotation'] = aws_data.get('explicit_annotation', {})
-    else:
-        # annotation_results가 없거나 비어있는 경우 새로 생성
-        temp_data['annotation_results'] = [{
-            'face_detection_annotations': [],
-            'explicit_annotation': aws_data.get('explicit_annotation', {}),
-            'object_annotations': []
-        }]
-    
-    # 병합된 JSON 저장
-    merged_blob.upload_from_string(json.dumps(temp_data))
-    merged_blob.cache_control = "no-cache"
-    merged_blob.patch()
+    # 다운로드, 병합, 압축, 업로드가 한 스트림으로 겹쳐 있으므로 한 단계로 잰다.
+    with metrics.timer("merge_stream", clip=clip) as span:
+        with open_blob_reader(temp_blob, STREAM_CHUNK_SIZE) as source, \
+                open_blob_writer(merged_blob, cache_control="no-cache", chunk_size=STREAM_CHUNK_SIZE) as sink:
+            span.bytes = stream_merge(source, sink, aws_data.get('explicit_annotation', {}))
+    mark_clip(temp_filename, MERGED, merged_name=merged_blob.name)
 
-    final_filename = "final_output.json"
-    final_output_blob = bucket.blob(f"{VIEW_FINAL_OUTPUT_PREFIX}{final_filename}")
+    publish_merged_result(bucket, merged_blob, timestamp, temp_filename)
 
-    
-    # 새로운 final_output.json 업로드
-    final_output_blob.upload_from_string(json.dumps(temp_data))
-    final_output_blob.cache_control = "no-cache"
-    final_output_blob.patch()
+# 병합 결과를 뷰어에 게시하고 알린다.
+def publish_merged_result(bucket, merged_blob, timestamp, temp_filename):
+    clip = clip_of(temp_filename)
+    view = publish_view_output(bucket, merged_blob, timestamp, clip)
 
     # 콜백 함수
-    notify_merge_complete()
+    with get_metrics().timer("notify", clip=clip):
+        notify_merge_complete(dict(view, timestamp=timestamp, clip=clip, partial=False))
+    append_timeline(bucket, merged_blob, timestamp, clip, view)
+    mark_clip(temp_filename, PUBLISHED)
 
-    print(f"병합된 JSON 파일 저장 완료: gs://{GCS_BUCKET}/{FINAL_OUTPUT_PREFIX}{merged_filename}")
-    print(f"복사된 최종 JSON 파일 저장 완료: gs://{GCS_BUCKET}/{VIEW_FINAL_OUTPUT_PREFIX}{final_filename}")
+    print(f"병합된 JSON 파일 저장 완료: gs://{GCS_BUCKET}/{merged_blob.name}")
+    print(f"복사된 최종 JSON 파일 저장 완료: gs://{GCS_BUCKET}/{view['json_path']}")
 
-# 최신 영상 가져오기
-def get_latest_video(gcs_client):
-    bucket = gcs_client.bucket(GCS_BUCKET)
-    blobs = list(bucket.list_blobs(prefix=INPUT_PREFIX))
-    video_files = [blob for blob in blobs if blob.name.lower().endswith('.mp4')]
-    
-    if not video_files:
-        return None
-    
-    latest_file = max(video_files, key=lambda x: x.time_created)
-    return latest_file.name.split('/')[-1]
+# 시간별 타임라인에 병합 결과를 기록한다 (실패해도 게시는 끝난 것으로 본다).
+def append_timeline(bucket, merged_blob, timestamp, clip, view):
+    try:
+        with get_metrics().timer("timeline", clip=clip):
+            if merged_blob.generation is None:
+                merged_blob.reload()
+            shard, _ = append_entry(bucket, timeline_entry(timestamp, clip, merged_blob, view))
+        print(f"타임라인 기록 완료: gs://{GCS_BUCKET}/{shard}")
+    except Exception as e:
+        print(f"타임라인 기록 실패: {e}")
+
+# 웹에서 보여질 final_output.json과 뷰어용 아티팩트를 source_blob 내용으로 바꾼다.
+# 뷰어에 알릴 주소와 요약 {json_url, manifest_url, artifact_url, binary, video_url, duration_ms, counts, ...}을 돌려준다
+# (아티팩트가 없으면 아티팩트 관련 값은 None).
+def publish_view_output(bucket, source_blob, artifact_name, clip=None):
+    final_filename = "final_output.json"
+    metrics = get_metrics()
+
+    # 새로운 final_output.json은 다시 업로드하지 않고 버킷 안에서 복사 (Content-Encoding도 그대로 복사된다)
+    with metrics.timer("copy_final", clip=clip):
+        final_output_blob = bucket.copy_blob(source_blob, bucket, f"{VIEW_FINAL_OUTPUT_PREFIX}{final_filename}")
+        final_output_blob.cache_control = "no-cache"
+        final_output_blob.patch()
+
+    view = {
+        "json_path": final_output_blob.name,
+        "json_url": f"{PUBLIC_URL}{final_output_blob.name}",
+        "video_url": f"{PUBLIC_URL}{VIEW_FINAL_OUTPUT_PREFIX}final_output.mp4",
+        "manifest_url": None,
+        "artifact_url": None,
+        "artifact_path": None,
+        "artifact_bytes": None,
+        "binary": None,
+        "duration_ms": None,
+        "counts": None,
+    }
+
+    # 뷰어용 바이너리 아티팩트 생성 (실패해도 병합 결과는 그대로 쓸 수 있다)
+    try:
+        with metrics.timer("artifact", clip=clip):
+            manifest_blob, manifest = publish_artifact(bucket, source_blob, artifact_name)
+            view_blob = publish_view_manifest(bucket, manifest_blob, manifest, VIEW_FINAL_OUTPUT_PREFIX)
+        print(f"뷰어용 아티팩트 저장 완료: gs://{GCS_BUCKET}/{manifest_blob.name}")
+        view.update(manifest_url=f"{PUBLIC_URL}{view_blob.name}", artifact_url=f"{PUBLIC_URL}{manifest_blob.name}",
+                    artifact_path=manifest_blob.name, artifact_bytes=manifest["byte_length"],
+                    binary=manifest["binary"], duration_ms=manifest["duration_ms"], counts=manifest["counts"])
+    except Exception as e:
+        print(f"뷰어용 아티팩트 생성 실패: {e}")
+
+    return view
 
 # 새로운 영상을 5초 마다 감지
-def process_new_videos(gcs_client):
-    processed_videos = set()
-    
+# pipeline을 넘기면 영상을 기다리지 않고 대기열에 넣는다.
+# motion_filter를 넘기면 분석 요청 전에 움직임이 없는 영상을 걸러낸다.
+def process_new_videos(registry, pipeline=None, chunk_seconds=None, motion_filter=None):
+    watcher = BucketWatcher(registry.storage_client().bucket(GCS_BUCKET), INPUT_PREFIX, WATCHER_CURSOR_PATH,
+                            suffixes=('.mp4',))
+    join = get_rendezvous(registry)
+    failures = {} # 영상 이름 -> 처리 실패 횟수
+
     while True:
-        latest_video = get_latest_video(gcs_client)
-        print(f'==> 최신 영상 : {latest_video}')
-        api_url = "http://localhost:5555/api/v1/moderation/create"
-
-        if latest_video and latest_video not in processed_videos:
-            print(f"새로운 영상 파일 감지: {latest_video}")
-
-            # API 호출
-            api_data = {
-                "bucketName": GCS_BUCKET,
-                "objectKey": latest_video
-            }
+        # 레지스트리가 오래된 클라이언트를 새로 만들 수 있도록 조회할 때마다 버킷을 다시 가져온다.
+        watcher.bucket = registry.storage_client().bucket(GCS_BUCKET)
+        # 커서 이후에 올라온 영상을 올라온 순서대로 모두 처리한다.
+        # 처리한 뒤에 커서를 전진시키므로 처리 도중 죽으면 그 영상부터 다시 받는다.
+        # 조회나 영상 하나의 처리가 실패해도 감시는 멈추지 않는다.
+        try:
+            with get_metrics().timer("list"):
+                new_blobs = watcher.list_new_blobs()
+        except Exception as e:
+            print(f"새 영상 목록 조회 실패, 다음 확인 때 다시 시도합니다: {e}")
+            new_blobs = []
+        for blob in new_blobs:
             try:
-                response = requests.post(api_url, json=api_data)
-                response.raise_for_status()
-                print(f"API 호출 성공: {response.status_code}")
-            except requests.exceptions.RequestException as e:
-                print(f"API 호출 실패: {e}")
-
+                handle_new_video(registry, join, blob, pipeline, chunk_seconds, motion_filter)
+            except Exception as e:
+                attempts = failures.get(blob.name, 0) + 1
+                failures[blob.name] = attempts
+                if isinstance(e, TRANSIENT_ERRORS) and attempts < WATCH_MAX_ATTEMPTS:
+                    # 커서를 그대로 두고 다음 확인 때 이 영상부터 다시 처리한다 (뒤의 영상은 이름순을 지키려고 같이 미룬다).
+                    print(f"새 영상 처리 실패 ({attempts}/{WATCH_MAX_ATTEMPTS}), 다음 확인 때 다시 시도합니다: {blob.name} ({e})")
+                    break
+                # 계속 실패하는 영상 때문에 뒤의 영상이 멈추지 않도록 실패로 기록하고 넘어간다.
+                print(f"새 영상 처리를 포기합니다 ({attempts}회 실패): {blob.name} ({e})")
+                give_up_video(blob, e)
+            failures.pop(blob.name, None)
+            watcher.advance(blob)
 
-            output_filename = process_video(latest_video, gcs_client)
-            if output_filename:
-                # merge_json_files(gcs_client)
-                processed_videos.add(latest_video)
-        
         time.sleep(5)  # 5초마다 새 비디오 확인
 
+# 처리하지 못한 새 영상을 실패로 기록한다 (감지 기록 전에 실패했으면 감지 기록부터 남긴다).
+def give_up_video(blob, error):
+    video_name = blob.name.split('/')[-1]
+    try:
+        if get_ledger().clip(video_name, blob.generation) is None:
+            get_ledger().detect(video_name, blob.generation or 0, f"unreadable:{blob.name}:{blob.generation}")
+        mark_failed(video_name, error)
+        get_metrics().increment("clips_failed_watch")
+    except Exception as e:
+        print(f"실패 기록도 남기지 못했습니다: {video_name} ({e})")
+
+def handle_new_video(registry, join, blob, pipeline=None, chunk_seconds=None, motion_filter=None):
+    new_video = blob.name.split('/')[-1]
+    clip = record_detected(blob)
+    if clip["state"] != DETECTED:
+        # 재시작 직전에 감지했던 영상 (이미 처리했거나 resume_pending에서 이어서 처리 중)
+        print(f"이미 처리 기록이 있는 영상입니다: {new_video} ({clip['state']})")
+        return
+    print(f"새로운 영상 파일 감지: {new_video}")
+    get_metrics().increment("clips_detected")
+
+    # AWS 분석 요청은 기다리지 않고 보내고, 구글 분석을 바로 시작한다.
+    join.expect(new_video)
+
+    dispatch_video(registry, clip, pipeline, chunk_seconds, motion_filter)
+
+# 같은 내용의 분석 결과가 있으면 그대로 쓰고, 없으면 대기열에 넣거나 바로 분석한다.
+# motion_filter를 넘기면 먼저 움직임을 확인한다. 파이프라인 모드에서는 확인을 기다리지 않고 돌아간다.
+def dispatch_video(registry, clip, pipeline=None, chunk_seconds=None, motion_filter=None):
+    if reuse_annotation(registry, clip):
+        return
+
+    # 이미 분석을 요청한 영상은 다시 확인하지 않고 그 operation을 기다린다.
+    if motion_filter and clip["state"] != SUBMITTED:
+        blob_fn = lambda: registry.storage_client().bucket(GCS_BUCKET).blob(f"{INPUT_PREFIX}{clip['video_name']}")
+        if pipeline:
+            motion_filter.submit(blob_fn, lambda report: annotate_active(registry, clip, report, pipeline))
+        else:
+            annotate_active(registry, clip, motion_filter.check(blob_fn()), chunk_seconds=chunk_seconds)
+        return
+
+    queue_annotation(registry, clip, pipeline, chunk_seconds)
+
+# 움직임 확인 결과에 따라 분석을 건너뛰거나, 활성 구간만 분석하거나, 전체를 분석한다 (report가 None이면 전체).
+# 구간으로 나눠 분석하는 긴 영상(chunk_seconds)은 건너뛰기만 적용하고 구간은 자르지 않는다.
+def annotate_active(registry, clip, report, pipeline=None, chunk_seconds=None):
+    if report is not None and report.static:
+        skip_annotation(registry, clip, report)
+        return
+    if report is not None and report.trim:
+        with motion_segments_lock:
+            motion_segments[clip["video_name"]] = report.trim
+        get_metrics().increment("clips_trimmed")
+        print(f"움직임이 있는 구간만 분석합니다: {clip['video_name']} "
+              f"({report.active_seconds:.0f}/{report.duration:.0f}초, {len(report.trim)}개 구간)")
+    queue_annotation(registry, clip, pipeline, chunk_seconds)
+
+def queue_annotation(registry, clip, pipeline=None, chunk_seconds=None):
+    get_ledger().update_clip(clip, QUEUED)
+    # 구간으로 나눠 분석하던 영상은 파이프라인 모드에서도 구간 기록대로 이어서 처리한다 (통째로 다시 요청하지 않는다).
+    if pipeline and not recorded_segments(clip):
+        pipeline.submit(clip["video_name"])
+        return
+
+    output_filename = process_video(clip["video_name"], registry, chunk_seconds=chunk_seconds)
+    if not output_filename:
+        print(f"영상 처리에 실패했습니다: {clip['video_name']}")
+
+# 재시작 전에 끝내지 못한 영상을 이어서 처리한다.
+# 분석 중이던 영상은 start_annotation이 기록된 operation 이름으로 다시 찾아 기다린다.
+def resume_pending(registry, pipeline=None, chunk_seconds=None, motion_filter=None):
+    bucket = registry.storage_client().bucket(GCS_BUCKET)
+    for clip in get_ledger().pending():
+        print(f"이전에 끝내지 못한 영상을 이어서 처리합니다: {clip['video_name']} ({clip['state']})")
+        try:
+            if clip["state"] == MERGED:
+                match = re.search(r'(\d{8}_\d{6})', clip["merged_name"])
+                publish_merged_result(bucket, bucket.blob(clip["merged_name"]), match.group(1), clip["output_filename"])
+            elif clip["state"] == ANNOTATED:
+                get_rendezvous(registry).gcp_ready(clip["video_name"], clip["output_filename"])
+            else:
+                if clip["state"] == DETECTED:
+                    # 감지만 하고 멈췄으면 AWS 분석 요청도 아직 보내지 않은 상태다.
+                    get_rendezvous(registry).expect(clip["video_name"])
+                dispatch_video(registry, clip, pipeline, chunk_seconds, motion_filter)
+        except Exception as e:
+            print(f"이어서 처리하지 못했습니다: {clip['video_name']} ({e})")
+
+push_server = None # 뷰어 알림 서버 (--push-port로 켠다)
+
 # JSON 병합 성공했을 때 server.js에 트리거 역할 함수
-def notify_merge_complete():
+# 알림 서버가 켜져 있으면 연결된 뷰어에 새 결과의 주소를 바로 보낸다.
+# server.js가 final_output.mp4를 바꾼 뒤에 뷰어가 받아 가도록 server.js 알림이 끝난 다음에 보낸다.
+def notify_merge_complete(view=None):
     try:
-        response = requests.get('http://localhost:8080/merge-complete')
+        response = get_registry().http_session().get(MERGE_COMPLETE_URL, timeout=NOTIFY_TIMEOUT)
         if response.status_code == 200:
             print("Merge completion notified successfully.")
         else:
@@ -244,10 +779,85 @@ def notify_merge_complete():
     except Exception as e:
         print(f"Error notifying merge completion: {e}")
 
+    if view:
+        push_result(view)
+
+# 알림 서버가 켜져 있으면 연결된 뷰어에 결과 주소를 보낸다.
+def push_result(view):
+    if push_server:
+        # 뷰어에는 버킷 안 경로를 빼고 주소만 보낸다.
+        notification = {key: value for key, value in view.items() if not key.endswith("_path")}
+        notification["published_at"] = round(time.time(), 3)
+        push_server.publish("result", notification)
+
 if __name__ == "__main__":
-    gcs_client = storage.Client.from_service_account_json("/Users/highbuff/Downloads/gold-braid-428103-s3-1806cc6a21a0.json")
+    parser = argparse.ArgumentParser(description="Highbuff 영상 분석 자동 처리")
+    parser.add_argument("--pipeline", action="store_true", help="여러 영상을 동시에 분석하는 파이프라인 모드")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE)
+    parser.add_argument("--project-limit", type=int, default=PROJECT_MAX_IN_FLIGHT)
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="단계별 측정값 조회 포트 (0이면 끈다)")
+    parser.add_argument("--push-port", type=int, default=PUSH_PORT, help="뷰어에 새 결과를 알리는 SSE 포트 (0이면 끈다)")
+    parser.add_argument("--push-host", default=PUSH_HOST, help="뷰어 알림 서버 주소 (다른 PC의 뷰어도 받으려면 0.0.0.0)")
+    parser.add_argument("--trace", help="단계별 측정을 한 줄씩 남길 JSONL 파일 (python metrics.py summary로 요약)")
+    parser.add_argument("--chunk-seconds", type=float, default=None,
+                        help=f"긴 영상을 이 길이(초)의 구간으로 나눠 동시에 분석 (예: {CHUNK_SECONDS})")
+    parser.add_argument("--motion-filter", action="store_true",
+                        help="분석 요청 전에 움직임을 확인해서 정지 영상은 건너뛰고 움직인 구간만 분석 (ffmpeg 필요)")
+    parser.add_argument("--motion-workers", type=int, default=MOTION_WORKERS, help="움직임 확인 디코딩 프로세스 수")
+    parser.add_argument("--motion-keyframes-only", action="store_true",
+                        help="움직임 확인에서 키프레임만 디코딩 (빠르지만 키프레임 사이의 짧은 움직임을 놓칠 수 있다)")
+    add_backend_arguments(parser)
+    parser.add_argument("--moderation-latency", type=float, default=MODERATION_LATENCY,
+                        help="로컬 백엔드: 가짜 AWS 분석 결과가 올라오기까지 걸리는 시간 (초)")
+    parser.add_argument("--no-stubs", action="store_true",
+                        help="로컬 백엔드: AWS 분석 요청/병합 완료 알림 가짜 서비스를 띄우지 않는다 (직접 띄운 서비스를 쓸 때)")
+    args = parser.parse_args()
+    if args.pipeline and args.chunk_seconds:
+        parser.error("--chunk-seconds는 --pipeline 없이 영상을 하나씩 처리할 때만 쓸 수 있습니다.")
+
+    # 디코딩 프로세스 풀은 다른 스레드를 띄우기 전에 만든다.
+    motion_filter = MotionFilter(args.motion_workers, keyframes_only=args.motion_keyframes_only) if args.motion_filter else None
+
+    if args.metrics_port:
+        get_metrics().serve(args.metrics_port)
+    if args.trace:
+        get_metrics().open_trace(args.trace)
+    if args.push_port:
+        push_server = PushServer(args.push_host, args.push_port).start()
+
+    stubs = None
+    local_registry = install_backend(args)
+    if local_registry:
+        use_state_dir(os.path.join(args.local_root, STATE_DIR))
+        if not args.no_stubs:
+            stubs = StubServices(local_registry.storage, GCS_BUCKET, AWS_OUTPUT_PREFIX, url_port(MODERATION_API_URL),
+                                 url_port(MERGE_COMPLETE_URL), args.moderation_latency).start()
+
+    registry = get_registry()
+
+    pipeline = None
+    if args.pipeline:
+        pipeline = build_pipeline(registry, args.workers, args.queue_size, args.project_limit).start()
 
     try:
-        process_new_videos(gcs_client)
+        resume_pending(registry, pipeline, args.chunk_seconds, motion_filter)
+        process_new_videos(registry, pipeline, args.chunk_seconds, motion_filter)
     except KeyboardInterrupt:
-        print("\n프로그램을 종료합니다.")
\ No newline at end of file
+        print("\n프로그램을 종료합니다.")
+        if motion_filter:
+            motion_filter.stop(wait=False)
+        if push_server:
+            print(f"뷰어 알림: {push_server.stats()}")
+            push_server.stop()
+        if pipeline:
+            pipeline.stop(wait=False)
+        if stubs:
+            print(f"가짜 분석기: {local_registry.video.stats()}, 가짜 서비스: {stubs.stats()}")
+            stubs.stop()
+        registry.report()
+        print(f"처리 기록: {get_ledger().counts()}")
+        print(f"결과 대기: {get_rendezvous(registry).stats()}")
+        for stage, summary in get_metrics().snapshot()["seconds"].items():
+            print(f"{stage}: {summary['count']}회, p50 {summary['p50']:.3f}초, p95 {summary['p95']:.3f}초")
+        get_metrics().close()
\ No newline at end of file
@@ -1,12 +1,17 @@
 import os
 import time
 import json
+import argparse
 import concurrent.futures
 from google.cloud import videointelligence
 from google.api_core import exceptions
-from google.cloud import storage
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from annotation_pipeline import AnnotationPipeline
+from clients import get_registry
+from compressed_json import upload_json
+from ingest_scheduler import IngestScheduler, INGEST_WORKERS, SETTLE_SECONDS
+from local_backends import add_backend_arguments, install_backend
 
 # 전역 변수로 버킷 정보 설정
 GCS_BUCKET = "gs://highbuff_developer_seoul/"
@@ -15,77 +20,123 @@ OUTPUT_PREFIX = "stream-video/" # 테스트 폴더의 경로
 AWS_OUTPUT_PREFIX = "visualize-aws-output/" # AWS에 업로드된 JSON파일 (explicit_annotation)의 경로
 FINAL_OUTPUT_PREFIX = "visualize-final-output-files/" # 최종 JSON파일의 경로
 
-def process_video(video_name, gcs_client, timeout=1800):
-    print("==> process_video")
+# 파이프라인 모드 설정
+PIPELINE_WORKERS = 4 # 분석 요청을 보내는 작업자 수
+PIPELINE_QUEUE_SIZE = 32 # 대기열 크기
+PROJECT_MAX_IN_FLIGHT = 8 # 프로젝트당 동시에 진행할 수 있는 분석 작업 수
+
+# 영상 분석 요청 (operation을 돌려주기만 하고 결과를 기다리지 않는다)
+def submit_annotation(video_name, video_client):
     gcs_uri = GCS_BUCKET + INPUT_PREFIX + video_name
     output_filename = f"output-{os.path.splitext(video_name)[0]}.json"
     output_uri = GCS_BUCKET + AWS_OUTPUT_PREFIX + output_filename
 
-    try:
-        print("\n영상 분석 처리를 시작합니다. 비디오 크기에 따라 시간이 오래 걸릴 수 있습니다.")
-
-        video_client = videointelligence.VideoIntelligenceServiceClient.from_service_account_file(
-            "/Users/highbuff/Downloads/gold-braid-428103-s3-1806cc6a21a0.json")
-
-        features = [
-            videointelligence.Feature.FACE_DETECTION,
-            videointelligence.Feature.OBJECT_TRACKING
-        ]
-
-        transcript_config = videointelligence.SpeechTranscriptionConfig(
-            language_code="en-US", enable_automatic_punctuation=True
-        )
-
-        person_config = videointelligence.PersonDetectionConfig(
-            include_bounding_boxes=True,
-            include_attributes=False,
-            include_pose_landmarks=True,
-        )
-
-        face_config = videointelligence.FaceDetectionConfig(
-            include_bounding_boxes=True, include_attributes=True
-        )
-
-        video_context = videointelligence.VideoContext(
-            speech_transcription_config=transcript_config,
-            person_detection_config=person_config,
-            face_detection_config=face_config)
-
-        operation = video_client.annotate_video(
-            request={"features": features,
-                     "input_uri": gcs_uri,
-                     "output_uri": output_uri,
-                     "video_context": video_context}
-        )
-
-        print(f"\n'{video_name}' 비디오를 처리하고 있습니다...")
-        result = operation.result(timeout=timeout)
-        print("\n구글 클라우드 분석이 완료됐습니다. 구글 분석 JSON 파일이 만들어졌습니다.")
-        print(f"결과가 다음 위치에 저장됐습니다. : {output_uri}")
-        return result
-
-    except exceptions.NotFound as e:
+    features = [
+        videointelligence.Feature.FACE_DETECTION,
+        videointelligence.Feature.OBJECT_TRACKING
+    ]
+
+    transcript_config = videointelligence.SpeechTranscriptionConfig(
+        language_code="en-US", enable_automatic_punctuation=True
+    )
+
+    person_config = videointelligence.PersonDetectionConfig(
+        include_bounding_boxes=True,
+        include_attributes=False,
+        include_pose_landmarks=True,
+    )
+
+    face_config = videointelligence.FaceDetectionConfig(
+        include_bounding_boxes=True, include_attributes=True
+    )
+
+    video_context = videointelligence.VideoContext(
+        speech_transcription_config=transcript_config,
+        person_detection_config=person_config,
+        face_detection_config=face_config)
+
+    operation = video_client.annotate_video(
+        request={"features": features,
+                 "input_uri": gcs_uri,
+                 "output_uri": output_uri,
+                 "video_context": video_context}
+    )
+
+    print(f"\n'{video_name}' 비디오를 처리하고 있습니다...")
+    return operation, output_uri
+
+# 인증 만료나 연결 오류면 다음 요청부터 Video Intelligence 클라이언트를 새로 만든다.
+def refresh_clients_on_error(error):
+    if isinstance(error, (exceptions.Unauthenticated, exceptions.ServiceUnavailable)):
+        get_registry().invalidate("video")
+
+# 영상 분석 중 발생한 오류 안내
+def report_annotation_error(video_name, error, timeout=1800):
+    if isinstance(error, exceptions.NotFound):
         print(f"오류: '{video_name}' 파일을 '{GCS_BUCKET}{INPUT_PREFIX}' 폴더에서 찾을 수 없습니다.")
         print("다음 사항을 확인해 주세요:")
         print("1. 파일 이름이 정확한지 확인하세요.")
         print(f"2. 해당 파일이 실제로 '{GCS_BUCKET}{INPUT_PREFIX}' 폴더에 존재하는지 확인하세요.")
         print("3. 접근 권한이 올바르게 설정되어 있는지 확인하세요.")
-    except concurrent.futures.TimeoutError:
+    elif isinstance(error, concurrent.futures.TimeoutError):
         print(f"처리 시간이 {timeout/60:.0f}분을 초과했습니다.")
         print("더 긴 처리 시간이 필요하다면, 관리자에게 문의해 주세요.")
-    except exceptions.Forbidden as e:
+    elif isinstance(error, exceptions.Forbidden):
         print("오류: 이 리소스에 접근할 권한이 없습니다.")
         print("접근 권한 설정을 확인해 주세요. 필요하다면 관리자에게 문의하세요.")
-    except exceptions.GoogleAPICallError as e:
+    elif isinstance(error, exceptions.GoogleAPICallError):
         print("API 호출 중 오류가 발생했습니다.")
         print("네트워크 연결을 확인하고, 문제가 지속되면 관리자에게 문의해 주세요.")
-    except Exception as e:
+    else:
         print("예상치 못한 오류가 발생했습니다:")
-        print(f"오류 메시지: {e}")
+        print(f"오류 메시지: {error}")
         print("이 오류가 계속되면 관리자에게 문의해 주세요.")
 
-# JSON 병합
-def merge_json_files(video_name, gcs_client):
+# video_client를 넘기면 레지스트리의 클라이언트 대신 그것으로 분석을 요청한다 (가짜 분석기 등).
+def process_video(video_name, registry, timeout=1800, video_client=None):
+    print("==> process_video")
+
+    try:
+        print("\n영상 분석 처리를 시작합니다. 비디오 크기에 따라 시간이 오래 걸릴 수 있습니다.")
+
+        video_client = video_client or registry.video_client()
+
+        operation, output_uri = submit_annotation(video_name, video_client)
+        result = operation.result(timeout=timeout)
+        print("\n구글 클라우드 분석이 완료됐습니다. 구글 분석 JSON 파일이 만들어졌습니다.")
+        print(f"결과가 다음 위치에 저장됐습니다. : {output_uri}")
+        return result
+
+    except Exception as e:
+        refresh_clients_on_error(e)
+        report_annotation_error(video_name, e, timeout)
+
+# 여러 영상을 동시에 분석하는 파이프라인 구성
+def build_pipeline(registry, workers=PIPELINE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE,
+                   project_limit=PROJECT_MAX_IN_FLIGHT, timeout=1800, video_client=None):
+    project_id = registry.project_id()
+
+    def on_complete(video_name, output_uri, result):
+        print("\n구글 클라우드 분석이 완료됐습니다. 구글 분석 JSON 파일이 만들어졌습니다.")
+        print(f"결과가 다음 위치에 저장됐습니다. : {output_uri}")
+        merge_json_files(video_name, registry)
+
+    def on_error(video_name, error):
+        refresh_clients_on_error(error)
+        report_annotation_error(video_name, error, timeout)
+
+    return AnnotationPipeline(
+        submit_fn=lambda video_name: submit_annotation(video_name, video_client or registry.video_client()),
+        on_complete=on_complete,
+        on_error=on_error,
+        workers=workers,
+        queue_size=queue_size,
+        default_project_limit=project_limit,
+        default_project=project_id,
+        timeout=timeout)
+
+# JSON 병합 (부른 스레드의 Storage 클라이언트를 쓴다)
+def merge_json_files(video_name, registry):
     print("==> merge_json_files")
     aws_output_filename = f"moderation_result.json"
     # input_json_path = os.path.join(AWS_OUTPUT_PREFIX, aws_output_filename)
@@ -95,7 +146,7 @@ def merge_json_files(video_name, gcs_client):
 
     try:
         # Load AWS output JSON
-        aws_output_blob = gcs_client.bucket(GCS_BUCKET.strip("gs://")).blob(aws_json_path)
+        aws_output_blob = registry.storage_client().bucket(GCS_BUCKET.strip("gs://")).blob(aws_json_path)
         aws_output_data = json.loads(aws_output_blob.download_as_text())
 
          # Create merged JSON
@@ -120,8 +171,8 @@ def merge_json_files(video_name, gcs_client):
         # final_output_blob.upload_from_string(json.dumps(input_data))
 
          # Save merged JSON to final output
-        final_output_blob = gcs_client.bucket(GCS_BUCKET).blob(final_output_path)
-        final_output_blob.upload_from_string(json.dumps(merged_data))
+        final_output_blob = registry.storage_client().bucket(GCS_BUCKET).blob(final_output_path)
+        upload_json(final_output_blob, merged_data)
 
         print(f"최종으로 합쳐진 JSON 파일이 다음 위치에 저장됐습니다. : gs://{GCS_BUCKET}/{final_output_path}")
 
@@ -140,19 +191,44 @@ def merge_json_files(video_name, gcs_client):
 #             if output_filename:
 #                 merge_json_files(video_name, self.gcs_client)
 
+# 다 써진 영상 파일 처리 (IngestScheduler의 작업자 스레드에서 실행)
+def handle_video(path, registry, pipeline=None):
+    video_name = os.path.basename(path)
+    print(f"새 비디오 파일 준비 완료: {video_name}")
+    if pipeline:
+        # 파이프라인 모드에서는 대기열에 넣기만 한다.
+        pipeline.submit(video_name)
+        return
+    output_filename = process_video(video_name, registry)
+    if output_filename:
+        merge_json_files(video_name, registry)
+
+# 관찰자 스레드를 막지 않도록 이벤트는 스케줄러에 넘기기만 한다.
+# 파일이 다 써졌는지(닫힘 이벤트 또는 크기/수정 시간이 멈춤)는 스케줄러가 확인한다.
 class VideoEventHandler(FileSystemEventHandler):
-    def __init__(self, gcs_client):
-        self.gcs_client = gcs_client
-    
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
     def on_created(self, event):
         print("==> on_created")
-        if not event.is_directory:
-            video_name = os.path.basename(event.src_path)
-            if self.is_video_file(video_name):
-                print(f"새 비디오 파일 감지: {video_name}")
-                output_filename = process_video(video_name, self.gcs_client)
-                if output_filename:
-                    merge_json_files(video_name, self.gcs_client)
+        self.enqueue(event.src_path, event.is_directory)
+
+    def on_modified(self, event):
+        self.enqueue(event.src_path, event.is_directory)
+
+    def on_closed(self, event):
+        self.enqueue(event.src_path, event.is_directory, closed=True)
+
+    # 녹화기가 임시 이름으로 쓴 뒤 이름을 바꾸는 경우
+    def on_moved(self, event):
+        self.enqueue(event.dest_path, event.is_directory)
+
+    def enqueue(self, path, is_directory, closed=False):
+        if is_directory:
+            return
+        path = os.fsdecode(path)
+        if self.is_video_file(path):
+            self.scheduler.notify(path, closed)
 
     @staticmethod
     def is_video_file(filename):
@@ -177,8 +253,10 @@ class VideoEventHandler(FileSystemEventHandler):
         latest_file = max(video_files, key=lambda x: os.path.getmtime(os.path.join(INPUT_PREFIX, x)))
         return latest_file
 
-def start_observer(gcs_client):
-    event_handler = VideoEventHandler(gcs_client)
+def start_observer(registry, pipeline=None, workers=INGEST_WORKERS, settle_seconds=SETTLE_SECONDS):
+    scheduler = IngestScheduler(lambda path: handle_video(path, registry, pipeline),
+                                workers=workers, settle_seconds=settle_seconds).start()
+    event_handler = VideoEventHandler(scheduler)
     observer = Observer()
     observer.schedule(event_handler, path=INPUT_PREFIX, recursive=False)
     print("==> start_observer")
@@ -190,14 +268,29 @@ def start_observer(gcs_client):
     except KeyboardInterrupt:
         print("==> start_observer: STOP")
         observer.stop()
+        scheduler.stop(wait=False)
+        print(f"파일 감지 상태: {scheduler.stats()}")
+        if pipeline:
+            pipeline.stop(wait=False)
+        registry.report()
     observer.join()
 
 # ================================================================================================
 if __name__ == "__main__":
-    from google.cloud import storage
-
-    # GCS 클라이언트 생성
-    gcs_client = storage.Client.from_service_account_json("/Users/highbuff/Downloads/gold-braid-428103-s3-1806cc6a21a0.json")
+    parser = argparse.ArgumentParser(description="Highbuff 비디오 분석 프로그램")
+    parser.add_argument("--pipeline", action="store_true", help="여러 영상을 동시에 분석하는 파이프라인 모드")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE)
+    parser.add_argument("--project-limit", type=int, default=PROJECT_MAX_IN_FLIGHT)
+    parser.add_argument("--ingest-workers", type=int, default=INGEST_WORKERS, help="다 써진 파일을 처리하는 작업자 수")
+    parser.add_argument("--settle-seconds", type=float, default=SETTLE_SECONDS,
+                        help="파일 크기/수정 시간이 이 시간 동안 그대로면 다 써진 것으로 본다")
+    add_backend_arguments(parser)
+    args = parser.parse_args()
+    install_backend(args)
+
+    # 클라이언트 레지스트리 (Storage 클라이언트는 각 작업자 스레드가 필요할 때 가져온다)
+    registry = get_registry()
 
     print("#####################################################################################")
     print("\nHighbuff 비디오 분석 프로그램입니다.")
@@ -209,5 +302,9 @@ if __name__ == "__main__":
     print("프로그램을 종료하려면 Ctrl+C를 누르세요.")
     print("#####################################################################################")
 
-    start_observer(gcs_client)
+    pipeline = None
+    if args.pipeline:
+        pipeline = build_pipeline(registry, args.workers, args.queue_size, args.project_limit).start()
+
+    start_observer(registry, pipeline, args.ingest_workers, args.settle_seconds)
 # ================================================================================================
\ No newline at end of file
@@ -0,0 +1,287 @@
+import json
+import codecs
+
+# 구글 분석 결과 JSON에 AWS explicit_annotation을 끼워 넣는 스트리밍 병합
+#
+# 기존 방식은 결과 파일 전체를 download_as_text + json.loads로 읽은 뒤 json.dumps로 통째로 다시 만들어서,
+# 수십 MB짜리 object tracking 결과를 병합할 때 파일 크기의 몇 배의 메모리를 썼다.
+# 여기서는 입력 바이트 스트림을 앞에서부터 읽으면서 구조의 바깥쪽 몇 단계
+# (최상위 객체 -> annotation_results 배열 -> 각 결과 객체 -> 각 기능별 배열)만 직접 따라가고,
+# 그 안쪽 값(트랙 하나, 프레임 목록 하나 등)은 하나씩 raw_decode / json.dumps 해서 바로 내보낸다.
+# 메모리는 가장 큰 값 하나 크기로 제한되고, 결과는 json.dumps(병합된 dict)와 바이트 단위로 같다.
+
+READ_CHUNK_SIZE = 1024 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+STREAM_DEPTH = 4 # 이 깊이까지는 컨테이너를 풀어서 원소 단위로 처리한다
+WHITESPACE = " \t\n\r"
+VALUE_TERMINATORS = ",:]}" + WHITESPACE
+
+
+class JsonStreamReader:
+    def __init__(self, stream, chunk_size=READ_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    # 최소 size 글자 이상을 더 읽어 둔다. 이미 처리한 앞부분은 버퍼에서 잘라낸다.
+    def fill(self, size=None):
+        if self.eof:
+            return False
+        if self.position:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+
+        wanted = max(size or 0, self.chunk_size)
+        pieces = []
+        read = 0
+        while read < wanted:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                pieces.append(self.decoder.decode(b"", final=True))
+                self.eof = True
+                break
+            pieces.append(self.decoder.decode(chunk))
+            read += len(chunk)
+        self.buffer += "".join(pieces)
+        return True
+
+    # 공백을 건너뛴 다음 글자 (끝이면 빈 문자열)
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON 형식 오류: '{char}' 위치에 '{found}'")
+        self.position += 1
+
+    # 구분자(',' 또는 닫는 괄호)를 읽어서 돌려준다.
+    def separator(self, closing):
+        found = self.peek()
+        if found not in (",", closing):
+            raise ValueError(f"JSON 형식 오류: ',' 또는 '{closing}' 위치에 '{found}'")
+        self.position += 1
+        return found
+
+    # 값 하나를 통째로 읽는다. 숫자가 버퍼 끝에서 잘리는 경우("1." + "5")를 막기 위해
+    # 값 바로 뒤에 구분자가 보일 때만 인정한다.
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.position)
+                if (end < len(self.buffer) and self.buffer[end] in VALUE_TERMINATORS) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # 값이 버퍼보다 크면 지금까지 읽은 만큼 더 읽어서 재시도 횟수를 로그 수준으로 줄인다.
+            self.fill(len(self.buffer) - self.position)
+
+
+class JsonStreamWriter:
+    def __init__(self, stream, buffer_size=WRITE_BUFFER_SIZE):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.pieces = []
+        self.size = 0
+        self.written = 0
+
+    def write(self, text):
+        self.pieces.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.pieces:
+            data = "".join(self.pieces).encode("ascii")
+            self.stream.write(data)
+            self.written += len(data)
+            self.pieces = []
+            self.size = 0
+
+
+# 값 하나를 복사한다. depth가 남아 있으면 컨테이너를 풀어서 원소 단위로, 아니면 통째로 읽어서 내보낸다.
+def copy_value(reader, writer, depth):
+    char = reader.peek()
+    if depth > 0 and char == "{":
+        copy_object(reader, writer, depth - 1)
+    elif depth > 0 and char == "[":
+        copy_array(reader, writer, depth - 1)
+    else:
+        writer.write(json.dumps(reader.read_value()))
+
+
+def iterate_members(reader):
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.position += 1
+        return
+    while True:
+        key = reader.read_value()
+        reader.expect(":")
+        yield key
+        if reader.separator("}") == "}":
+            return
+
+
+def iterate_elements(reader):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.position += 1
+        return
+    index = 0
+    while True:
+        yield index
+        index += 1
+        if reader.separator("]") == "]":
+            return
+
+
+def write_key(writer, key, first):
+    writer.write(("" if first else ", ") + json.dumps(key) + ": ")
+
+
+def copy_object(reader, writer, depth):
+    writer.write("{")
+    for index, key in enumerate(iterate_members(reader)):
+        write_key(writer, key, index == 0)
+        copy_value(reader, writer, depth)
+    writer.write("}")
+
+
+def copy_array(reader, writer, depth):
+    writer.write("[")
+    for index in iterate_elements(reader):
+        if index:
+            writer.write(", ")
+        copy_value(reader, writer, depth)
+    writer.write("]")
+
+
+def default_annotation_result(explicit_annotation):
+    return {
+        'face_detection_annotations': [],
+        'explicit_annotation': explicit_annotation,
+        'object_annotations': []
+    }
+
+
+# annotation_results[0]에 explicit_annotation을 넣는다 (이미 있으면 그 자리의 값을 바꾼다)
+def merge_first_result(reader, writer, explicit_annotation, depth):
+    if reader.peek() != "{":
+        raise ValueError("annotation_results[0]이 객체가 아닙니다.")
+
+    writer.write("{")
+    count = 0
+    replaced = False
+    for key in iterate_members(reader):
+        write_key(writer, key, count == 0)
+        count += 1
+        if key == "explicit_annotation":
+            reader.read_value()
+            writer.write(json.dumps(explicit_annotation))
+            replaced = True
+        else:
+            copy_value(reader, writer, depth)
+    if not replaced:
+        write_key(writer, "explicit_annotation", count == 0)
+        writer.write(json.dumps(explicit_annotation))
+    writer.write("}")
+
+
+def merge_results(reader, writer, explicit_annotation, depth):
+    if reader.peek() != "[":
+        raise ValueError("annotation_results가 배열이 아닙니다.")
+
+    writer.write("[")
+    empty = True
+    for index in iterate_elements(reader):
+        empty = False
+        if index == 0:
+            merge_first_result(reader, writer, explicit_annotation, depth - 1)
+        else:
+            writer.write(", ")
+            copy_value(reader, writer, depth - 1)
+    if empty:
+        # annotation_results가 비어 있으면 기존 병합과 같이 기본 결과를 새로 만든다.
+        writer.write(json.dumps(default_annotation_result(explicit_annotation)))
+    writer.write("]")
+
+
+# source(바이너리 읽기 스트림)의 구글 분석 결과에 explicit_annotation을 넣어 sink(바이너리 쓰기 스트림)에 쓴다.
+# 쓴 바이트 수를 돌려준다.
+def stream_merge(source, sink, explicit_annotation, depth=STREAM_DEPTH, chunk_size=READ_CHUNK_SIZE):
+    reader = JsonStreamReader(source, chunk_size)
+    writer = JsonStreamWriter(sink)
+
+    if reader.peek() != "{":
+        raise ValueError("분석 결과 JSON의 최상위 값이 객체가 아닙니다.")
+
+    writer.write("{")
+    count = 0
+    merged = False
+    for key in iterate_members(reader):
+        write_key(writer, key, count == 0)
+        count += 1
+        if key == "annotation_results":
+            merge_results(reader, writer, explicit_annotation, depth - 1)
+            merged = True
+        else:
+            copy_value(reader, writer, depth - 1)
+    if not merged:
+        write_key(writer, "annotation_results", count == 0)
+        writer.write(json.dumps([default_annotation_result(explicit_annotation)]))
+    writer.write("}")
+
+    if reader.peek() != "":
+        raise ValueError("JSON 값 뒤에 불필요한 데이터가 있습니다.")
+
+    writer.flush()
+    return writer.written
+
+
+TRACK_KEYS = ("object_annotations", "face_detection_annotations")
+
+
+def iterate_values(reader):
+    for _ in iterate_elements(reader):
+        yield reader.read_value()
+
+
+# 분석 결과 스트림의 annotation_results 항목들을 앞에서부터 읽으면서 (키, 값)을 하나씩 돌려준다.
+# TRACK_KEYS에 해당하는 배열은 값 대신 트랙을 하나씩 돌려주는 이터레이터를 넘기므로
+# 한 번에 메모리에 올라오는 것은 트랙 하나뿐이다.
+def iterate_annotations(stream, track_keys=TRACK_KEYS, chunk_size=READ_CHUNK_SIZE):
+    reader = JsonStreamReader(stream, chunk_size)
+    for key in iterate_members(reader):
+        if key != "annotation_results" or reader.peek() != "[":
+            reader.read_value()
+            continue
+
+        for _ in iterate_elements(reader):
+            if reader.peek() != "{":
+                reader.read_value()
+                continue
+
+            for result_key in iterate_members(reader):
+                if result_key in track_keys and reader.peek() == "[":
+                    tracks = iterate_values(reader)
+                    yield result_key, tracks
+                    # 호출한 쪽이 끝까지 읽지 않았으면 남은 트랙을 건너뛴다.
+                    for _ in tracks:
+                        pass
+                else:
+                    yield result_key, reader.read_value()
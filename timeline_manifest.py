@@ -0,0 +1,182 @@
+import re
+import json
+import time
+import random
+import argparse
+import datetime
+import concurrent.futures
+from google.api_core import exceptions
+from annotation_artifact import ARTIFACT_PREFIX, artifact_names
+
+# 시간별로 나눈 추가 전용(append-only) 타임라인
+#
+# final_output.json은 영상마다 덮어쓰므로 뷰어는 가장 최근 영상 하나만 볼 수 있고,
+# 여러 영상을 이어 보려면 병합 결과 폴더 전체를 조회하고 merged_*.json을 모두 받아야 했다.
+# 병합 결과를 게시할 때마다 영상 타임스탬프의 시(hour)에 해당하는 JSONL 파일(shard)에 한 줄을 덧붙인다.
+#   visualize-timeline/20240101/12.jsonl
+#   {"timestamp": "20240101_123000", "offset": 1800, "duration": 60.0, "merged": ..., "size": ..., "counts": ...}
+# 어떤 시간 범위의 영상 목록이 필요하면 그 범위의 shard만 (시간당 작은 파일 하나) 읽고,
+# 실제 분석 결과(아티팩트, 병합 JSON)는 필요한 영상만 나중에 받으면 된다.
+# 여러 프로세스가 같은 shard에 동시에 덧붙여도 줄이 사라지지 않도록 generation 조건부 업로드로 쓰고,
+# 실패하면 다시 읽어서 덧붙인다. 같은 병합 결과(이름 + generation)는 한 번만 기록된다.
+
+TIMELINE_PREFIX = "visualize-timeline/" # 타임라인 shard 경로
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+APPEND_RETRIES = 8
+APPEND_BACKOFF = 0.2 # 조건부 업로드가 충돌하면 이 간격(초)부터 두 배씩 늘려가며 다시 시도한다
+READ_WORKERS = 8 # shard를 동시에 읽는 수
+
+
+def parse_clip_time(timestamp):
+    return datetime.datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+
+
+def shard_name(moment, prefix=TIMELINE_PREFIX):
+    return f"{prefix}{moment:%Y%m%d}/{moment:%H}.jsonl"
+
+
+# 타임라인 한 줄. view는 publish_view_output이 돌려주는 값 (아티팩트가 없으면 관련 값은 None)
+def timeline_entry(timestamp, clip, merged_blob, view=None):
+    moment = parse_clip_time(timestamp)
+    view = view or {}
+    duration_ms = view.get("duration_ms")
+    return {
+        "timestamp": timestamp,
+        "start": moment.isoformat(),
+        "offset": moment.minute * 60 + moment.second, # shard(시) 시작부터의 초
+        "duration": duration_ms / 1000 if duration_ms is not None else None,
+        "clip": clip,
+        "merged": merged_blob.name,
+        "generation": merged_blob.generation,
+        "size": merged_blob.size,
+        "content_encoding": merged_blob.content_encoding,
+        "artifact": view.get("artifact_path"),
+        "artifact_bytes": view.get("artifact_bytes"),
+        "counts": view.get("counts"),
+        "published_at": round(time.time(), 3),
+    }
+
+
+def parse_lines(text):
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+# shard에 한 줄 덧붙인다. 이미 기록된 병합 결과면 덧붙이지 않는다. (shard 이름, 덧붙였는지)를 돌려준다.
+def append_entry(bucket, entry, prefix=TIMELINE_PREFIX, retries=APPEND_RETRIES):
+    name = shard_name(parse_clip_time(entry["timestamp"]), prefix)
+    delay = APPEND_BACKOFF
+    for attempt in range(retries):
+        try:
+            blob = bucket.get_blob(name)
+            if blob is None:
+                blob, generation, text = bucket.blob(name), 0, ""
+            else:
+                # 읽은 내용과 덮어쓸 조건이 같은 generation이어야 한다.
+                generation = blob.generation
+                text = blob.download_as_text(if_generation_match=generation)
+            if any(line["merged"] == entry["merged"] and line["generation"] == entry["generation"]
+                   for line in parse_lines(text)):
+                return name, False
+
+            if text and not text.endswith("\n"):
+                text += "\n"
+            blob.cache_control = "no-cache"
+            # generation 0은 "아직 없는 객체일 때만" 만든다는 뜻이다.
+            blob.upload_from_string(text + json.dumps(entry, ensure_ascii=False) + "\n",
+                                    content_type="application/x-ndjson", if_generation_match=generation)
+            return name, True
+        except (exceptions.PreconditionFailed, exceptions.NotFound):
+            # 그 사이 다른 쪽이 먼저 덧붙였다. 다시 읽어서 덧붙인다.
+            if attempt == retries - 1:
+                raise
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay *= 2
+
+
+def window_shards(start, end, prefix=TIMELINE_PREFIX):
+    moment = start.replace(minute=0, second=0, microsecond=0)
+    names = []
+    while moment <= end:
+        names.append(shard_name(moment, prefix))
+        moment += datetime.timedelta(hours=1)
+    return names
+
+
+def read_shard(bucket, name):
+    blob = bucket.blob(name)
+    try:
+        return parse_lines(blob.download_as_text())
+    except exceptions.NotFound:
+        return []
+
+
+# start ~ end (datetime, 영상 타임스탬프 기준) 사이에 시작한 영상 목록 (시간순)
+# 같은 영상이 다시 병합돼 여러 번 기록됐으면 마지막 기록만 남긴다.
+def read_window(bucket, start, end, prefix=TIMELINE_PREFIX, workers=READ_WORKERS):
+    names = window_shards(start, end, prefix)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(names)) or 1) as executor:
+        shards = list(executor.map(lambda name: read_shard(bucket, name), names))
+
+    entries = {}
+    for lines in shards:
+        for entry in lines:
+            if start <= parse_clip_time(entry["timestamp"]) <= end:
+                entries[entry["timestamp"]] = entry
+    return [entries[timestamp] for timestamp in sorted(entries)]
+
+
+# 기존 병합 결과(merged_<ts>.json)를 타임라인에 기록한다. 아티팩트 manifest가 있으면 요약도 같이 넣는다.
+def backfill(gcs_client, bucket_name, source_prefix, artifact_prefix=ARTIFACT_PREFIX, prefix=TIMELINE_PREFIX, limit=None):
+    bucket = gcs_client.bucket(bucket_name)
+    appended = 0
+    for blob in bucket.list_blobs(prefix=source_prefix):
+        match = re.search(r'merged_(\d{8}_\d{6})\.json$', blob.name)
+        if not match:
+            continue
+        timestamp = match.group(1)
+        view = {}
+        manifest_blob = bucket.blob(f"{artifact_prefix}{artifact_names(timestamp)[1]}")
+        try:
+            manifest = json.loads(manifest_blob.download_as_text())
+            view = {"artifact_path": manifest_blob.name, "artifact_bytes": manifest["byte_length"],
+                    "duration_ms": manifest["duration_ms"], "counts": manifest["counts"]}
+        except exceptions.NotFound:
+            pass
+
+        name, added = append_entry(bucket, timeline_entry(timestamp, None, blob, view), prefix)
+        if added:
+            appended += 1
+            print(f"타임라인에 기록: {blob.name} -> {name}")
+        if limit and appended >= limit:
+            break
+    return appended
+
+
+if __name__ == "__main__":
+    import run_video_intelligence_auto as auto
+    from clients import get_registry
+
+    parser = argparse.ArgumentParser(description="시간별 타임라인 조회 / 기존 병합 결과 기록")
+    parser.add_argument("--prefix", default=TIMELINE_PREFIX)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    window_parser = subparsers.add_parser("window", help="시간 범위의 영상 목록 (JSONL)")
+    window_parser.add_argument("--hours", type=float, default=24, help="지금부터 이 시간 전까지 (--start가 없을 때)")
+    window_parser.add_argument("--start", help="시작 (YYYYMMDD_HHMMSS)")
+    window_parser.add_argument("--end", help="끝 (YYYYMMDD_HHMMSS, 기본: 지금)")
+
+    backfill_parser = subparsers.add_parser("backfill", help="기존 병합 결과를 타임라인에 기록")
+    backfill_parser.add_argument("--source-prefix", default=auto.FINAL_OUTPUT_PREFIX)
+    backfill_parser.add_argument("--artifact-prefix", default=ARTIFACT_PREFIX)
+    backfill_parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    gcs_client = get_registry().storage_client()
+    if args.command == "window":
+        end = parse_clip_time(args.end) if args.end else datetime.datetime.now()
+        start = parse_clip_time(args.start) if args.start else end - datetime.timedelta(hours=args.hours)
+        for entry in read_window(gcs_client.bucket(auto.GCS_BUCKET), start, end, args.prefix):
+            print(json.dumps(entry, ensure_ascii=False))
+    else:
+        count = backfill(gcs_client, auto.GCS_BUCKET, args.source_prefix, args.artifact_prefix, args.prefix, args.limit)
+        print(f"타임라인에 {count}개를 기록했습니다.")
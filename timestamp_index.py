@@ -0,0 +1,121 @@
+import os
+import re
+import json
+import time
+import bisect
+import calendar
+import datetime
+import threading
+
+# 파일 이름의 타임스탬프(YYYYMMDD_HHMMSS) -> 블롭 이름 인덱스
+#
+# 병합할 때마다 AWS 결과 폴더 전체를 조회하지 않도록, 한 번 만든 인덱스를 로컬에 저장해 두고
+# 마지막으로 본 블롭 이름 이후(list_blobs의 start_offset)만 조회해서 덧붙인다.
+# 전체 목록을 다시 읽은 시각(벽시계)도 같이 저장해서 재시작할 때마다 전체를 다시 읽지 않는다.
+# 타임스탬프를 초 단위 정수로 바꿔 정렬된 리스트로 들고 있으므로 정확히 일치하는 값이나
+# 허용 오차 안에서 가장 가까운 값을 이진 탐색(O(log n))으로 찾는다.
+
+TIMESTAMP_PATTERN = re.compile(r'(\d{8}_\d{6})')
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+FULL_RESYNC_INTERVAL = 3600 # 이름 순서가 뒤섞인 경우를 대비해 전체 목록을 다시 읽는 주기 (초)
+
+
+def parse_timestamp(name):
+    match = TIMESTAMP_PATTERN.search(name)
+    if not match:
+        return None
+    return match.group(1)
+
+
+def timestamp_to_seconds(timestamp):
+    return calendar.timegm(datetime.datetime.strptime(timestamp, TIMESTAMP_FORMAT).timetuple())
+
+
+class TimestampIndex:
+    def __init__(self, path, full_resync_interval=FULL_RESYNC_INTERVAL):
+        self.path = path
+        self.full_resync_interval = full_resync_interval
+        self.lock = threading.Lock()
+        self.keys = [] # 초 단위 타임스탬프 (정렬)
+        self.names = [] # keys와 같은 순서의 블롭 이름
+        self.last_name = None # 증분 조회 커서
+        self.last_full_sync = 0 # 마지막으로 전체 목록을 읽은 시각 (time.time(), 인덱스 파일에 저장)
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.keys = data["keys"]
+        self.names = data["names"]
+        self.last_name = data.get("last_name")
+        self.last_full_sync = data.get("last_full_sync", 0)
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"keys": self.keys, "names": self.names, "last_name": self.last_name,
+                       "last_full_sync": self.last_full_sync}, f)
+        os.replace(temp_path, self.path)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # 같은 타임스탬프가 이미 있으면 나중에 본 블롭으로 바꾼다 (기존 dict 방식과 같은 동작)
+    def add(self, name):
+        timestamp = parse_timestamp(name)
+        if timestamp is None:
+            return False
+        key = timestamp_to_seconds(timestamp)
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            changed = self.names[position] != name
+            self.names[position] = name
+            return changed
+        self.keys.insert(position, key)
+        self.names.insert(position, name)
+        return True
+
+    # 새로 올라온 블롭만 조회해서 인덱스에 반영한다. 반영된 블롭 수를 돌려준다.
+    def update(self, bucket, prefix):
+        with self.lock:
+            full_sync = self.last_name is None or time.time() - self.last_full_sync > self.full_resync_interval
+            if full_sync:
+                blobs = bucket.list_blobs(prefix=prefix, fields="items(name),nextPageToken")
+            else:
+                blobs = bucket.list_blobs(prefix=prefix, start_offset=self.last_name, fields="items(name),nextPageToken")
+
+            added = 0
+            for blob in blobs:
+                if self.last_name is not None and blob.name <= self.last_name and not full_sync:
+                    continue
+                if self.add(blob.name):
+                    added += 1
+                if self.last_name is None or blob.name > self.last_name:
+                    self.last_name = blob.name
+
+            if full_sync:
+                self.last_full_sync = time.time()
+            if added or full_sync:
+                self.save()
+            return added
+
+    def get(self, timestamp):
+        return self.nearest(timestamp, tolerance=0)
+
+    # tolerance(초) 안에서 가장 가까운 타임스탬프의 블롭 이름. 없으면 None
+    def nearest(self, timestamp, tolerance=0):
+        key = timestamp_to_seconds(timestamp)
+        with self.lock:
+            position = bisect.bisect_left(self.keys, key)
+            best = None
+            for candidate in (position - 1, position):
+                if 0 <= candidate < len(self.keys):
+                    distance = abs(self.keys[candidate] - key)
+                    if distance <= tolerance and (best is None or distance < best[0]):
+                        best = (distance, self.names[candidate])
+            return best[1] if best else None
@@ -0,0 +1,216 @@
+// 뷰어용 바이너리 아티팩트 로더 (만드는 쪽은 annotation_artifact.py)
+// manifest에 적힌 위치대로 .bin 파일을 타입 배열로 바로 읽고,
+// 트랙의 프레임은 시간순이므로 현재 시간의 박스를 이진 탐색으로 찾는다.
+
+const ARTIFACT_TYPES = {
+    'uint8': Uint8Array,
+    'uint16': Uint16Array,
+    'uint32': Uint32Array
+}
+
+async function load_annotation_artifact(manifest_url) {
+    const manifest_response = await fetch(manifest_url, {cache: 'no-cache'})
+    if (!manifest_response.ok)
+        throw new Error('Network response was not ok ' + manifest_response.statusText)
+    const manifest = await manifest_response.json()
+
+    // binary는 manifest 위치 기준의 상대 경로
+    const binary_url = new URL(manifest.binary, new URL(manifest_url, window.location.href)).href
+    const binary_response = await fetch(binary_url)
+    if (!binary_response.ok)
+        throw new Error('Network response was not ok ' + binary_response.statusText)
+
+    // Vue가 큰 배열을 반응형으로 감시하지 않도록 고정한다.
+    return Object.freeze(new Annotation_Artifact(manifest, await binary_response.arrayBuffer(), binary_url))
+}
+
+
+class Annotation_Artifact {
+    constructor(manifest, buffer, binary_url) {
+        this.manifest = manifest
+        this.binary_url = binary_url
+        this.sections = {}
+
+        for (const name in manifest.sections) {
+            const section = manifest.sections[name]
+            this.sections[name] = new ARTIFACT_TYPES[section.type](buffer, section.offset, section.length)
+        }
+    }
+
+    get features() {
+        return this.manifest.features
+    }
+
+    get duration() {
+        return this.manifest.duration_ms / this.manifest.time_scale
+    }
+
+    track_count(prefix) {
+        return this.sections[`${prefix}_track_start_ms`].length
+    }
+
+    // prefix: 'object' 또는 'face'
+    // 돌려주는 배열에는 active_at(seconds)가 붙어 있어서 그 시간에 걸친 트랙만 바로 꺼낼 수 있다.
+    tracks(prefix, video_height, video_width, confidence_threshold) {
+        const tracks = []
+        const by_index = []
+
+        for (let index = 0; index < this.track_count(prefix); index++) {
+            const track = new Artifact_Track(this, prefix, index, video_height, video_width)
+            if (track.confidence > confidence_threshold) {
+                tracks.push(track)
+                by_index[index] = track
+            }
+        }
+
+        tracks.active_at = (seconds) => {
+            const active = []
+            this.active_track_indexes(prefix, seconds).forEach(index => {
+                const track = by_index[index]
+                if (track && track.has_frames_for_time(seconds))
+                    active.push(track)
+            })
+            return active
+        }
+        return tracks
+    }
+
+    // seconds가 속한 1초 버킷에 걸쳐 있는 트랙 번호
+    active_track_indexes(prefix, seconds) {
+        const offsets = this.sections[`${prefix}_bucket_offset`]
+        const bucket = Math.floor(seconds / this.manifest.bucket_seconds)
+        if (bucket < 0 || bucket >= offsets.length - 1)
+            return []
+        return this.sections[`${prefix}_bucket_tracks`].subarray(offsets[bucket], offsets[bucket + 1])
+    }
+
+    // 기존 JSON의 explicit_annotation.frames와 같은 모양
+    explicit_frames() {
+        const times = this.sections['explicit_frame_time_ms']
+        const likelihoods = this.sections['explicit_frame_likelihood']
+        const frames = []
+
+        for (let index = 0; index < times.length; index++) {
+            frames.push({
+                'time_offset': {
+                    'seconds': Math.floor(times[index] / this.manifest.time_scale),
+                    'nanos': (times[index] % this.manifest.time_scale) * (1e9 / this.manifest.time_scale)
+                },
+                'pornography_likelihood': this.manifest.likelihoods[likelihoods[index]]
+            })
+        }
+        return frames
+    }
+}
+
+
+// Object_Track / Face_Track과 같은 방식으로 draw_bounding_boxes에서 쓸 수 있는 트랙
+class Artifact_Track {
+    constructor(artifact, prefix, index, video_height, video_width) {
+        const sections = artifact.sections
+        const manifest = artifact.manifest
+
+        this.name = manifest.labels[sections[`${prefix}_track_label`][index]]
+        this.start_time = sections[`${prefix}_track_start_ms`][index] / manifest.time_scale
+        this.end_time = sections[`${prefix}_track_end_ms`][index] / manifest.time_scale
+        this.confidence = sections[`${prefix}_track_confidence`][index] / manifest.confidence_scale
+
+        this.time_scale = manifest.time_scale
+        this.box_scale = manifest.box_scale
+        this.video_height = video_height
+        this.video_width = video_width
+        this.frame_start = sections[`${prefix}_track_frame_offset`][index]
+        this.frame_end = sections[`${prefix}_track_frame_offset`][index + 1]
+        this.frame_times = sections[`${prefix}_frame_time_ms`]
+        this.frame_boxes = sections[`${prefix}_frame_box`]
+
+        if (prefix == 'face') {
+            const thumbnail_offsets = sections['face_thumbnail_offset']
+            const thumbnail_bytes = sections['face_thumbnail'].subarray(thumbnail_offsets[index], thumbnail_offsets[index + 1])
+            this.thumbnail = new TextDecoder('ascii').decode(thumbnail_bytes)
+
+            this.attributes = {}
+            manifest.face_attributes.forEach((name, attribute_index) => {
+                const value = sections['face_track_attributes'][index * manifest.face_attributes.length + attribute_index]
+                this.attributes[name] = value / manifest.confidence_scale
+            })
+        }
+    }
+
+    has_frames_for_time(seconds) {
+        return ((this.start_time <= seconds) && (this.end_time >= seconds))
+    }
+
+    // 시간이 seconds보다 큰 첫 프레임 (트랙 안에서의 순번, 없으면 프레임 수)
+    frame_index_after(seconds) {
+        const time = seconds * this.time_scale
+        let low = this.frame_start
+        let high = this.frame_end
+
+        while (low < high) {
+            const middle = (low + high) >> 1
+            if (this.frame_times[middle] > time)
+                high = middle
+            else
+                low = middle + 1
+        }
+        return low - this.frame_start
+    }
+
+    frame_count() {
+        return this.frame_end - this.frame_start
+    }
+
+    frame(index) {
+        const position = this.frame_start + index
+        const box = this.frame_boxes.subarray(position * 4, position * 4 + 4)
+        const left = box[0] / this.box_scale, top = box[1] / this.box_scale
+        const right = box[2] / this.box_scale, bottom = box[3] / this.box_scale
+
+        return {
+            'box': {
+                'x': left * this.video_width,
+                'y': top * this.video_height,
+                'width': (right - left) * this.video_width,
+                'height': (bottom - top) * this.video_height
+            },
+            'time_offset': this.frame_times[position] / this.time_scale
+        }
+    }
+
+    most_recent_real_bounding_box(seconds) {
+        const index = this.frame_index_after(seconds)
+        if ((index == 0) || (index == this.frame_count()))
+            return null
+        return this.frame(index - 1).box
+    }
+
+    most_recent_interpolated_bounding_box(seconds) {
+        const index = this.frame_index_after(seconds)
+        if ((index == 0) || (index == this.frame_count()))
+            return null
+
+        if ((index == 1) || (index == this.frame_count() - 1))
+            return this.frame(index - 1).box
+
+        // create a new interpolated box
+        const start_box = this.frame(index - 1)
+        const end_box = this.frame(index)
+        const time_delt_ratio = (seconds - start_box.time_offset) / (end_box.time_offset - start_box.time_offset)
+
+        return {
+            'x': start_box.box.x + (end_box.box.x - start_box.box.x) * time_delt_ratio,
+            'y': start_box.box.y + (end_box.box.y - start_box.box.y) * time_delt_ratio,
+            'width': start_box.box.width + (end_box.box.width - start_box.box.width) * time_delt_ratio,
+            'height': start_box.box.height + (end_box.box.height - start_box.box.height) * time_delt_ratio
+        }
+    }
+
+    current_bounding_box(seconds, interpolate = true) {
+
+        if (interpolate)
+            return this.most_recent_interpolated_bounding_box(seconds)
+        else
+            return this.most_recent_real_bounding_box(seconds)
+    }
+}
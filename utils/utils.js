@@ -3,7 +3,10 @@ function draw_bounding_boxes(object_tracks, ctx) {
 
     const current_time = video.currentTime
 
-    object_tracks.forEach(tracked_object => {
+    // 아티팩트에서 만든 트랙 목록이면 현재 시간에 걸친 트랙만 꺼낸다.
+    const candidate_tracks = object_tracks.active_at ? object_tracks.active_at(current_time) : object_tracks
+
+    candidate_tracks.forEach(tracked_object => {
 
         if (tracked_object.has_frames_for_time(current_time)) {
             draw_bounding_box(tracked_object.current_bounding_box(current_time), tracked_object.name, ctx)